@@ -4,20 +4,16 @@ Provides web UI for managing projects, nodes, and knowledge base.
 """
 
 from django.contrib import admin
-from .models import Project, Node, Edge, KnowledgeBase, ChatMessage
+from .models import Project, Node, Edge, KnowledgeBase, KnowledgeBlob, ChatMessage
 
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
-    list_display = ['name', 'owner', 'node_count', 'created_at']
+    list_display = ['name', 'owner', 'node_count', 'completed_count', 'created_at']
     list_filter = ['created_at', 'owner']
     search_fields = ['name', 'description']
     readonly_fields = ['id', 'created_at', 'updated_at']
 
-    def node_count(self, obj):
-        return obj.nodes.count()
-    node_count.short_description = 'Nodes'
-
     fieldsets = (
         ('Project Info', {
             'fields': ('id', 'name', 'description', 'owner')
@@ -77,12 +73,12 @@ class EdgeAdmin(admin.ModelAdmin):
 class KnowledgeBaseAdmin(admin.ModelAdmin):
     list_display = ['title', 'file_type', 'project', 'uploaded_by', 'created_at']
     list_filter = ['file_type', 'project', 'created_at']
-    search_fields = ['title', 'content_preview', 'full_text']
+    search_fields = ['title', 'content_preview']
     readonly_fields = ['id', 'created_at']
 
     fieldsets = (
         ('File Info', {
-            'fields': ('id', 'title', 'file', 'file_type', 'project')
+            'fields': ('id', 'title', 'file', 'blob', 'file_type', 'project')
         }),
         ('Content', {
             'fields': ('content_preview', 'full_text'),
@@ -95,6 +91,14 @@ class KnowledgeBaseAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(KnowledgeBlob)
+class KnowledgeBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'ref_count', 'ingestion_status', 'created_at']
+    list_filter = ['ingestion_status', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'size', 'ref_count', 'created_at']
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ['role', 'node', 'source', 'created_at', 'preview']
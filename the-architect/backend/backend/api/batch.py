@@ -0,0 +1,283 @@
+"""
+Node Batch - Apply many node/edge mutations in one transaction.
+
+A batch is a list of operations:
+- {"op": "create", "ref": "a", "label": ..., "parent": <id or ref>, "position": {"x", "y"}, ...}
+- {"op": "update", "id": <id or ref>, "label"/"description"/"status"/"owner"/"position"/"parent": ...}
+- {"op": "move", "id": <id or ref>, "position": {...}, "parent": <id, ref or null>}
+- {"op": "delete", "id": <id>}  (deletes the subtree)
+- {"op": "create_edge", "source": <id or ref>, "target": <id or ref>}
+- {"op": "delete_edge", "id": <edge id>} or {"op": "delete_edge", "source": ..., "target": ...}
+
+`ref` names a node created in the same batch so later operations can point
+at it. Operations are grouped by kind and written with bulk queries, in this
+order: creates, updates and moves, edge creates, edge deletes, deletes. Any
+invalid operation rolls the whole batch back. The whole batch is one
+change-log version (api/changes.py).
+"""
+
+import uuid
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Node, Edge, NodeClosure
+from .hierarchy import NodeHierarchy
+from .rollups import StatusRollup
+from .changes import ChangeLog
+
+NODE_FIELDS = ('label', 'description', 'status', 'owner')
+MOVE_FIELDS = ('position', 'parent')
+OPERATIONS = ('create', 'update', 'move', 'delete', 'create_edge', 'delete_edge')
+BULK_BATCH_SIZE = 500
+
+
+class BatchError(ValueError):
+    """An operation in a batch is invalid; `index` is its position in the list."""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+class NodeBatch:
+    """Validate and apply a list of node/edge operations for one project."""
+
+    def __init__(self, project, operations):
+        self.project = project
+        self.operations = operations
+        self.refs = {}  # ref -> id of the node created for it
+        self.nodes = {}  # id -> Node, for every node the batch touches
+        self.changed = {'node': [], 'edge': []}  # Ids for the change log
+        self.deleted = {'node': [], 'edge': [], 'chat_message': []}
+
+    def apply(self) -> dict:
+        if not isinstance(self.operations, list) or not self.operations:
+            raise BatchError(None, "operations must be a non-empty list")
+        for index, operation in enumerate(self.operations):
+            if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+                raise BatchError(index, f"op must be one of: {', '.join(OPERATIONS)}")
+
+        with transaction.atomic():
+            created = self._create()
+            self._load_existing()
+            updated = self._update()
+            edges_created = self._create_edges()
+            edges_deleted = self._delete_edges()
+            deleted = self._delete()
+            ChangeLog.record(self.project.id, changed=self.changed, deleted=self.deleted)
+
+        return {
+            'refs': self.refs,
+            'created': [self.nodes[node_id] for node_id in created],
+            'updated': [self.nodes[node_id] for node_id in updated if node_id not in deleted],
+            'deleted': sorted(deleted),
+            'edges_created': edges_created,
+            'edges_deleted': edges_deleted,
+        }
+
+    def _of_kind(self, *kinds):
+        for index, operation in enumerate(self.operations):
+            if operation['op'] in kinds:
+                yield index, operation
+
+    def _resolve(self, index, value):
+        """Turn a ref or node id into a node id."""
+        if not isinstance(value, str) or not value:
+            raise BatchError(index, f"Invalid node reference: {value!r}")
+        return self.refs.get(value, value)
+
+    def _node(self, index, value) -> Node:
+        node = self.nodes.get(self._resolve(index, value))
+        if node is None:
+            raise BatchError(index, f"Node not found in this project: {value}")
+        return node
+
+    @staticmethod
+    def _apply_fields(index, node, operation, fields):
+        changed = set()
+        for field in fields:
+            if field in operation and field != 'parent':
+                if field == 'position':
+                    position = operation['position'] or {}
+                    if not isinstance(position, dict):
+                        raise BatchError(index, "position must be an object with x and y")
+                    node.position_x = position.get('x', node.position_x)
+                    node.position_y = position.get('y', node.position_y)
+                    changed.update(('position_x', 'position_y'))
+                else:
+                    value = operation[field]
+                    if field == 'description':
+                        value = value or ''
+                    setattr(node, field, value)
+                    changed.add(field)
+        if 'status' in changed and node.status not in dict(Node.STATUS_CHOICES):
+            raise BatchError(index, f"Invalid status: {node.status}")
+        if 'label' in changed and not node.label:
+            raise BatchError(index, "label is required")
+        return changed
+
+    def _create(self) -> list:
+        """bulk_create new nodes, their closure rows and their parent edges."""
+        creates = list(self._of_kind('create'))
+        parent_ids = set()
+        for index, operation in creates:
+            ref = operation.get('ref')
+            if ref is not None:
+                if not isinstance(ref, str) or not ref:
+                    raise BatchError(index, f"Invalid ref: {ref!r}")
+                if ref in self.refs:
+                    raise BatchError(index, f"Duplicate ref: {ref}")
+                self.refs[ref] = str(uuid.uuid4())
+            parent = operation.get('parent')
+            if isinstance(parent, str) and parent not in self.refs:
+                parent_ids.add(parent)
+
+        # Parents that already exist must belong to this project
+        existing = set(Node.objects.filter(
+            project=self.project, id__in=parent_ids
+        ).values_list('id', flat=True))
+
+        new_nodes, created_ids = [], set()
+        for index, operation in creates:
+            node_id = self.refs.get(operation.get('ref')) or str(uuid.uuid4())
+            node = Node(id=node_id, project=self.project, label='')
+            self._apply_fields(index, node, operation, NODE_FIELDS + ('position',))
+            parent = operation.get('parent')
+            if parent:
+                parent_id = self._resolve(index, parent)
+                if parent_id not in existing and parent_id not in created_ids:
+                    raise BatchError(index, f"Parent must exist or be created earlier in the batch: {parent}")
+                node.parent_id = parent_id
+            new_nodes.append(node)
+            created_ids.add(node_id)
+            self.nodes[node_id] = node
+
+        if new_nodes:
+            StatusRollup.fill(new_nodes)
+            Node.objects.bulk_create(new_nodes, batch_size=BULK_BATCH_SIZE)
+            NodeHierarchy.insert_many(new_nodes)
+            edges = [Edge(project=self.project, source_id=node.parent_id, target_id=node.id)
+                     for node in new_nodes if node.parent_id]
+            Edge.objects.bulk_create(edges, batch_size=BULK_BATCH_SIZE)
+            self.changed['node'].extend(node.id for node in new_nodes)
+            self.changed['edge'].extend(edge.id for edge in edges)
+            for node in new_nodes:
+                node._state.adding = False
+                node._loaded_parent_id = node.parent_id
+                node._loaded_status = node.status
+        return [node.id for node in new_nodes]
+
+    def _load_existing(self):
+        """Fetch every existing node the remaining operations refer to, in one query."""
+        wanted = set()
+        for index, operation in self._of_kind('update', 'move', 'delete', 'create_edge', 'delete_edge'):
+            for key in ('id', 'parent', 'source', 'target'):
+                value = operation.get(key)
+                if key == 'id' and operation['op'] == 'delete_edge':
+                    continue
+                if isinstance(value, str) and value not in self.refs:
+                    wanted.add(value)
+        wanted -= set(self.nodes)
+        if wanted:
+            self.nodes.update(
+                (node.id, node)
+                for node in Node.objects.filter(project=self.project, id__in=wanted)
+            )
+
+    def _update(self) -> list:
+        """bulk_update changed fields, roll up status changes, then re-link reparented subtrees."""
+        changed_fields, touched, reparented = set(), [], []
+        for index, operation in self._of_kind('update', 'move'):
+            node = self._node(index, operation.get('id'))
+            fields = MOVE_FIELDS if operation['op'] == 'move' else NODE_FIELDS + MOVE_FIELDS
+            changed_fields |= self._apply_fields(index, node, operation, fields)
+            if 'parent' in operation:
+                parent = operation['parent']
+                parent_id = self._node(index, parent).id if parent else None
+                if parent_id != node.parent_id:
+                    node.parent_id = parent_id
+                    changed_fields.add('parent')
+                    reparented.append((index, node))
+            if node.id not in touched:
+                touched.append(node.id)
+
+        if not touched:
+            return []
+        now = timezone.now()
+        for node_id in touched:
+            self.nodes[node_id].updated_at = now
+        Node.objects.bulk_update(
+            [self.nodes[node_id] for node_id in touched],
+            sorted(changed_fields | {'updated_at'}),
+            batch_size=BULK_BATCH_SIZE,
+        )
+        StatusRollup.statuses_changed([
+            (self.nodes[node_id], self.nodes[node_id]._loaded_status) for node_id in touched
+        ])
+        for node_id in touched:
+            self.nodes[node_id]._loaded_status = self.nodes[node_id].status
+
+        for index, node in reparented:
+            previous_parent_id = node._loaded_parent_id
+            try:
+                NodeHierarchy.move(node)
+            except ValueError as e:
+                raise BatchError(index, str(e))
+            deleted, edge = NodeHierarchy.relink_parent_edge(node, previous_parent_id)
+            self.deleted['edge'].extend(deleted)
+            if edge is not None:
+                self.changed['edge'].append(edge.id)
+            node._loaded_parent_id = node.parent_id
+        self.changed['node'].extend(touched)
+        return touched
+
+    def _create_edges(self) -> int:
+        edges = []
+        for index, operation in self._of_kind('create_edge'):
+            source = self._node(index, operation.get('source'))
+            target = self._node(index, operation.get('target'))
+            edges.append(Edge(project=self.project, source_id=source.id, target_id=target.id))
+        Edge.objects.bulk_create(edges, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        if edges:
+            # Ids as stored: an edge that already existed keeps its own
+            pairs = Q()
+            for edge in edges:
+                pairs |= Q(source_id=edge.source_id, target_id=edge.target_id)
+            self.changed['edge'].extend(Edge.objects.filter(pairs, project=self.project).values_list('id', flat=True))
+        return len(edges)
+
+    def _delete_edges(self) -> int:
+        condition = Q()
+        for index, operation in self._of_kind('delete_edge'):
+            if operation.get('id'):
+                condition |= Q(id=operation['id'])
+            else:
+                source = self._node(index, operation.get('source'))
+                target = self._node(index, operation.get('target'))
+                condition |= Q(source_id=source.id, target_id=target.id)
+        if not condition:
+            return 0
+        doomed = Edge.objects.filter(condition, project=self.project)
+        self.deleted['edge'].extend(doomed.values_list('id', flat=True))
+        deleted, _ = doomed.delete()
+        return deleted
+
+    def _delete(self) -> set:
+        """Delete nodes with their subtrees in one pass."""
+        roots = [self._node(index, operation.get('id')).id for index, operation in self._of_kind('delete')]
+        if not roots:
+            return set()
+        doomed = Node.objects.filter(ancestor_links__ancestor_id__in=roots).distinct()
+        tombstones = ChangeLog.subtree_tombstones(doomed)
+        for kind, ids in tombstones.items():
+            self.deleted[kind].extend(ids)
+        deleted = set(tombstones['node'])
+        # Only the top-most subtrees come off their ancestors' rollups
+        nested = {str(node_id) for node_id in NodeClosure.objects.filter(
+            descendant_id__in=roots, ancestor_id__in=roots, depth__gt=0
+        ).values_list('descendant_id', flat=True)}
+        for root in {str(node_id) for node_id in roots} - nested:
+            StatusRollup.removed(root, self.project.id)
+        Node.objects.filter(id__in=deleted).delete()
+        return deleted
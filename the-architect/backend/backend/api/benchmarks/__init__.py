@@ -0,0 +1,21 @@
+"""
+Performance benchmarks for DevBrain.
+
+Run with: python manage.py benchmark <name> [options]
+"""
+
+from . import chat, database, export, extraction, importing, realtime, rollups, search, suite, sync, upstream
+
+BENCHMARKS = {
+    'chat': chat,
+    'database': database,
+    'export': export,
+    'extraction': extraction,
+    'import': importing,
+    'realtime': realtime,
+    'rollups': rollups,
+    'search': search,
+    'suite': suite,
+    'sync': sync,
+    'upstream': upstream,
+}
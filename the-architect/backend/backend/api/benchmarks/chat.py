@@ -0,0 +1,140 @@
+"""
+Chat benchmark - perceived latency and concurrency of the chat endpoints.
+
+Runs in-process against the local stub model (api.stubs.StubGenerativeModel),
+so no network or API key is needed:
+- latency: time to first byte and total time, blocking vs streamed (SSE)
+- concurrency: many simultaneous chats on the async view, against the same
+  chats served the way a sync view is under ASGI (one shared thread)
+The response cache is disabled and the model call limit raised to the
+number of chats. A throwaway user, project and node are
+created and deleted afterwards.
+"""
+
+import asyncio
+import statistics
+import time
+import uuid
+from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, override_settings
+from api.models import Project, Node
+from api.services import GeminiAIService
+
+STUB_BACKEND = 'api.stubs.StubGenerativeModel'
+
+
+async def blocking_request(client, node_id):
+    started = time.perf_counter()
+    response = await client.post(
+        f'/api/chat/node/{node_id}/', {'message': 'Break this down'}, content_type='application/json'
+    )
+    assert response.status_code == 200, response.content
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed  # The answer arrives all at once
+
+
+async def streaming_request(client, node_id):
+    started = time.perf_counter()
+    response = await client.post(
+        f'/api/chat/node/{node_id}/stream/', {'message': 'Break this down'},
+        content_type='application/json', HTTP_ACCEPT='text/event-stream'
+    )
+    assert response.status_code == 200, response.content
+    first_token = None
+    async for chunk in response.streaming_content:
+        if first_token is None and b'event: token' in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+            first_token = time.perf_counter() - started
+    return first_token, time.perf_counter() - started
+
+
+def sync_chat(node, message):
+    """The chat flow as the sync view ran it: blocking saves and model call."""
+    GeminiAIService.save_chat_message(node, 'user', message, 'user')
+    response = GeminiAIService().generate_response(message, node)
+    GeminiAIService.save_chat_message(node, response['role'], response['message'], response['source'])
+
+
+async def run_concurrently(count, request):
+    """Start `count` requests at once; returns (wall seconds, per-request seconds)."""
+    async def timed(index):
+        started = time.perf_counter()
+        await request(index)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(index) for index in range(count)))
+    return time.perf_counter() - started, latencies
+
+
+def add_arguments(parser):
+    parser.add_argument('--requests', type=int, default=5, help='Requests per endpoint')
+    parser.add_argument('--first-token-delay', type=float, default=0.8, help='Stub model delay before the first token (s)')
+    parser.add_argument('--token-delay', type=float, default=0.03, help='Stub model delay between tokens (s)')
+    parser.add_argument('--tokens', type=int, default=60, help='Tokens per stub answer')
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='Simultaneous chats on the async view (0 to skip)')
+    parser.add_argument('--sync-requests', type=int, default=10,
+                        help='Simultaneous chats for the sync baseline (it serves one at a time)')
+    parser.add_argument('--model-latency', type=float, default=0.5,
+                        help='Stub model latency per answer in the concurrency runs (s)')
+
+
+def run(stdout, requests=5, first_token_delay=0.8, token_delay=0.03, tokens=60,
+        concurrency=200, sync_requests=10, model_latency=0.5, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    project = Project.objects.create(name='Chat benchmark', owner=user)
+    node = Node.objects.create(project=project, label='Benchmark node')
+
+    async def measure(request):
+        client = AsyncClient()
+        return [await request(client, node.id) for _ in range(requests)]
+
+    async def post_async(index):
+        response = await AsyncClient().post(
+            f'/api/chat/node/{node.id}/', {'message': f'Question {index}'}, content_type='application/json'
+        )
+        assert response.status_code == 200, response.content
+
+    async def post_sync(index):
+        # Django runs sync views under ASGI with sync_to_async(thread_sensitive=True)
+        await sync_to_async(sync_chat, thread_sensitive=True)(node, f'Question {index}')
+
+    rows, concurrency_rows = [], []
+    try:
+        with override_settings(GEMINI_MODEL_BACKEND=STUB_BACKEND, CHAT_CACHE_BACKEND='',
+                               STUB_MODEL_FIRST_TOKEN_DELAY=first_token_delay,
+                               STUB_MODEL_TOKEN_DELAY=token_delay,
+                               STUB_MODEL_TOKENS=tokens):
+            for label, request in (('blocking', blocking_request), ('streaming', streaming_request)):
+                timings = asyncio.run(measure(request))
+                rows.append((
+                    label,
+                    statistics.median(first for first, _ in timings),
+                    statistics.median(total for _, total in timings),
+                ))
+
+        if concurrency:
+            with override_settings(GEMINI_MODEL_BACKEND=STUB_BACKEND, CHAT_CACHE_BACKEND='',
+                                   STUB_MODEL_FIRST_TOKEN_DELAY=model_latency,
+                                   STUB_MODEL_TOKEN_DELAY=0, STUB_MODEL_TOKENS=tokens,
+                                   LLM_MAX_CONCURRENCY=max(concurrency, sync_requests)):
+                for label, count, request in (('sync view', sync_requests, post_sync),
+                                              ('async view', concurrency, post_async)):
+                    wall, latencies = asyncio.run(run_concurrently(count, request))
+                    concurrency_rows.append((label, count, wall, count / wall, statistics.median(latencies)))
+    finally:
+        project.delete()
+        user.delete()
+
+    stdout.write(f"stub model: {first_token_delay}s to first token, {tokens} tokens at {token_delay}s")
+    stdout.write(f"{'endpoint':<12}{'first byte s':>14}{'total s':>10}")
+    for label, first, total in rows:
+        stdout.write(f"{label:<12}{first:>14.3f}{total:>10.3f}")
+
+    if concurrency_rows:
+        stdout.write(f"\nconcurrent chats, stub model answering in {model_latency}s")
+        stdout.write(f"{'path':<12}{'chats':>8}{'wall s':>10}{'chats/s':>10}{'p50 s':>10}")
+        for label, count, wall, throughput, median in concurrency_rows:
+            stdout.write(f"{label:<12}{count:>8}{wall:>10.2f}{throughput:>10.1f}{median:>10.2f}")
+    return rows + concurrency_rows
@@ -0,0 +1,159 @@
+"""
+Database benchmark - concurrent writes and reads under each database profile.
+
+The profile is read when settings load, so each one runs in its own process
+(DEVBRAIN_DB_PROFILE set, this benchmark re-invoked with --worker) against a
+throwaway test database. --writers threads issue "requests" back to back for
+--duration seconds, rotating through a chat message, a status change and a
+20-node positions write. --readers threads load the project's nodes
+meanwhile. close_old_connections() runs between requests, as the request
+cycle does. Reported per profile: requests/s, p50/p95/max write latency,
+"database is locked" failures and connections opened.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections, connection
+from django.db.backends.signals import connection_created
+from api.models import Node
+from api.positions import write_positions
+from api.services import GeminiAIService
+from .generator import generate_project, percentile
+
+
+def add_arguments(parser):
+    parser.add_argument('--profiles', default='sqlite-basic,sqlite',
+                        help='Comma-separated profiles (postgres needs DEVBRAIN_DB_* set)')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writing threads')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reading threads')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile')
+    parser.add_argument('--nodes', type=int, default=500, help='Nodes in the synthetic project')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+
+
+def run(stdout, profiles='sqlite-basic,sqlite', writers=8, readers=4, duration=5.0, nodes=500,
+        worker=False, **options):
+    if worker:
+        stdout.write(json.dumps(_work(writers, readers, duration, nodes)))
+        return None
+
+    results = {}
+    for profile in profiles.split(','):
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark', 'database',
+                   '--worker', f'--writers={writers}', f'--readers={readers}',
+                   f'--duration={duration}', f'--nodes={nodes}']
+        process = subprocess.run(command, env={**os.environ, 'DEVBRAIN_DB_PROFILE': profile},
+                                 capture_output=True, text=True)
+        if process.returncode:
+            stdout.write(f"{profile}: failed: {process.stderr.strip().splitlines()[-1]}")
+            continue
+        results[profile] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    stdout.write(f"{writers} writers + {readers} readers for {duration:.0f}s, {nodes}-node project")
+    stdout.write(f"{'profile':<14}{'writes/s':>10}{'reads/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+                 f"{'max ms':>9}{'locked':>8}{'connects':>10}")
+    for profile, result in results.items():
+        stdout.write(f"{profile:<14}{result['writes'] / duration:>10.0f}{result['reads'] / duration:>10.0f}"
+                     f"{result['p50'] * 1000:>9.1f}{result['p95'] * 1000:>9.1f}{result['max'] * 1000:>9.1f}"
+                     f"{result['locked']:>8}{result['connections']:>10}")
+    return results
+
+
+def _work(writers, readers, duration, nodes):
+    """One profile, in this process: returns the counters run() reports."""
+    if connection.vendor == 'sqlite':
+        # A file, not the in-memory default: threads need to share the database
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.mkdtemp(prefix='devbrain-bench-'), 'db.sqlite3'
+        )
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    lock = threading.Lock()
+    counts = {'writes': 0, 'reads': 0, 'locked': 0, 'connections': 0}
+    latencies = []
+
+    def opened(sender, **kwargs):
+        with lock:
+            counts['connections'] += 1
+
+    try:
+        user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+        project = generate_project(user, nodes)
+        node_ids = list(project.nodes.values_list('id', flat=True))
+        connection.close()
+        connection_created.connect(opened)
+        deadline = time.perf_counter() + duration
+
+        def chat(rng):
+            GeminiAIService.save_chat_message(Node.objects.get(pk=rng.choice(node_ids)), 'user', 'Benchmark message')
+
+        def status(rng):
+            node = Node.objects.get(pk=rng.choice(node_ids))
+            node.status = rng.choice(['not-started', 'in-progress', 'completed'])
+            node.save()
+
+        def positions(rng):
+            write_positions({node_id: (rng.uniform(0, 5000), rng.uniform(0, 5000))
+                             for node_id in rng.sample(node_ids, 20)})
+
+        def write(index):
+            rng = random.Random(index)
+            operations = (chat, status, positions)
+            turn = index
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operations[turn % len(operations)](rng)
+                except OperationalError:
+                    with lock:
+                        counts['locked'] += 1
+                else:
+                    with lock:
+                        counts['writes'] += 1
+                        latencies.append(time.perf_counter() - started)
+                finally:
+                    close_old_connections()
+                turn += 1
+            connection.close()
+
+        def read():
+            while time.perf_counter() < deadline:
+                try:
+                    list(Node.objects.filter(project=project).values_list('id', 'status', 'position_x', 'position_y'))
+                except OperationalError:
+                    with lock:
+                        counts['locked'] += 1
+                else:
+                    with lock:
+                        counts['reads'] += 1
+                finally:
+                    close_old_connections()
+            connection.close()
+
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(writers)]
+        threads += [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connection_created.disconnect(opened)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {
+        **counts,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': max(latencies, default=0.0),
+    }
@@ -0,0 +1,70 @@
+"""
+Export benchmark - peak memory and time to first byte of project exports.
+
+Generates synthetic projects with chat messages (see generator.py) and
+exports each one both ways:
+- json:        GET /api/projects/{id}/export/ (whole ProjectDetailSerializer)
+- ndjson.gz:   GET /api/projects/{id}/export/?format=ndjson (streamed)
+Peak memory is measured with tracemalloc. The synthetic projects are
+deleted afterwards.
+"""
+
+import time
+import tracemalloc
+import uuid
+from django.contrib.auth.models import User
+from django.test import Client
+from .generator import generate_project
+
+
+def measure(client, url):
+    """Fetch url, reading streamed bodies chunk by chunk; returns (first byte s, total s, peak MB, bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    first_byte = None
+    size = 0
+    if response.streaming:
+        for chunk in response.streaming_content:
+            first_byte = first_byte or time.perf_counter() - started
+            size += len(chunk)
+    else:
+        first_byte = time.perf_counter() - started
+        size = len(response.content)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, total, peak / (1024 * 1024), size
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', default='250,1000,10000', help='Comma-separated node counts')
+    parser.add_argument('--messages', type=int, default=4, help='Chat messages per node')
+    parser.add_argument('--json-max-nodes', type=int, default=500,
+                        help='Skip the (slow, nested) JSON export above this many nodes')
+
+
+def run(stdout, sizes='250,1000,10000', messages=4, json_max_nodes=500, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+    rows = []
+    try:
+        for size in [int(value) for value in sizes.split(',')]:
+            project = generate_project(user, size, messages=messages)
+            for label, url in (('json', f'/api/projects/{project.id}/export/'),
+                               ('ndjson.gz', f'/api/projects/{project.id}/export/?format=ndjson')):
+                if label == 'json' and size > json_max_nodes:
+                    continue
+                rows.append((size, label, *measure(client, url)))
+            project.delete()
+    finally:
+        user.delete()
+
+    stdout.write(f"{messages} chat messages per node")
+    stdout.write(f"{'nodes':>8}  {'format':<10}{'first byte s':>14}{'total s':>10}{'peak MB':>10}{'size MB':>10}")
+    for size, label, first_byte, total, peak, body in rows:
+        stdout.write(f"{size:>8}  {label:<10}{first_byte:>14.3f}{total:>10.2f}{peak:>10.1f}"
+                     f"{body / (1024 * 1024):>10.2f}")
+    return rows
@@ -0,0 +1,160 @@
+"""
+Extraction benchmark - peak memory of streaming ingestion on large synthetic files.
+
+Compares the streaming pipeline (extract -> chunk -> tokenize) against
+reading and decoding the whole file up front, as uploads used to be handled,
+and serial against process-pool PDF page extraction.
+"""
+
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.files import File
+from django.test import override_settings
+from api import extraction
+from api.extraction import iter_pages
+from api.indexing import split_passages, tokenize
+
+WORDS = (
+    "architecture service database cache latency schema request response "
+    "token vector index passage project node edge status deploy queue worker"
+).split()
+
+
+def write_text_file(path, size_mb: int):
+    """Write roughly size_mb megabytes of random words."""
+    rng = random.Random(42)
+    line = " ".join(rng.choice(WORDS) for _ in range(200)) + "\n"
+    with open(path, 'w', encoding='utf-8') as handle:
+        written = 0
+        while written < size_mb * 1024 * 1024:
+            handle.write(line)
+            written += len(line)
+
+
+def write_docx_file(path, size_mb: int):
+    """Write a DOCX of roughly size_mb megabytes of paragraph text."""
+    from docx import Document
+    rng = random.Random(42)
+    doc = Document()
+    written = 0
+    while written < size_mb * 1024 * 1024:
+        text = " ".join(rng.choice(WORDS) for _ in range(100))
+        doc.add_paragraph(text)
+        written += len(text)
+    doc.save(path)
+
+
+def write_pdf_file(path, pages: int, lines_per_page: int = 40):
+    """Write a plain-text PDF with the given number of pages."""
+    rng = random.Random(42)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        body = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = body.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    with open(path, 'wb') as handle:
+        handle.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(handle.tell())
+            handle.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = handle.tell()
+        handle.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            handle.write(b"%010d 00000 n \n" % offset)
+        handle.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (len(objects) + 1, xref))
+
+
+def measure(func):
+    """
+    Run func twice: once timed, once under tracemalloc for peak memory
+    (tracing slows allocation-heavy code, so it would skew the timing).
+    Returns (result, seconds, peak traced bytes).
+    """
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def streaming_pipeline(path):
+    with open(path, 'rb') as handle:
+        file_obj = File(handle, name=os.path.basename(path))
+        passages = terms = 0
+        for passage in split_passages(iter_pages(file_obj)):
+            passages += 1
+            terms += len(tokenize(passage['text']))
+        return passages, terms
+
+
+def whole_file_pipeline(path):
+    with open(path, 'rb') as handle:
+        text = handle.read().decode('utf-8', errors='ignore')
+    passages = terms = 0
+    for passage in split_passages([(1, text)]):
+        passages += 1
+        terms += len(tokenize(passage['text']))
+    return passages, terms
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', default='10,100', help='Text file sizes in MB, comma separated')
+    parser.add_argument('--docx-size', type=int, default=5, help='DOCX size in MB (0 to skip)')
+    parser.add_argument('--pdf-pages', type=int, default=500, help='PDF page count (0 to skip)')
+    parser.add_argument('--pdf-workers', type=int, default=None,
+                        help='Process pool size for the parallel PDF run (default: PDF_EXTRACTION_WORKERS)')
+
+
+def run(stdout, sizes='10,100', docx_size=5, pdf_pages=500, pdf_workers=None, **options):
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        if pdf_pages:
+            path = os.path.join(directory, f'synthetic-{pdf_pages}p.pdf')
+            write_pdf_file(path, pdf_pages)
+            workers = pdf_workers or max(settings.PDF_EXTRACTION_WORKERS, 2)
+            for label, worker_count in (('serial', 1), (f'{workers} procs', workers)):
+                with override_settings(PDF_EXTRACTION_WORKERS=worker_count, PDF_PARALLEL_MIN_PAGES=1):
+                    if worker_count > 1:
+                        extraction.get_pdf_pool().submit(int).result()  # Exclude worker start-up
+                    (passages, _), elapsed, peak = measure(lambda: streaming_pipeline(path))
+                    extraction.shutdown_pdf_pool()
+                rows.append((f'pdf {pdf_pages} p', label, passages, elapsed, peak))
+
+        for size in [int(value) for value in sizes.split(',') if value]:
+            path = os.path.join(directory, f'synthetic-{size}mb.txt')
+            write_text_file(path, size)
+            for label, pipeline in (('streaming', streaming_pipeline), ('whole-file', whole_file_pipeline)):
+                (passages, _), elapsed, peak = measure(lambda: pipeline(path))
+                rows.append((f'txt {size} MB', label, passages, elapsed, peak))
+
+        if docx_size:
+            path = os.path.join(directory, f'synthetic-{docx_size}mb.docx')
+            write_docx_file(path, docx_size)
+            (passages, _), elapsed, peak = measure(lambda: streaming_pipeline(path))
+            rows.append((f'docx {docx_size} MB', 'streaming', passages, elapsed, peak))
+
+    stdout.write(f"{'file':<14}{'pipeline':<12}{'passages':>10}{'seconds':>10}{'peak MB':>10}")
+    for name, label, passages, elapsed, peak in rows:
+        stdout.write(f"{name:<14}{label:<12}{passages:>10}{elapsed:>10.2f}{peak / 2**20:>10.1f}")
+    return rows
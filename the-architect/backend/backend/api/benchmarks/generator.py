@@ -0,0 +1,117 @@
+"""
+Synthetic project generator for benchmarks.
+
+generate_project() builds a project of a given shape in bulk: `nodes` nodes
+laid out breadth-first as trees of `fanout` children per node, at most
+`depth` levels deep (a new root starts when a tree is full); an edge from
+every parent to each child plus `edges` random cross links; `messages` chat
+messages per node; and `documents` plain-text knowledge files of
+`document_kb` KB each, ingested as an upload would be. Content is seeded, so
+the same arguments give the same project (ids aside).
+
+Every benchmark builds its projects here, and reports latencies with the
+shared percentile() helper.
+"""
+
+import random
+import uuid
+from django.core.files.base import ContentFile
+from api.models import Project, Node, Edge, ChatMessage, KnowledgeBase
+from api.blobs import acquire_blob
+from api.hierarchy import NodeHierarchy
+from api.ingestion import ingest_knowledge_base
+from api.rollups import StatusRollup
+
+BULK_BATCH_SIZE = 2000
+STATUSES = ['not-started', 'in-progress', 'completed']
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pra', 'dor', 'fen', 'gal', 'hix', 'jun',
+             'bel', 'cor', 'wen', 'yst', 'qua', 'ple', 'tro', 'mar', 'sil']
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank value at `fraction` (0 to 1) of `values`; 0.0 when empty."""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def make_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_text(rng, words, size: int) -> str:
+    """Roughly `size` characters of sentences drawn from `words`."""
+    sentences, length = [], 0
+    while length < size:
+        sentence = ' '.join(rng.choice(words) for _ in range(rng.randint(6, 18))).capitalize() + '.'
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(sentences)
+
+
+def add_document(project, owner, title: str, text: str) -> KnowledgeBase:
+    """Store `text` as a .txt knowledge file and ingest it inline."""
+    blob = acquire_blob(ContentFile(text.encode('utf-8'), name=f'{title}.txt'))
+    kb = KnowledgeBase.objects.create(
+        project=project, title=title, file_type='txt', uploaded_by=owner, blob=blob, file=blob.file.name
+    )
+    ingest_knowledge_base(kb.pk)
+    return kb
+
+
+def generate_project(owner, nodes: int = 1000, depth: int = 6, fanout: int = 4, edges: int = 0,
+                     messages: int = 0, documents: int = 0, document_kb: int = 64, seed: int = 42) -> Project:
+    """Create a synthetic project of the given shape (see the module docstring)."""
+    rng = random.Random(seed)
+    words = make_words(rng, 2000)
+    project = Project.objects.create(name=f'Synthetic {nodes}', owner=owner)
+
+    rows, levels = [], {}
+    parents = iter(())  # Nodes with room for children, breadth-first
+    for index in range(nodes):
+        parent = next(parents, None)
+        if parent is None:
+            tree = []
+        node = Node(
+            id=str(uuid.uuid4()), project=project, parent=parent,
+            label=' '.join(rng.sample(words, rng.randint(1, 4))).capitalize(),
+            description=make_text(rng, words, rng.randint(40, 300)), status=rng.choice(STATUSES),
+            position_x=rng.uniform(0, 5000), position_y=rng.uniform(0, 5000),
+        )
+        levels[node.id] = levels[parent.id] + 1 if parent else 1
+        rows.append(node)
+        tree.append(node)
+        if parent is None:
+            # Each node in the tree takes `fanout` children until the depth is reached
+            parents = (
+                candidate for candidate in tree if levels[candidate.id] < depth
+                for _ in range(fanout)
+            )
+    StatusRollup.fill(rows)
+    Node.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    NodeHierarchy.insert_many(rows)
+
+    pairs = {(node.parent_id, node.id) for node in rows if node.parent_id}
+    links = set()
+    while len(links) < min(edges, len(rows) * (len(rows) - 1) - len(pairs)):
+        source, target = rng.sample(rows, 2)
+        if (source.id, target.id) not in pairs:
+            links.add((source.id, target.id))
+    Edge.objects.bulk_create(
+        [Edge(project=project, source_id=source, target_id=target) for source, target in sorted(pairs | links)],
+        batch_size=BULK_BATCH_SIZE
+    )
+
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        ChatMessage.objects.bulk_create([
+            ChatMessage(node=node, role='user' if turn % 2 == 0 else 'ai',
+                        message=make_text(rng, words, 200 if turn % 2 == 0 else 800),
+                        source='user' if turn % 2 == 0 else 'mock')
+            for node in rows[start:start + BULK_BATCH_SIZE] for turn in range(messages)
+        ], batch_size=BULK_BATCH_SIZE)
+
+    for index in range(documents):
+        add_document(project, owner, f'Document {index}', make_text(rng, words, document_kb * 1024))
+    return project
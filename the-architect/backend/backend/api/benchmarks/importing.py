@@ -0,0 +1,102 @@
+"""
+Import benchmark - bulk import of a large export vs replaying node creates.
+
+Generates a gzipped NDJSON export of a synthetic project (a random tree of
+--nodes nodes with their parent edges and chat messages) in memory, then:
+- import:  api.importing.import_project (bulk_create in one transaction)
+- replay:  POST /api/nodes/ once per node, as recreating a project took
+           before, for --replay-nodes nodes (extrapolated to --nodes)
+Imported projects are deleted afterwards.
+"""
+
+import gzip
+import io
+import json
+import random
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from api.models import Project
+from api.exporting import EXPORT_FORMAT, EXPORT_VERSION
+from api.importing import import_project
+
+
+def synthetic_export(nodes: int, messages_per_node: int, seed: int = 42) -> bytes:
+    """A gzipped NDJSON export of a random tree of `nodes` nodes."""
+    rng = random.Random(seed)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(nodes)]
+    parents = [None] + [ids[rng.randrange(index)] for index in range(1, nodes)]
+    records = [{'type': 'project', 'format': EXPORT_FORMAT, 'version': EXPORT_VERSION, 'name': f'Synthetic {nodes}'}]
+    records += [
+        {'type': 'node', 'id': node_id, 'parent': parent, 'label': f'Node {index}', 'description': '',
+         'status': 'not-started', 'position_x': rng.uniform(0, 5000), 'position_y': rng.uniform(0, 5000)}
+        for index, (node_id, parent) in enumerate(zip(ids, parents))
+    ]
+    records += [
+        {'type': 'edge', 'source': parent, 'target': node_id}
+        for node_id, parent in zip(ids, parents) if parent
+    ]
+    records += [
+        {'type': 'chat_message', 'node': node_id, 'role': 'user' if turn % 2 == 0 else 'ai',
+         'message': f'Message {turn} about node {index}', 'source': 'user' if turn % 2 == 0 else 'mock'}
+        for index, node_id in enumerate(ids) for turn in range(messages_per_node)
+    ]
+    return gzip.compress("".join(json.dumps(record) + "\n" for record in records).encode('utf-8'))
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts statements (executemany counts once)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def add_arguments(parser):
+    parser.add_argument('--nodes', type=int, default=50000, help='Nodes in the synthetic project')
+    parser.add_argument('--messages', type=int, default=2, help='Chat messages per node')
+    parser.add_argument('--replay-nodes', type=int, default=200,
+                        help='Nodes created one request at a time for the baseline (0 to skip)')
+
+
+def run(stdout, nodes=50000, messages=2, replay_nodes=200, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    data = synthetic_export(nodes, messages)
+    try:
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            project, counts = import_project(io.BytesIO(data), user)
+            elapsed = time.perf_counter() - started
+        rows = counts['nodes'] + counts['edges'] + counts['chat_messages']
+
+        replay = None
+        if replay_nodes:
+            client = Client()
+            client.force_login(user)
+            target = Project.objects.create(name='Replay', owner=user)
+            parents = [None]
+            rng = random.Random(42)
+            started = time.perf_counter()
+            for index in range(replay_nodes):
+                response = client.post('/api/nodes/', {
+                    'project': target.id, 'label': f'Node {index}', 'parent': rng.choice(parents),
+                }, content_type='application/json')
+                assert response.status_code == 201, response.content
+                parents.append(response.json()['id'])
+            replay = (time.perf_counter() - started) / replay_nodes
+    finally:
+        user.delete()
+
+    stdout.write(f"{nodes} nodes, {counts['edges']} edges, {counts['chat_messages']} chat messages "
+                 f"({len(data) / (1024 * 1024):.1f} MB gzipped NDJSON)")
+    stdout.write(f"import: {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s, {queries.count} queries")
+    if replay is not None:
+        stdout.write(f"replay: {replay * 1000:.1f} ms per node over {replay_nodes} POST /api/nodes/ "
+                     f"-> ~{replay * nodes:.0f}s for {nodes} nodes (without chat)")
+    return elapsed, replay
@@ -0,0 +1,111 @@
+"""
+Realtime benchmark - N collaborators watching a drag: push vs polling.
+
+Opens --clients WebSocket connections to one project (in process, through
+config.asgi.application) and drags a node through --moves positions over
+--duration seconds. Reports what each client received and how many
+batches the server encoded, against the requests N clients make polling
+GET /api/projects/{id}/changes/ once per tick for the same duration
+(measured per poll, then extrapolated).
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+from api.models import Project, Node
+from api.metrics import metrics
+from api.realtime import publish_moves
+
+
+async def _connect(application, path, cookie):
+    incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+    scope = {'type': 'websocket', 'path': path, 'headers': [(b'cookie', cookie.encode())], 'query_string': b''}
+    task = asyncio.ensure_future(application(scope, incoming.get, outgoing.put))
+    await incoming.put({'type': 'websocket.connect'})
+    accepted = await outgoing.get()
+    assert accepted['type'] == 'websocket.accept', accepted
+    await outgoing.get()  # hello
+    return incoming, outgoing, task
+
+
+async def _collect(outgoing, until: float, received: list):
+    while True:
+        try:
+            message = await asyncio.wait_for(outgoing.get(), max(until - time.perf_counter(), 0.01))
+        except asyncio.TimeoutError:
+            return
+        received.append((time.perf_counter(), message['text']))
+
+
+async def _drag(application, project, node, cookie, clients, moves, duration):
+    path = f'/ws/projects/{project.id}/'
+    sockets = [await _connect(application, path, cookie) for _ in range(clients)]
+    received = [[] for _ in sockets]
+    settle = settings.REALTIME_TICK * 4
+    collectors = [
+        asyncio.ensure_future(_collect(outgoing, time.perf_counter() + duration + settle, messages))
+        for (_, outgoing, _), messages in zip(sockets, received)
+    ]
+    batches_before = metrics.value('devbrain_realtime_batches_total')
+    started = time.perf_counter()
+    for index in range(moves):
+        publish_moves({node.id: (float(index), float(index))}, project.id)
+        await asyncio.sleep(max(started + duration * (index + 1) / moves - time.perf_counter(), 0))
+    last_move = time.perf_counter()
+    await asyncio.gather(*collectors)
+    batches = metrics.value('devbrain_realtime_batches_total') - batches_before
+
+    for incoming, _, task in sockets:
+        await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await task
+    last_position = [json.loads(messages[-1][1])['moves'][-1][1:] for messages in received if messages]
+    return received, batches, last_move, last_position
+
+
+def add_arguments(parser):
+    parser.add_argument('--clients', type=int, default=50, help='WebSocket clients watching the project')
+    parser.add_argument('--moves', type=int, default=600, help='Positions in the drag')
+    parser.add_argument('--duration', type=float, default=2.0, help='Seconds the drag lasts')
+    parser.add_argument('--polls', type=int, default=50, help='Polls timed for the polling estimate')
+
+
+def run(stdout, clients=50, moves=600, duration=2.0, polls=50, **options):
+    from config.asgi import application
+
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    try:
+        project = Project.objects.create(name='Realtime', owner=user)
+        node = Node.objects.create(project=project, label='Dragged')
+        received, batches, last_move, last_position = asyncio.run(
+            _drag(application, project, node, cookie, clients, moves, duration)
+        )
+
+        url = f'/api/projects/{project.id}/changes/?since={Project.objects.get(pk=project.pk).version}'
+        etag = client.get(url)['ETag']
+        started = time.perf_counter()
+        for _ in range(polls):
+            assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        poll_seconds = (time.perf_counter() - started) / polls
+    finally:
+        user.delete()
+
+    per_client = [len(messages) for messages in received]
+    sizes = [sum(len(text) for _, text in messages) for messages in received]
+    lag = max(messages[-1][0] - last_move for messages in received if messages)
+    tick = settings.REALTIME_TICK
+    poll_requests = clients * duration / tick
+    stdout.write(f"{clients} clients, {moves} moves over {duration:.1f}s, tick {tick * 1000:.0f} ms")
+    stdout.write(f"push:    {batches} batches encoded, {min(per_client)}-{max(per_client)} messages "
+                 f"and {max(sizes) / 1024:.1f} KB per client, final position everywhere: "
+                 f"{len(set(map(tuple, last_position))) == 1 and len(last_position) == clients}, "
+                 f"last delivery {lag * 1000:.0f} ms after the last move")
+    stdout.write(f"polling: {clients} clients every {tick * 1000:.0f} ms = {poll_requests:,.0f} requests "
+                 f"({poll_seconds * 1000:.1f} ms each even when 304 -> {poll_requests * poll_seconds:.1f}s of server time)")
+    return batches, per_client, poll_seconds
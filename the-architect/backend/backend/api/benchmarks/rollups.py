@@ -0,0 +1,83 @@
+"""
+Rollups benchmark - project lists and progress reads: counting vs stored counts.
+
+Builds --projects synthetic projects of --nodes nodes each, then measures:
+- list:      GET /api/projects/ (node_count and progress from the project rows)
+- counted:   the same numbers aggregated per project, as the list did before
+- branch:    a subtree's progress from the node row vs aggregated over the closure table
+- status:    cost of one update_status, which now maintains the rollups
+The synthetic projects are deleted afterwards.
+"""
+
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from api.models import Project, Node
+from api.rollups import StatusRollup, subtree_counts, project_counts, progress
+from .generator import generate_project
+
+
+def timed(function, repeat):
+    """Best of `repeat` calls; returns (seconds, queries)."""
+    best, queries = None, 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best, queries = elapsed, len(captured)
+    return best, queries
+
+
+def add_arguments(parser):
+    parser.add_argument('--projects', type=int, default=50, help='Synthetic projects in the list')
+    parser.add_argument('--nodes', type=int, default=1000, help='Nodes per project')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+
+
+def run(stdout, projects=50, nodes=1000, repeat=5, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+    rows = []
+    try:
+        built = [generate_project(user, nodes, seed=index) for index in range(projects)]
+
+        def counted():
+            for project in Project.objects.filter(owner=user):
+                counts = dict(project.nodes.values_list('status').annotate(count=Count('id')).order_by())
+                progress(counts)
+
+        rows.append(('list', *timed(lambda: client.get('/api/projects/'), repeat)))
+        rows.append(('counted', *timed(counted, repeat)))
+
+        root = built[0].nodes.filter(parent__isnull=True).order_by('created_at').first()
+        rows.append(('branch row', *timed(
+            lambda: progress(subtree_counts(Node.objects.get(pk=root.pk))), repeat)))
+        rows.append(('branch agg', *timed(lambda: progress(dict(
+            Node.objects.filter(ancestor_links__ancestor_id=root.pk)
+            .values_list('status').annotate(count=Count('id')).order_by()
+        )), repeat)))
+
+        leaf = built[0].nodes.order_by('created_at').last()
+        statuses = iter(['completed', 'in-progress'] * repeat)
+        rows.append(('status', *timed(lambda: client.post(
+            f'/api/nodes/{leaf.id}/update_status/', {'status': next(statuses)}, content_type='application/json'
+        ), repeat)))
+
+        stored = project_counts(Project.objects.get(pk=built[0].pk))
+        StatusRollup.rebuild(built[0].pk)
+        consistent = stored == project_counts(Project.objects.get(pk=built[0].pk))
+    finally:
+        user.delete()
+
+    stdout.write(f"{projects} projects x {nodes} nodes, best of {repeat}, rollups consistent: {consistent}")
+    stdout.write(f"{'read':<12}{'ms':>10}{'queries':>9}")
+    for label, elapsed, queries in rows:
+        stdout.write(f"{label:<12}{elapsed * 1000:>10.2f}{queries:>9}")
+    return rows
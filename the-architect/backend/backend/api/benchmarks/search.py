@@ -0,0 +1,98 @@
+"""
+Search benchmark - quick-jump node search while typing, on a large project.
+
+Generates a project of --nodes nodes (see generator.py), then types --queries labels one keystroke at a time against
+GET /api/search/nodes/, and searches misspelt copies of them. Reports
+per-keystroke latency (warm index), the first search (index build), a
+search after --edits renames (incremental refresh), and the LIKE '%q%'
+scan the generic SearchFilter does, for comparison. The synthetic project
+is deleted afterwards.
+"""
+
+import random
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.test import Client
+from api.models import Node
+from .generator import generate_project, make_words, percentile
+
+
+def misspell(rng, text):
+    """Drop, double or swap one character of the first word longer than three."""
+    word = next((word for word in text.split() if len(word) > 3), text)
+    at = rng.randrange(1, len(word) - 1)
+    typo = rng.choice([
+        word[:at] + word[at + 1:],
+        word[:at] + word[at] + word[at:],
+        word[:at - 1] + word[at] + word[at - 1] + word[at + 1:],
+    ])
+    return text.replace(word, typo, 1)
+
+
+def add_arguments(parser):
+    parser.add_argument('--nodes', type=int, default=100000, help='Nodes in the synthetic project')
+    parser.add_argument('--queries', type=int, default=50, help='Labels typed keystroke by keystroke')
+    parser.add_argument('--edits', type=int, default=100, help='Nodes renamed before the refresh measurement')
+
+
+def run(stdout, nodes=100000, queries=50, edits=100, **options):
+    rng = random.Random(7)
+    words = make_words(rng, 5000)
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+
+    def search(query):
+        started = time.perf_counter()
+        response = client.get('/api/search/nodes/', {'q': query})
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.status_code
+        return elapsed, [result['label'] for result in response.json()['results']]
+
+    try:
+        project = generate_project(user, nodes, seed=7)
+        rows = list(project.nodes.values_list('id', 'label'))
+        labels = [label for _, label in rng.sample(rows, queries)]
+
+        cold, _ = search(labels[0][:3])
+
+        keystrokes, found = [], 0
+        for label in labels:
+            for end in range(1, len(label) + 1):
+                elapsed, results = search(label[:end])
+                keystrokes.append(elapsed)
+            found += label in results
+
+        typos, typo_found = [], 0
+        for label in labels:
+            elapsed, results = search(misspell(rng, label))
+            typos.append(elapsed)
+            typo_found += label in results
+
+        for node in Node.objects.filter(id__in=[node_id for node_id, _ in rng.sample(rows, edits)]):
+            node.label = f'Renamed {rng.choice(words)}'
+            node.save()
+        refresh, _ = search(labels[0])
+
+        like = []
+        for label in labels[:10]:
+            query = label.split()[0][:6].lower()
+            started = time.perf_counter()
+            list(Node.objects.filter(project__owner=user).filter(
+                Q(label__icontains=query) | Q(description__icontains=query)
+            ).values_list('id', flat=True)[:20])
+            like.append(time.perf_counter() - started)
+    finally:
+        user.delete()
+
+    stdout.write(f"{nodes} nodes, {queries} labels typed ({len(keystrokes)} keystrokes)")
+    stdout.write(f"{'search':<28}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for label, values in (('keystroke (endpoint)', keystrokes), ('misspelt label', typos),
+                          ("LIKE '%q%' scan", like)):
+        stdout.write(f"{label:<28}" + ''.join(f"{value:>9.1f}" for value in (
+            percentile(values, 0.5) * 1000, percentile(values, 0.95) * 1000, max(values) * 1000)))
+    stdout.write(f"first search (index build): {cold * 1000:.0f} ms; after {edits} renames: {refresh * 1000:.1f} ms")
+    stdout.write(f"full label in top results: {found}/{queries}; misspelt label found: {typo_found}/{queries}")
+    return keystrokes, typos, like
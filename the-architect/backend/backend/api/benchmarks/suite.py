@@ -0,0 +1,227 @@
+"""
+Suite benchmark - the main read and write paths, diffed against a stored baseline.
+
+Generates one synthetic project (see generator.py for the shape options) and
+measures, through the API:
+- detail:      GET /api/projects/{id}/ (nested nodes)
+- snapshot:    GET /api/projects/{id}/snapshot/
+- nodes:       GET /api/nodes/?project={id}, following `next` to the end
+- node search: GET /api/search/nodes/?q=
+- knowledge:   GET /api/knowledge/search/?q=
+- chat:        POST /api/chat/node/{id}/ with the stub model (no delay, no cache)
+- export:      GET /api/projects/{id}/export/?format=ndjson, read to the end
+- upload:      POST /api/knowledge/ of a new --upload-kb KB text file, ingested inline
+Each is called once to warm up, once to count SQL queries and peak memory
+(tracemalloc), then --repeat times for p50/p95/p99/max latency.
+
+Results are compared with --baseline (baseline.json here by default) when it
+exists; --save-baseline records this run instead. A p95 or peak memory more
+than --tolerance above the baseline, or more queries, is a regression, and
+--check makes that fail the command. Latency baselines only mean something on
+the machine that recorded them; query counts carry over.
+"""
+
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+import uuid
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from .chat import STUB_BACKEND
+from .generator import generate_project, make_text, make_words, percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SCENARIOS = ['detail', 'snapshot', 'nodes', 'node search', 'knowledge', 'chat', 'export', 'upload']
+NOISE_MS = 5.0  # Differences below these are run-to-run noise, never a regression
+NOISE_MB = 0.5
+
+
+def measure(call, repeat):
+    """Warm up, count queries and peak memory on one call, then time `repeat` calls."""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    call(0)
+    # Not CaptureQueriesContext: every request resets connection.queries
+    with connection.execute_wrapper(record):
+        tracemalloc.start()
+        call(1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    timings = []
+    for index in range(repeat):
+        started = time.perf_counter()
+        call(index + 2)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': len(queries),
+        'peak_mb': round(peak / (1024 * 1024), 2),
+    }
+
+
+def regressions(result, base, tolerance):
+    """Names of the measures in `result` that are worse than `base`."""
+    worse = []
+    if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and result['p95_ms'] - base['p95_ms'] > NOISE_MS:
+        worse.append('p95')
+    if result['queries'] > base['queries']:
+        worse.append('queries')
+    if result['peak_mb'] > base['peak_mb'] * (1 + tolerance) and result['peak_mb'] - base['peak_mb'] > NOISE_MB:
+        worse.append('memory')
+    return worse
+
+
+def add_arguments(parser):
+    parser.add_argument('--nodes', type=int, default=500, help='Nodes in the synthetic project')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum tree depth')
+    parser.add_argument('--fanout', type=int, default=4, help='Children per node')
+    parser.add_argument('--edges', type=int, default=200, help='Cross links on top of the parent-child edges')
+    parser.add_argument('--messages', type=int, default=2, help='Chat messages per node')
+    parser.add_argument('--documents', type=int, default=5, help='Knowledge files in the project')
+    parser.add_argument('--document-kb', type=int, default=64, help='Size of each knowledge file (KB)')
+    parser.add_argument('--upload-kb', type=int, default=256, help='Size of each uploaded file (KB)')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed calls per scenario')
+    parser.add_argument('--only', default='', help='Comma-separated scenarios: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file to diff against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write this run to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 and memory growth (fraction)')
+    parser.add_argument('--check', action='store_true', help='Fail if anything regressed against the baseline')
+
+
+def run(stdout, nodes=500, depth=6, fanout=4, edges=200, messages=2, documents=5, document_kb=64,
+        upload_kb=256, repeat=10, only='', baseline=BASELINE_PATH, save_baseline=False, tolerance=0.25,
+        check=False, **options):
+    requested = {name.strip() for name in only.split(',') if name.strip()}
+    if requested - set(SCENARIOS):
+        raise CommandError(f"Unknown scenarios: {', '.join(sorted(requested - set(SCENARIOS)))}")
+    # Always in SCENARIOS order: uploads would change what knowledge search sees
+    names = [name for name in SCENARIOS if name in requested or not requested]
+    shape = {'nodes': nodes, 'depth': depth, 'fanout': fanout, 'edges': edges, 'messages': messages,
+             'documents': documents, 'document_kb': document_kb, 'upload_kb': upload_kb, 'repeat': repeat}
+
+    rng = random.Random(11)
+    words = make_words(rng, 2000)
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+
+    def get(url, params=None):
+        response = client.get(url, params)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+
+    results = {}
+    try:
+        started = time.perf_counter()
+        project = generate_project(user, nodes, depth, fanout, edges, messages, documents, document_kb)
+        generated = time.perf_counter() - started
+        labels = list(project.nodes.values_list('label', flat=True)[:200])
+        node_id = project.nodes.order_by('created_at').values_list('id', flat=True).first()
+
+        def walk_nodes(index):
+            url, params = '/api/nodes/', {'project': project.id, 'page_size': 500}
+            while url:
+                page = get(url, params).json()
+                url, params = page['next'], None
+
+        def export(index):
+            for _ in get(f'/api/projects/{project.id}/export/', {'format': 'ndjson'}).streaming_content:
+                pass
+
+        def chat(index):
+            response = client.post(f'/api/chat/node/{node_id}/', {'message': f'Question {index}'},
+                                   content_type='application/json')
+            assert response.status_code == 200, response.status_code
+
+        uploads = [make_text(rng, words, upload_kb * 1024).encode('utf-8') for _ in range(repeat + 2)] \
+            if 'upload' in names else []
+
+        def upload(index):
+            response = client.post('/api/knowledge/', {
+                'project': project.id, 'title': f'Upload {index}', 'file_type': 'txt',
+                'file': SimpleUploadedFile(f'upload-{index}.txt', uploads[index], content_type='text/plain'),
+            })
+            assert response.status_code == 201, response.content
+            state = get(f"/api/knowledge/{response.json()['id']}/status/").json()
+            assert state['ingestion_status'] == 'ready', state
+
+        calls = {
+            'detail': lambda index: get(f'/api/projects/{project.id}/'),
+            'snapshot': lambda index: get(f'/api/projects/{project.id}/snapshot/'),
+            'nodes': walk_nodes,
+            'node search': lambda index: get('/api/search/nodes/', {'q': labels[index % len(labels)][:8]}),
+            'knowledge': lambda index: get('/api/knowledge/search/', {
+                'project': project.id, 'q': labels[index % len(labels)]
+            }),
+            'chat': chat,
+            'export': export,
+            'upload': upload,
+        }
+        with override_settings(GEMINI_MODEL_BACKEND=STUB_BACKEND, CHAT_CACHE_BACKEND='',
+                               STUB_MODEL_FIRST_TOKEN_DELAY=0, STUB_MODEL_TOKEN_DELAY=0,
+                               INGESTION_EAGER=True):
+            for name in names:
+                results[name] = measure(calls[name], repeat)
+        client.delete(f'/api/projects/{project.id}/')  # Releases the knowledge blobs
+    finally:
+        user.delete()
+
+    stdout.write(f"{nodes} nodes (depth {depth}, fan-out {fanout}), {edges} cross links, "
+                 f"{messages} messages/node, {documents} x {document_kb} KB documents; "
+                 f"generated in {generated:.1f}s; {repeat} timed calls each")
+
+    recorded = {}
+    if os.path.exists(baseline) and not save_baseline:
+        with open(baseline) as handle:
+            recorded = json.load(handle)
+        changed = {key: (value, shape.get(key)) for key, value in recorded.get('shape', {}).items()
+                   if shape.get(key) != value}
+        if changed:
+            stdout.write('baseline recorded with other options: ' + ', '.join(
+                f'{key} {old} (now {new})' for key, (old, new) in sorted(changed.items())))
+
+    stdout.write(f"{'scenario':<13}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'queries':>9}"
+                 f"{'peak MB':>9}  vs baseline")
+    regressed = []
+    for name, result in results.items():
+        line = (f"{name:<13}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result['max_ms']:>9.1f}{result['queries']:>9}{result['peak_mb']:>9.1f}")
+        base = recorded.get('results', {}).get(name)
+        if base:
+            worse = regressions(result, base, tolerance)
+            regressed += [f'{name} {measure_name}' for measure_name in worse]
+            change = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+            line += (f"  p95 {change:+.0f}%, queries {result['queries'] - base['queries']:+d}, "
+                     f"peak {result['peak_mb'] - base['peak_mb']:+.1f} MB")
+            if worse:
+                line += '  REGRESSION: ' + ', '.join(worse)
+        stdout.write(line)
+
+    if save_baseline:
+        with open(baseline, 'w') as handle:
+            json.dump({
+                'shape': shape,
+                'environment': {'python': platform.python_version(), 'machine': platform.machine(),
+                                'database': connection.vendor},
+                'results': results,
+            }, handle, indent=2)
+            handle.write('\n')
+        stdout.write(f"baseline written to {baseline}")
+    elif recorded:
+        stdout.write(f"{len(regressed)} regressions against {baseline} (tolerance {tolerance:.0%})")
+        if check and regressed:
+            raise CommandError('Regressed: ' + ', '.join(regressed))
+    return results
@@ -0,0 +1,65 @@
+"""
+Sync benchmark - polling a large map: full snapshots vs delta sync.
+
+Builds a synthetic project, then measures what one poll costs a client:
+- snapshot:      GET /api/projects/{id}/snapshot/ (what polling fetched before)
+- changes idle:  GET .../changes/?since=<version> with If-None-Match (304)
+- changes edit:  the same after one node was edited
+The synthetic project is deleted afterwards.
+"""
+
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from .generator import generate_project
+
+
+def poll(client, url, **headers):
+    """GET url; returns (status, body bytes, seconds, queries, response)."""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url, **headers)
+        elapsed = time.perf_counter() - started
+    return response.status_code, len(response.content), elapsed, len(queries), response
+
+
+def add_arguments(parser):
+    parser.add_argument('--nodes', type=int, default=10000, help='Nodes in the synthetic project')
+    parser.add_argument('--polls', type=int, default=5, help='Requests per measurement (best is reported)')
+
+
+def run(stdout, nodes=10000, polls=5, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    client = Client()
+    client.force_login(user)
+    rows = []
+    try:
+        project = generate_project(user, nodes)
+        snapshot_url = f'/api/projects/{project.id}/snapshot/'
+        version = client.get(snapshot_url).json()['version']
+        changes_url = f'/api/projects/{project.id}/changes/?since={version}'
+        etag = client.get(changes_url)['ETag']
+
+        def best(label, url, **headers):
+            results = [poll(client, url, **headers) for _ in range(polls)]
+            status, size, elapsed, queries, _ = min(results, key=lambda result: result[2])
+            rows.append((label, status, size, elapsed, queries))
+
+        best('snapshot', snapshot_url)
+        best('changes idle', changes_url, HTTP_IF_NONE_MATCH=etag)
+        node = project.nodes.order_by('created_at').last()
+        node.label = 'Edited'
+        node.save()
+        best('changes edit', changes_url, HTTP_IF_NONE_MATCH=etag)
+        project.delete()
+    finally:
+        user.delete()
+
+    stdout.write(f"{nodes} nodes, best of {polls} polls")
+    stdout.write(f"{'request':<14}{'status':>8}{'bytes':>12}{'ms':>10}{'queries':>9}")
+    for label, status, size, elapsed, queries in rows:
+        stdout.write(f"{label:<14}{status:>8}{size:>12,}{elapsed * 1000:>10.1f}{queries:>9}")
+    return rows
@@ -0,0 +1,88 @@
+"""
+Upstream benchmark - chat latency when the model degrades, with and without the guard.
+
+The local stub model is made to answer in --model-latency seconds (a slow or
+hung upstream). Chats are sent to POST /api/chat/node/{id}/ in waves of
+--concurrency simultaneous requests:
+- unguarded: deadlines and breaker effectively off, every chat waits it out
+- guarded:   LLM_CALL_TIMEOUT=--timeout and the circuit breaker on, so the
+             first calls give up at the deadline and, once the breaker
+             opens, the rest get the fallback answer at once
+The response cache is disabled. A throwaway user, project and node are
+created and deleted afterwards.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.test import AsyncClient, override_settings
+from api.models import Project, Node
+from api.metrics import metrics
+from api.benchmarks.chat import STUB_BACKEND, run_concurrently
+from api.benchmarks.generator import percentile
+
+UNGUARDED = dict(LLM_CALL_TIMEOUT=3600, LLM_STREAM_TIMEOUT=3600, LLM_QUEUE_TIMEOUT=3600,
+                 LLM_BREAKER_FAILURE_THRESHOLD=10 ** 9, LLM_BREAKER_SLOW_CALL=0)
+
+
+def add_arguments(parser):
+    parser.add_argument('--chats', type=int, default=100, help='Chats sent with the guard on')
+    parser.add_argument('--unguarded-chats', type=int, default=10, help='Chats sent with the guard off')
+    parser.add_argument('--concurrency', type=int, default=10, help='Simultaneous chats per wave')
+    parser.add_argument('--model-latency', type=float, default=5.0, help='Degraded stub model latency (s)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='LLM_CALL_TIMEOUT for the guarded run (s)')
+
+
+def run(stdout, chats=100, unguarded_chats=10, concurrency=10, model_latency=5.0, timeout=1.0, **options):
+    user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    project = Project.objects.create(name='Upstream benchmark', owner=user)
+    node = Node.objects.create(project=project, label='Benchmark node')
+
+    async def send(count):
+        sources, latencies = [], []
+
+        async def post(index):
+            response = await AsyncClient().post(
+                f'/api/chat/node/{node.id}/', {'message': f'Question {index}'}, content_type='application/json'
+            )
+            assert response.status_code == 200, response.content
+            sources.append(json.loads(response.content)['metadata']['source'])
+
+        for start in range(0, count, concurrency):
+            _, wave = await run_concurrently(min(concurrency, count - start), post)
+            latencies.extend(wave)
+        return sources, latencies
+
+    rows = []
+    try:
+        for label, count, overrides in (
+            ('unguarded', unguarded_chats, UNGUARDED),
+            ('guarded', chats, dict(LLM_CALL_TIMEOUT=timeout, LLM_BREAKER_SLOW_CALL=timeout)),
+        ):
+            if not count:
+                continue
+            opens_before = metrics.value('devbrain_llm_breaker_opens_total')
+            with override_settings(GEMINI_MODEL_BACKEND=STUB_BACKEND, CHAT_CACHE_BACKEND='',
+                                   STUB_MODEL_FIRST_TOKEN_DELAY=model_latency, STUB_MODEL_TOKEN_DELAY=0,
+                                   **overrides):
+                started = time.perf_counter()
+                sources, latencies = asyncio.run(send(count))
+                wall = time.perf_counter() - started
+            rows.append((
+                label, count, wall, statistics.median(latencies), percentile(latencies, 0.99), max(latencies),
+                sources.count('mock'), metrics.value('devbrain_llm_breaker_opens_total') - opens_before,
+            ))
+    finally:
+        project.delete()
+        user.delete()
+
+    stdout.write(f"stub model answering in {model_latency}s, {concurrency} chats at a time")
+    stdout.write(f"{'run':<11}{'chats':>7}{'wall s':>9}{'p50 s':>8}{'p99 s':>8}{'max s':>8}"
+                 f"{'fallbacks':>11}{'breaker opens':>15}")
+    for label, count, wall, p50, p99, worst, fallbacks, opens in rows:
+        stdout.write(f"{label:<11}{count:>7}{wall:>9.2f}{p50:>8.3f}{p99:>8.3f}{worst:>8.3f}"
+                     f"{fallbacks:>11}{opens:>15}")
+    return rows
@@ -0,0 +1,113 @@
+"""
+Knowledge Blobs - Content-addressed storage for uploaded knowledge files.
+
+Uploads are stored once per SHA-256 digest. KnowledgeBase rows reference a
+blob and its ref_count tracks how many do; the blob (file, passages,
+postings and vectors) is deleted when the last reference goes away.
+"""
+
+import hashlib
+import os
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from .models import KnowledgeBase, KnowledgeBlob
+from .indexing import KnowledgeIndex
+from .cache import invalidate_project_responses
+
+
+def hash_upload(file_obj) -> str:
+    """SHA-256 of an uploaded file, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def blob_path(sha256: str, file_name: str) -> str:
+    extension = os.path.splitext(file_name)[1].lower()
+    return f"knowledge_blobs/{sha256[:2]}/{sha256}{extension}"
+
+
+def acquire_blob(file_obj) -> KnowledgeBlob:
+    """
+    Return the blob for an upload's content, storing the bytes only if this
+    content has never been seen. Adds one reference.
+    """
+    sha256 = hash_upload(file_obj)
+
+    blob = KnowledgeBlob.objects.filter(pk=sha256).first()
+    if blob is None:
+        name = blob_path(sha256, file_obj.name)
+        written = None
+        if not default_storage.exists(name):
+            name = written = default_storage.save(name, file_obj)
+        try:
+            with transaction.atomic():
+                blob = KnowledgeBlob.objects.create(sha256=sha256, file=name, size=file_obj.size)
+        except IntegrityError:
+            # Another upload of the same content won the race; drop the copy
+            # written here unless the winner's row points at that very file
+            blob = KnowledgeBlob.objects.get(pk=sha256)
+            if written and written != blob.file.name:
+                default_storage.delete(written)
+
+    KnowledgeBlob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release_blob(blob_id, project_id):
+    """
+    Drop one reference held by a (now deleted) knowledge file in a project.
+    Detaches the blob's vectors from the project when no other file there
+    uses it, and deletes the blob once nothing references it.
+    """
+    if blob_id is None:
+        return
+
+    KnowledgeBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+
+    if not KnowledgeBase.objects.filter(project_id=project_id, blob_id=blob_id).exists():
+        KnowledgeIndex.detach_blob(project_id, blob_id)
+
+    blob = KnowledgeBlob.objects.filter(pk=blob_id).first()
+    if blob is not None and blob.ref_count <= 0 and not blob.knowledge_bases.exists():
+        delete_blob(blob)
+
+
+def delete_blob(blob: KnowledgeBlob):
+    """Remove a blob with its stored file, passages, postings and vectors."""
+    KnowledgeIndex.remove_blob(blob)
+    file_name = blob.file.name
+    blob.delete()
+    if file_name:
+        default_storage.delete(file_name)
+
+
+def delete_knowledge_base(kb: KnowledgeBase):
+    """Delete a knowledge file and release its blob reference."""
+    blob_id, project_id = kb.blob_id, kb.project_id
+    kb.delete()
+    release_blob(blob_id, project_id)
+    invalidate_project_responses(project_id)
+
+
+def prune_blobs() -> int:
+    """
+    Recount references from the knowledge files that actually exist (rows
+    removed by cascades never decrement) and delete unreferenced blobs.
+    """
+    counts = dict(
+        KnowledgeBase.objects.filter(blob__isnull=False)
+        .values('blob_id').annotate(total=Count('id')).values_list('blob_id', 'total')
+    )
+    deleted = 0
+    for blob in KnowledgeBlob.objects.all().iterator():
+        total = counts.get(blob.pk, 0)
+        if total == 0:
+            delete_blob(blob)
+            deleted += 1
+        elif total != blob.ref_count:
+            KnowledgeBlob.objects.filter(pk=blob.pk).update(ref_count=total)
+    return deleted
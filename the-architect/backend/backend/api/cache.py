@@ -0,0 +1,171 @@
+"""
+Response Cache - Reuse AI answers for identical prompts.
+
+Entries are keyed by a SHA-256 of the model name and the fully assembled
+prompt. The prompt already contains the node's label, description and
+status, the retrieved knowledge passages and the conversation memory
+(summary and recent messages), so editing any of them, or chatting on,
+yields a new key and the old answer is never served again. Context-dependent
+follow-ups ("why?") are therefore never answered from another conversation. On top of that every
+project has a knowledge generation that is bumped whenever a knowledge file
+becomes ready or is removed; it is part of the key, so a change to the
+project's knowledge set retires all of its cached answers at once.
+
+Backends (CHAT_CACHE_BACKEND):
+- api.cache.LocalResponseCache   in-process LRU with TTL, CHAT_CACHE_MAX_ENTRIES
+- api.cache.DjangoResponseCache  Django cache CHAT_CACHE_ALIAS (shared between
+                                 processes; size bound by that cache's settings)
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from .metrics import metrics
+
+KEY_PREFIX = 'devbrain:chat:'
+
+metrics.counter('devbrain_chat_cache_hits_total', 'AI answers served from the response cache')
+metrics.counter('devbrain_chat_cache_misses_total', 'AI prompts not found in the response cache')
+metrics.counter('devbrain_chat_cache_evictions_total', 'Cached answers dropped to stay within the size bound')
+metrics.counter('devbrain_chat_cache_invalidations_total', 'Project knowledge changes that retired cached answers')
+
+
+class LocalResponseCache:
+    """Size-bounded LRU with per-entry TTL, private to this process."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment('devbrain_chat_cache_evictions_total')
+
+    def generation(self, project_id) -> int:
+        with self._lock:
+            return self._generations.get(str(project_id), 0)
+
+    def bump_generation(self, project_id):
+        with self._lock:
+            self._generations[str(project_id)] = self._generations.get(str(project_id), 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class DjangoResponseCache:
+    """Entries in a Django cache backend, so every server process shares them."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.cache = caches[settings.CHAT_CACHE_ALIAS]
+
+    def get(self, key):
+        return self.cache.get(KEY_PREFIX + key)
+
+    def set(self, key, value):
+        self.cache.set(KEY_PREFIX + key, value, self.ttl)
+
+    def generation(self, project_id) -> int:
+        return self.cache.get(f'{KEY_PREFIX}generation:{project_id}', 0)
+
+    def bump_generation(self, project_id):
+        key = f'{KEY_PREFIX}generation:{project_id}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+    def size(self):
+        return None  # Not tracked by the Django cache API
+
+
+class ResponseCache:
+    """Counts hits and misses in front of a backend and builds the keys."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def key(self, model_name: str, prompt: str, project_id) -> str:
+        generation = self.backend.generation(project_id) if project_id else 0
+        digest = hashlib.sha256()
+        for part in (model_name, str(project_id), str(generation), prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        metrics.increment('devbrain_chat_cache_hits_total' if value is not None
+                          else 'devbrain_chat_cache_misses_total')
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def invalidate_project(self, project_id):
+        self.backend.bump_generation(project_id)
+        metrics.increment('devbrain_chat_cache_invalidations_total')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache, or None when CHAT_CACHE_BACKEND is empty."""
+    global _cache
+    if not settings.CHAT_CACHE_BACKEND:
+        return None
+    with _cache_lock:
+        if _cache is None or not isinstance(_cache.backend, import_string(settings.CHAT_CACHE_BACKEND)):
+            backend = import_string(settings.CHAT_CACHE_BACKEND)(
+                settings.CHAT_CACHE_TTL, settings.CHAT_CACHE_MAX_ENTRIES
+            )
+            _cache = ResponseCache(backend)
+        return _cache
+
+
+def invalidate_project_responses(project_id):
+    """Retire every cached answer for a project (its knowledge set changed)."""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.invalidate_project(project_id)
+
+
+def _cache_entries():
+    return (_cache.backend.size() if _cache is not None else 0) or 0
+
+
+metrics.gauge('devbrain_chat_cache_entries', _cache_entries, 'Answers held by the in-process response cache')
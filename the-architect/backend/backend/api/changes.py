@@ -0,0 +1,127 @@
+"""
+Changes - Per-project versions and a change log for delta sync.
+
+Every write to a project's nodes, edges, knowledge files or chat messages
+bumps Project.version once and stamps each object it touched in
+ProjectChange with the new version (or marks it deleted: a tombstone).
+ProjectChange holds one row per object, so "what changed since version N"
+is a single indexed range query however long the project has been edited.
+
+The bump is an UPDATE of the project row inside the writing transaction,
+which serializes a project's writers: versions become visible in order, so
+a client that has seen version N never misses a later change below it.
+
+Model save()/delete() record their own changes. Writes that bypass them
+(bulk_create, bulk_update, queryset update/delete) must call record() or
+record_rows() here, as they do for the closure table in api/hierarchy.py.
+"""
+
+from django.db import transaction
+from django.db.models import F, Q
+from .models import Project, Node, Edge, KnowledgeBase, ChatMessage, ProjectChange
+
+CHANGES_BATCH_SIZE = 500
+
+# Kind -> (model, path from the model to its project id)
+KINDS = {
+    'project': (Project, 'id'),
+    'node': (Node, 'project_id'),
+    'edge': (Edge, 'project_id'),
+    'knowledge_base': (KnowledgeBase, 'project_id'),
+    'chat_message': (ChatMessage, 'node__project_id'),
+}
+
+
+class ChangeLog:
+    """Version bumps, change recording and delta queries."""
+
+    @staticmethod
+    def record(project_id, changed: dict = None, deleted: dict = None):
+        """
+        Bump the project's version and stamp the given objects with it.
+        `changed` and `deleted` map a kind to object ids; an id in both is
+        recorded as deleted. Returns the new version (None if the project
+        no longer exists).
+        """
+        stamps = {}
+        for flag, objects in ((False, changed), (True, deleted)):
+            for kind, ids in (objects or {}).items():
+                for object_id in ids:
+                    stamps[(kind, str(object_id))] = flag
+
+        with transaction.atomic():
+            # Row lock until commit: concurrent writers to a project take turns
+            if not Project.objects.filter(pk=project_id).update(version=F('version') + 1):
+                return None
+            version = Project.objects.filter(pk=project_id).values_list('version', flat=True).get()
+            ProjectChange.objects.bulk_create(
+                [ProjectChange(project_id=project_id, kind=kind, object_id=object_id,
+                               version=version, deleted=flag)
+                 for (kind, object_id), flag in stamps.items()],
+                batch_size=CHANGES_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['project', 'kind', 'object_id'],
+                update_fields=['version', 'deleted'],
+            )
+        return version
+
+    @staticmethod
+    def record_rows(querysets, deleted: bool = False):
+        """
+        Record the rows of (kind, queryset) pairs as changed (or deleted),
+        one version per project they belong to. Call before a delete.
+        """
+        by_project = {}
+        for kind, queryset in querysets:
+            for object_id, project_id in queryset.values_list('id', KINDS[kind][1]).iterator():
+                by_project.setdefault(project_id, {}).setdefault(kind, []).append(object_id)
+        for project_id, objects in by_project.items():
+            if deleted:
+                ChangeLog.record(project_id, deleted=objects)
+            else:
+                ChangeLog.record(project_id, changed=objects)
+
+    @staticmethod
+    def subtree_tombstones(nodes) -> dict:
+        """
+        Ids removed by deleting `nodes` (a queryset) and their cascades:
+        {kind: ids} for the nodes, their edges and their chat messages.
+        """
+        nodes = nodes.order_by().values('id')
+        return {
+            'node': [row['id'] for row in nodes],
+            'edge': list(Edge.objects.filter(
+                Q(source_id__in=nodes) | Q(target_id__in=nodes)
+            ).values_list('id', flat=True)),
+            'chat_message': list(ChatMessage.objects.filter(node_id__in=nodes).values_list('id', flat=True)),
+        }
+
+    @staticmethod
+    def since(project_id, since: int, version: int, include_chat: bool = False) -> dict:
+        """
+        What changed after `since` up to `version`: {'changed': {kind:
+        [objects]}, 'deleted': {kind: [ids]}}. Changed objects are loaded
+        as they are now; objects missing since are left out.
+        """
+        changes = ProjectChange.objects.filter(
+            project_id=project_id, version__gt=since, version__lte=version
+        )
+        if not include_chat:
+            changes = changes.exclude(kind='chat_message')
+
+        changed_ids, deleted = {}, {}
+        for kind, object_id, is_deleted in changes.values_list('kind', 'object_id', 'deleted').iterator():
+            (deleted if is_deleted else changed_ids).setdefault(kind, []).append(object_id)
+
+        changed = {}
+        for kind, ids in changed_ids.items():
+            model, project_path = KINDS[kind]
+            queryset = model.objects.filter(**{project_path: project_id})
+            if model is KnowledgeBase:
+                queryset = queryset.defer('full_text')
+            objects = []
+            for start in range(0, len(ids), CHANGES_BATCH_SIZE):
+                objects.extend(queryset.filter(id__in=ids[start:start + CHANGES_BATCH_SIZE]))
+            objects.sort(key=lambda obj: (obj.created_at, obj.pk))
+            changed[kind] = objects
+        return {'changed': changed, 'deleted': deleted}
@@ -0,0 +1,229 @@
+"""
+Embeddings - Offline text embeddings and a memory-mapped vector index per project.
+
+Each index is a pair of append-only files under VECTOR_INDEX_DIR:
+- {name}.vec  float32 matrix, one L2-normalised row per passage
+- {name}.ids  int64 passage id per row (-1 marks a deleted row)
+
+Every knowledge blob keeps its passage vectors in blobs/{sha256}; every
+project keeps one contiguous matrix holding the rows of the blobs it uses,
+copied from the blob index when the blob is attached.
+
+Adding passages appends rows; deleting blanks them in place. The files are
+compacted once deleted rows outnumber live ones.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+TOKEN_PATTERN = re.compile(r'\w+')
+DELETED = -1
+SEARCH_BLOCK_ROWS = 65536  # Matrix rows scored per block
+
+
+class HashingEmbedder:
+    """
+    Signed feature-hashing embedder: no vocabulary, no model download.
+    Token counts are log-scaled and the vector is L2-normalised.
+    """
+
+    def __init__(self, dimensions: int = None):
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+
+    def _bucket(self, token: str):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dimensions, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Embed a batch of texts into a (len(texts), dimensions) float32 matrix."""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                column, sign = self._bucket(token)
+                vectors[row, column] += sign
+        np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        vectors /= norms
+        return vectors
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Return the process-wide embedder configured by KNOWLEDGE_EMBEDDER."""
+    global _embedder
+    if _embedder is None:
+        _embedder = import_string(settings.KNOWLEDGE_EMBEDDER)()
+    return _embedder
+
+
+class VectorIndex:
+    """Append-only, memory-mapped passage vectors (one project or one blob)."""
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, name, dimensions: int = None, subdirectory: str = ''):
+        self.name = str(name)
+        self.dimensions = dimensions or get_embedder().dimensions
+        directory = settings.VECTOR_INDEX_DIR / subdirectory
+        directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / f"{self.name}.vec"
+        self.ids_path = directory / f"{self.name}.ids"
+
+    @classmethod
+    def for_project(cls, project_id):
+        return cls(project_id)
+
+    @classmethod
+    def for_blob(cls, sha256: str):
+        return cls(sha256, subdirectory='blobs')
+
+    @property
+    def lock(self):
+        with VectorIndex._locks_guard:
+            return VectorIndex._locks.setdefault(str(self.vectors_path), threading.Lock())
+
+    def _rows(self) -> int:
+        """Number of complete rows present in both files."""
+        if not self.vectors_path.exists() or not self.ids_path.exists():
+            return 0
+        vector_rows = self.vectors_path.stat().st_size // (self.dimensions * 4)
+        id_rows = self.ids_path.stat().st_size // 8
+        return min(vector_rows, id_rows)
+
+    def _open(self, mode: str = 'r'):
+        rows = self._rows()
+        if not rows:
+            return None, None
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode=mode,
+                            shape=(rows, self.dimensions))
+        ids = np.memmap(self.ids_path, dtype=np.int64, mode=mode, shape=(rows,))
+        return vectors, ids
+
+    def add(self, chunk_ids: list, vectors: np.ndarray):
+        """Append passage vectors; the existing matrix is never rewritten."""
+        if not len(chunk_ids):
+            return
+        with self.lock:
+            self._append(chunk_ids, vectors)
+
+    def _append(self, chunk_ids, vectors):
+        """Append rows; caller holds the lock."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        rows = self._rows()
+        # Drop a partially written tail left by an interrupted append
+        with open(self.vectors_path, 'ab') as handle:
+            handle.truncate(rows * self.dimensions * 4)
+            handle.write(vectors.tobytes())
+        with open(self.ids_path, 'ab') as handle:
+            handle.truncate(rows * 8)
+            handle.write(ids.tobytes())
+
+    def live_rows(self):
+        """Return (chunk_ids, vectors) for every live row, as in-memory arrays."""
+        vectors, ids = self._open()
+        if ids is None:
+            return (np.zeros(0, dtype=np.int64),
+                    np.zeros((0, self.dimensions), dtype=np.float32))
+        live = ids != DELETED
+        return np.array(ids[live]), np.array(vectors[live])
+
+    def contains(self, chunk_id) -> bool:
+        _, ids = self._open()
+        return ids is not None and bool(np.any(ids == chunk_id))
+
+    def add_from(self, source: 'VectorIndex') -> bool:
+        """
+        Append another index's live rows (a byte copy, no re-embedding).
+        Skipped if they are already present; returns whether rows were added.
+        """
+        chunk_ids, vectors = source.live_rows()
+        if not len(chunk_ids):
+            return False
+        with self.lock:
+            if self.contains(chunk_ids[0]):
+                return False
+            self._append(chunk_ids, vectors)
+        return True
+
+    def remove(self, chunk_ids: list):
+        """Blank the rows of deleted passages, compacting when mostly dead."""
+        if not len(chunk_ids):
+            return
+        with self.lock:
+            vectors, ids = self._open('r+')
+            if ids is None:
+                return
+            dead = np.isin(ids, np.asarray(chunk_ids, dtype=np.int64))
+            if dead.any():
+                ids[dead] = DELETED
+                vectors[dead] = 0
+                ids.flush()
+                vectors.flush()
+            if np.count_nonzero(ids == DELETED) * 2 > len(ids):
+                self._compact(vectors, ids)
+
+    def _compact(self, vectors, ids):
+        """Rewrite the files with live rows only, swapping them in atomically."""
+        live = ids != DELETED
+        for path, data in ((self.vectors_path, vectors[live]), (self.ids_path, ids[live])):
+            staging = path.with_suffix(path.suffix + '.tmp')
+            staging.write_bytes(np.ascontiguousarray(data).tobytes())
+            os.replace(staging, path)
+
+    def drop(self):
+        """Delete the index files for this project."""
+        with self.lock:
+            self.vectors_path.unlink(missing_ok=True)
+            self.ids_path.unlink(missing_ok=True)
+
+    def search(self, queries: np.ndarray, top_k: int = 10) -> list:
+        """
+        Cosine top-k for a batch of L2-normalised query vectors.
+
+        The matrix is scored block by block straight from the memory map, so
+        only one block of similarities is materialised at a time.
+        Returns, per query, a list of (chunk_id, similarity) sorted descending.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        vectors, ids = self._open()
+        if ids is None:
+            return [[] for _ in range(len(queries))]
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(ids), SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores = queries @ block.T
+            scores[:, ids[start:start + SEARCH_BLOCK_ROWS] == DELETED] = -np.inf
+
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, start + block.shape[0]),
+                                            (len(queries), block.shape[0]))],
+                axis=1,
+            )
+            keep = min(top_k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        results = []
+        for query_scores, query_rows in zip(best_scores, best_rows):
+            order = np.argsort(-query_scores)
+            results.append([
+                (int(ids[query_rows[i]]), float(query_scores[i]))
+                for i in order
+                if np.isfinite(query_scores[i]) and query_scores[i] > 0
+            ])
+        return results
@@ -0,0 +1,121 @@
+"""
+Exporting - Stream a whole project as gzip-compressed NDJSON.
+
+One JSON record per line, each with a "type":
+- project         (first line; carries "format" and "version")
+- node            parent is a node id or null
+- edge            source / target node ids
+- knowledge_base  metadata only (files and extracted text are not exported)
+- chat_message    node id, role, message, source
+
+Rows are read with .iterator() in EXPORT_CHUNK_SIZE chunks and compressed
+as they are produced, so memory stays flat however large the project is.
+The same records, collected into lists, form the JSON export that
+api/importing.py also accepts.
+"""
+
+import datetime
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+from .models import Project, Node, Edge, KnowledgeBase, ChatMessage
+
+EXPORT_FORMAT = 'devbrain-export'
+EXPORT_VERSION = 1
+EXPORT_CHUNK_SIZE = 2000  # Rows per database fetch
+GZIP_FLUSH_BYTES = 64 * 1024  # Compressed bytes buffered before yielding
+
+# Record type -> (model, project filter, ordering, [(record key, model field)])
+RECORD_FIELDS = {
+    'node': (Node, 'project', ('created_at', 'id'), [
+        ('id', 'id'), ('parent', 'parent_id'), ('label', 'label'), ('description', 'description'),
+        ('status', 'status'), ('owner', 'owner'), ('position_x', 'position_x'),
+        ('position_y', 'position_y'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ]),
+    'edge': (Edge, 'project', ('created_at', 'id'), [
+        ('id', 'id'), ('source', 'source_id'), ('target', 'target_id'), ('created_at', 'created_at'),
+    ]),
+    'knowledge_base': (KnowledgeBase, 'project', ('created_at', 'id'), [
+        ('id', 'id'), ('title', 'title'), ('file_type', 'file_type'),
+        ('content_preview', 'content_preview'), ('created_at', 'created_at'),
+    ]),
+    'chat_message': (ChatMessage, 'node__project', ('node_id', 'created_at', 'id'), [
+        ('id', 'id'), ('node', 'node_id'), ('role', 'role'), ('message', 'message'),
+        ('source', 'source'), ('created_at', 'created_at'),
+    ]),
+}
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Lets views accept ?format=ndjson; the export itself is streamed, not rendered."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
+
+
+def export_records(project: Project, include_chat: bool = True):
+    """Yield the project's export records one by one (see module docstring)."""
+    yield {
+        'type': 'project',
+        'format': EXPORT_FORMAT,
+        'version': EXPORT_VERSION,
+        'id': project.id,
+        'name': project.name,
+        'description': project.description,
+        'created_at': project.created_at,
+        'updated_at': project.updated_at,
+    }
+    for record_type, (model, project_filter, ordering, fields) in RECORD_FIELDS.items():
+        if record_type == 'chat_message' and not include_chat:
+            continue
+        keys = [key for key, _ in fields]
+        rows = (
+            model.objects.filter(**{project_filter: project})
+            .order_by(*ordering)
+            .values_list(*[field for _, field in fields])
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        for row in rows:
+            yield {'type': record_type, **dict(zip(keys, row))}
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder, but datetimes keep their microseconds (they order rows)."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def ndjson_lines(records):
+    """Encode records as NDJSON lines (bytes)."""
+    encoder = ExportJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for record in records:
+        yield (encoder.encode(record) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Gzip a stream of bytes, yielding compressed blocks of about GZIP_FLUSH_BYTES."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        block = compressor.compress(chunk)
+        if block:
+            buffer.append(block)
+            buffered += len(block)
+            if buffered >= GZIP_FLUSH_BYTES:
+                yield b''.join(buffer)
+                buffer, buffered = [], 0
+    buffer.append(compressor.flush())
+    yield b''.join(buffer)
+
+
+def export_stream(project: Project, include_chat: bool = True):
+    """The gzip-compressed NDJSON export of a project, as a stream of byte blocks."""
+    return gzip_chunks(ndjson_lines(export_records(project, include_chat)))
@@ -0,0 +1,198 @@
+"""
+Text extraction for uploaded knowledge files.
+
+Extraction is a generator stage: text is yielded page by page (PDF) or block
+by block (TXT/MD/DOCX) so preview, chunking and indexing can consume it
+incrementally and peak memory stays flat regardless of file size.
+"""
+
+import codecs
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+
+READ_BLOCK_SIZE = 64 * 1024  # Bytes read per block from text files
+DOCX_BLOCK_CHARS = 64 * 1024  # Characters of paragraphs grouped per block
+
+
+def _file_size(file_obj):
+    size = getattr(file_obj, 'size', None)
+    if size is None:
+        try:
+            size = os.fstat(file_obj.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            size = None
+    return size
+
+
+def _iter_text_blocks(file_obj, progress=None):
+    """Decode a UTF-8 text file block by block."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    size = _file_size(file_obj)
+    consumed = 0
+    while True:
+        raw = file_obj.read(READ_BLOCK_SIZE)
+        if not raw:
+            break
+        consumed += len(raw)
+        text = decoder.decode(raw)
+        if text:
+            yield 1, text
+        if progress and size:
+            progress(consumed / size)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield 1, tail
+
+
+def _iter_pdf_pages(file_obj, progress=None):
+    """
+    Extract a PDF one page at a time.
+
+    Large PDFs stored on disk are sharded across the extraction process pool
+    (see _iter_pdf_pages_parallel); small or in-memory ones stay serial.
+    """
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(file_obj)
+    total = len(pdf_reader.pages)
+    path = _file_path(file_obj)
+    if (path and settings.PDF_EXTRACTION_WORKERS > 1
+            and total >= settings.PDF_PARALLEL_MIN_PAGES):
+        yield from _iter_pdf_pages_parallel(path, total, progress)
+        return
+
+    for number, page in enumerate(pdf_reader.pages, start=1):
+        yield number, page.extract_text() or ""
+        if progress:
+            progress(number / total)
+
+
+def _file_path(file_obj):
+    """Filesystem path behind an uploaded or stored file, if there is one."""
+    for candidate in (file_obj, getattr(file_obj, 'file', None)):
+        try:
+            path = getattr(candidate, 'path', None) or getattr(candidate, 'name', None)
+        except (NotImplementedError, ValueError):
+            continue
+        if isinstance(path, str) and os.path.isabs(path) and os.path.isfile(path):
+            return path
+    return None
+
+
+def extract_pdf_page_range(path: str, start: int, stop: int) -> list:
+    """Extract pages [start, stop) of a PDF; runs inside a pool worker."""
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(path)
+    return [pdf_reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def get_pdf_pool():
+    """Process-wide pool for PDF extraction (spawned, so workers never inherit threads)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stop the PDF extraction workers (a new pool is created on next use)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown()
+            _pdf_pool = None
+
+
+def _iter_pdf_pages_parallel(path: str, total: int, progress=None):
+    """
+    Shard page ranges across the process pool and yield pages in order.
+
+    At most two shards per worker are in flight, so memory stays bounded
+    while every worker is kept busy.
+    """
+    shard = settings.PDF_PAGES_PER_SHARD
+    pool = get_pdf_pool()
+    ranges = [(start, min(start + shard, total)) for start in range(0, total, shard)]
+    window = settings.PDF_EXTRACTION_WORKERS * 2
+
+    pending = deque()
+    next_range = 0
+    while next_range < len(ranges) or pending:
+        while next_range < len(ranges) and len(pending) < window:
+            start, stop = ranges[next_range]
+            pending.append((start, pool.submit(extract_pdf_page_range, path, start, stop)))
+            next_range += 1
+
+        start, future = pending.popleft()
+        for offset, text in enumerate(future.result()):
+            yield start + offset + 1, text
+        if progress:
+            progress(min(start + shard, total) / total)
+
+
+def _iter_docx_blocks(file_obj, progress=None):
+    """Group DOCX paragraphs into blocks of roughly DOCX_BLOCK_CHARS."""
+    from docx import Document
+    doc = Document(file_obj)
+    paragraphs = doc.paragraphs
+    total = len(paragraphs)
+    block = []
+    block_chars = 0
+    for index, para in enumerate(paragraphs, start=1):
+        block.append(para.text)
+        block_chars += len(para.text) + 1
+        if block_chars >= DOCX_BLOCK_CHARS:
+            yield 1, "\n".join(block) + "\n"
+            block = []
+            block_chars = 0
+            if progress:
+                progress(index / total)
+    if block:
+        yield 1, "\n".join(block)
+
+
+def iter_pages(file_obj, progress=None):
+    """
+    Stream text from an uploaded file as (page_number, text) pieces.
+
+    PDFs yield one piece per page. Other formats are a single page whose text
+    arrives in several consecutive blocks; blocks of the same page are meant
+    to be concatenated as-is. `progress`, if given, is called with the
+    fraction of the file processed so far.
+    Errors while reading the file propagate so ingestion can mark it failed.
+    """
+    file_name = file_obj.name.lower()
+
+    if file_name.endswith('.txt') or file_name.endswith('.md'):
+        yield from _iter_text_blocks(file_obj, progress)
+
+    elif file_name.endswith('.pdf'):
+        try:
+            import PyPDF2  # noqa: F401
+        except ImportError:
+            yield 1, "[PDF content extraction requires PyPDF2]"
+            return
+        yield from _iter_pdf_pages(file_obj, progress)
+
+    elif file_name.endswith('.docx'):
+        try:
+            import docx  # noqa: F401
+        except ImportError:
+            yield 1, "[DOCX content extraction requires python-docx]"
+            return
+        yield from _iter_docx_blocks(file_obj, progress)
+
+    else:
+        yield 1, "[Unsupported file type]"
@@ -0,0 +1,206 @@
+"""
+Node Hierarchy - Closure table over the Node parent tree.
+
+NodeClosure holds one row per (ancestor, descendant) pair, including each
+node paired with itself at depth 0. Descendants, ancestors, depth and
+subtree size are then a single indexed query each, however deep the map.
+
+Rows are maintained by Node.save (create and reparent) and removed with the
+nodes by cascade. Writes that bypass save (queryset.update(parent=...),
+bulk_create) must call insert/move here, or rebuild the project afterwards.
+Structural changes here also carry the status rollups (api/rollups.py).
+"""
+
+from django.db import connections, router, transaction
+from django.db.models import F, Max
+from .models import Project, Node, Edge, NodeClosure
+from .rollups import StatusRollup
+
+CLOSURE_BATCH_SIZE = 1000
+
+
+class NodeHierarchy:
+    """Closure-table maintenance and subtree queries."""
+
+    @staticmethod
+    def insert(node):
+        """Add closure rows for a newly created node (under its current parent)."""
+        NodeHierarchy.insert_many([node])
+
+    @staticmethod
+    def insert_many(nodes):
+        """
+        Add closure rows and status rollups for newly created nodes (e.g.
+        after bulk_create). A parent created in the same batch must come
+        before its children.
+        """
+        # Ids are compared as strings: unsaved defaults are uuid.UUID instances
+        new_ids = {str(node.pk) for node in nodes}
+        paths = {}  # node id -> [(ancestor_id, depth)], the node itself included
+        for ancestor_id, descendant_id, depth in NodeClosure.objects.filter(
+            descendant_id__in={str(node.parent_id) for node in nodes
+                               if node.parent_id and str(node.parent_id) not in new_ids}
+        ).values_list('ancestor_id', 'descendant_id', 'depth'):
+            paths.setdefault(descendant_id, []).append((ancestor_id, depth))
+
+        rows = []
+        for node in nodes:
+            node_id = str(node.pk)
+            path = [(node_id, 0)]
+            if node.parent_id:
+                path.extend(
+                    (ancestor_id, depth + 1) for ancestor_id, depth in paths.get(str(node.parent_id), ())
+                )
+            paths[node_id] = path
+            rows.extend((ancestor_id, node_id, depth) for ancestor_id, depth in path)
+        NodeHierarchy.write_rows(rows)
+        StatusRollup.inserted(nodes)
+
+    @staticmethod
+    def write_rows(rows):
+        """
+        Insert (ancestor_id, descendant_id, depth) tuples. A deep tree has
+        many rows per node, so they skip model instances and go straight to
+        executemany, sorted so the (ancestor, descendant) index is appended
+        to in order rather than split at random uuids.
+        """
+        rows = sorted(rows)
+        connection = connections[router.db_for_write(NodeClosure)]
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(NodeClosure._meta.get_field(name).column)
+                            for name in ('ancestor', 'descendant', 'depth'))
+        sql = f"INSERT INTO {quote(NodeClosure._meta.db_table)} ({columns}) VALUES (%s, %s, %s)"
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), CLOSURE_BATCH_SIZE):
+                cursor.executemany(sql, rows[start:start + CLOSURE_BATCH_SIZE])
+
+    @staticmethod
+    def move(node):
+        """
+        Re-link a node's subtree under its (already saved) new parent.
+
+        Paths from the old ancestors into the subtree are deleted and every
+        new ancestor is paired with every subtree node; paths inside the
+        subtree are untouched.
+        """
+        subtree = NodeClosure.objects.filter(ancestor_id=node.pk)
+        if node.parent_id and subtree.filter(descendant_id=node.parent_id).exists():
+            raise ValueError("A node cannot be moved under its own descendant.")
+
+        counts = StatusRollup.stored_counts(node.pk)
+        StatusRollup.adjust(node.pk, {status: -count for status, count in counts.items()}, include_self=False)
+        NodeClosure.objects.filter(
+            descendant_id__in=subtree.values('descendant_id'),
+        ).exclude(
+            ancestor_id__in=subtree.values('descendant_id'),
+        ).delete()
+
+        if not node.parent_id:
+            return
+        StatusRollup.adjust(node.parent_id, counts)
+        ancestors = list(
+            NodeClosure.objects.filter(descendant_id=node.parent_id).values_list('ancestor_id', 'depth')
+        )
+        members = list(subtree.values_list('descendant_id', 'depth'))
+        NodeHierarchy.write_rows([
+            (ancestor_id, descendant_id, ancestor_depth + depth + 1)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, depth in members
+        ])
+
+    @staticmethod
+    def relink_parent_edge(node, previous_parent_id):
+        """
+        Keep the parent -> child edge in step with a created or reparented
+        node: the edge from the previous parent (if any) is deleted and one
+        from the new parent (if any) is created. Returns (deleted edge ids, new edge or None); the caller
+        records the deleted ids in the change log.
+        """
+        previous = Edge.objects.filter(source_id=previous_parent_id, target_id=node.pk)
+        deleted = list(previous.values_list('id', flat=True))
+        previous.delete()
+        edge = None
+        if node.parent_id:
+            edge, _ = Edge.objects.get_or_create(project_id=node.project_id, source_id=node.parent_id, target_id=node.pk)
+        return deleted, edge
+
+    @staticmethod
+    def descendants(node, max_depth: int = None):
+        """Nodes below `node`, nearest first, annotated with their depth relative to it."""
+        filters = {'ancestor_links__ancestor_id': node.pk, 'ancestor_links__depth__gt': 0}
+        if max_depth is not None:
+            filters['ancestor_links__depth__lte'] = max_depth
+        return Node.objects.filter(**filters).annotate(
+            relative_depth=F('ancestor_links__depth')
+        ).order_by('relative_depth', 'created_at')
+
+    @staticmethod
+    def ancestors(node):
+        """Nodes above `node`, root first, annotated with their distance from it."""
+        return Node.objects.filter(
+            descendant_links__descendant_id=node.pk,
+            descendant_links__depth__gt=0,
+        ).annotate(
+            relative_depth=F('descendant_links__depth')
+        ).order_by('-relative_depth')
+
+    @staticmethod
+    def is_descendant(node, ancestor) -> bool:
+        """Whether `node` lies in the subtree of `ancestor` (or is it)."""
+        return NodeClosure.objects.filter(ancestor_id=ancestor.pk, descendant_id=node.pk).exists()
+
+    @staticmethod
+    def depth(node) -> int:
+        """Distance from the root of the node's tree (roots are depth 0)."""
+        return NodeClosure.objects.filter(descendant_id=node.pk).aggregate(
+            depth=Max('depth')
+        )['depth'] or 0
+
+    @staticmethod
+    def subtree_size(node) -> int:
+        """Number of nodes in the subtree, the node itself included."""
+        return NodeClosure.objects.filter(ancestor_id=node.pk).count()
+
+    @staticmethod
+    def delete_subtree(node):
+        """
+        Delete a node and everything below it in one pass, recording
+        tombstones. Returns the removed ids by kind (node, edge, chat_message).
+        """
+        from .changes import ChangeLog
+        subtree = Node.objects.filter(ancestor_links__ancestor_id=node.pk)
+        with transaction.atomic():
+            tombstones = ChangeLog.subtree_tombstones(subtree)
+            ChangeLog.record(node.project_id, deleted=tombstones)
+            StatusRollup.removed(node.pk, node.project_id)
+            subtree.delete()
+        return tombstones
+
+    @staticmethod
+    def rebuild(project_id=None) -> int:
+        """
+        Recompute closure rows from parent pointers, and the status rollups
+        from those, for one project or all. Returns the number of rows written.
+        """
+        if project_id is not None:
+            project_ids = [project_id]
+        else:
+            project_ids = list(Project.objects.values_list('id', flat=True))
+
+        written = 0
+        for pid in project_ids:
+            parents = dict(Node.objects.filter(project_id=pid).values_list('id', 'parent_id'))
+            with transaction.atomic():
+                NodeClosure.objects.filter(descendant__project_id=pid).delete()
+                rows = []
+                for node_id in parents:
+                    ancestor_id, depth, seen = node_id, 0, set()
+                    while ancestor_id is not None and ancestor_id not in seen:
+                        seen.add(ancestor_id)
+                        rows.append((ancestor_id, node_id, depth))
+                        ancestor_id = parents.get(ancestor_id)
+                        depth += 1
+                NodeHierarchy.write_rows(rows)
+                StatusRollup.rebuild(pid)
+                written += len(rows)
+        return written
@@ -0,0 +1,268 @@
+"""
+Importing - Recreate a project from an export, with bulk inserts.
+
+Accepts either export format of api/exporting.py, detected from the data:
+- NDJSON records, plain or gzip-compressed (GET .../export/?format=ndjson)
+- the nested JSON of GET .../export/
+
+Everything gets a fresh id, so a project can be imported next to its
+original. Nodes are inserted parent-first (topological order), then edges,
+then chat messages, all with batched bulk_create inside one transaction;
+the hierarchy index and status rollups are filled by
+NodeHierarchy.insert_many. New ids are allocated in ascending order, so
+rows keep their insert order where their timestamps tie. Timestamps
+themselves are the import time. Knowledge-base records carry no file
+contents and are skipped.
+"""
+
+import io
+import json
+import uuid
+import gzip
+from collections import deque
+from django.db import transaction
+from .models import Project, Node, Edge, ChatMessage
+from .hierarchy import NodeHierarchy
+from .rollups import StatusRollup
+from .exporting import EXPORT_FORMAT, EXPORT_VERSION
+
+IMPORT_BATCH_SIZE = 2000
+GZIP_MAGIC = b'\x1f\x8b'
+STATUSES = {value for value, _ in Node.STATUS_CHOICES}
+ROLES = {value for value, _ in ChatMessage.ROLE_CHOICES}
+
+
+class ImportFormatError(ValueError):
+    """The data is not a valid DevBrain export."""
+
+
+class _RawReader(io.RawIOBase):
+    """Adapt any object with read(n) (an upload, a request stream) to io.BufferedReader."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_records(stream):
+    """Yield export records from a binary stream in either format (see module docstring)."""
+    reader = io.BufferedReader(_RawReader(stream))
+    if reader.peek(2)[:2] == GZIP_MAGIC:
+        reader = gzip.GzipFile(fileobj=reader)
+
+    first_line = reader.readline()
+    try:
+        first = json.loads(first_line) if first_line.strip() else None
+    except ValueError:
+        first = None  # Pretty-printed JSON export spanning many lines
+    if not isinstance(first, dict) or 'type' not in first:
+        data = first if isinstance(first, dict) else _load_json(first_line + reader.read())
+        yield from json_export_records(data)
+        return
+
+    if first.get('type') != 'project' or first.get('format') != EXPORT_FORMAT:
+        raise ImportFormatError("Not a DevBrain export: the first record must be the project")
+    if first.get('version', EXPORT_VERSION) > EXPORT_VERSION:
+        raise ImportFormatError(f"Export version {first['version']} is newer than this server supports")
+    yield first
+    for number, line in enumerate(reader, start=2):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f"Line {number} is not valid JSON")
+
+
+def _load_json(data: bytes):
+    try:
+        return json.loads(data)
+    except ValueError:
+        raise ImportFormatError("Not valid JSON or NDJSON")
+
+
+def json_export_records(data):
+    """Turn the nested JSON export (ProjectDetailSerializer) into export records."""
+    if not isinstance(data, dict) or not isinstance(data.get('nodes'), list):
+        raise ImportFormatError("JSON export must be an object with a 'nodes' list")
+
+    yield {'type': 'project', 'name': data.get('name', ''), 'description': data.get('description', '')}
+    for node in data['nodes']:
+        position = node.get('position') or {}
+        yield {
+            'type': 'node', 'id': node.get('id'), 'parent': node.get('parentId'),
+            'label': node.get('label'), 'description': node.get('description', ''),
+            'status': node.get('status'), 'owner': node.get('owner'),
+            'position_x': position.get('x', 0), 'position_y': position.get('y', 0),
+        }
+    for edge in data.get('edges') or []:
+        yield {'type': 'edge', 'id': edge.get('id'), 'source': edge.get('source'), 'target': edge.get('target')}
+    for knowledge_base in data.get('knowledge_bases') or []:
+        yield {'type': 'knowledge_base', **knowledge_base}
+    for node in data['nodes']:
+        for message in node.get('chat_messages') or []:
+            yield {'type': 'chat_message', 'node': node.get('id'), **message}
+
+
+class ProjectImporter:
+    """Build a new project for `owner` from a stream of export records."""
+
+    def __init__(self, owner, name: str = None):
+        self.owner = owner
+        self.name = name
+        self.counts = {'nodes': 0, 'edges': 0, 'chat_messages': 0, 'skipped_knowledge_bases': 0}
+
+    def run(self, records) -> Project:
+        """Import everything in one transaction; returns the new project."""
+        records = iter(records)
+        header = next(records, None)
+        if not isinstance(header, dict) or header.get('type') != 'project':
+            raise ImportFormatError("The first record must be the project")
+
+        with transaction.atomic():
+            self.project = Project.objects.create(
+                name=self.name or header.get('name') or 'Imported project',
+                description=header.get('description') or '',
+                owner=self.owner,
+            )
+            self.node_ids = {}  # exported id -> new id
+            nodes, edges, messages = [], [], []
+            graph_inserted = False
+            for number, record in enumerate(records, start=2):
+                if not isinstance(record, dict):
+                    raise ImportFormatError(f"Record {number} is not an object")
+                record_type = record.get('type')
+                if record_type == 'node' or record_type == 'edge':
+                    if graph_inserted:
+                        raise ImportFormatError(f"Record {number}: nodes and edges must come before chat messages")
+                    (nodes if record_type == 'node' else edges).append(record)
+                elif record_type == 'knowledge_base':
+                    self.counts['skipped_knowledge_bases'] += 1
+                elif record_type == 'chat_message':
+                    # Messages stream in batches once every node has its new id
+                    if not graph_inserted:
+                        self._insert_graph(nodes, edges)
+                        graph_inserted = True
+                    messages.append(record)
+                    if len(messages) >= IMPORT_BATCH_SIZE:
+                        self._insert_messages(messages)
+                        messages = []
+                else:
+                    raise ImportFormatError(f"Record {number} has unknown type {record_type!r}")
+            if not graph_inserted:
+                self._insert_graph(nodes, edges)
+            self._insert_messages(messages)
+        return self.project
+
+    def _insert_graph(self, node_records: list, edge_records: list):
+        ordered = self.topological_order(node_records)
+        new_ids = _ascending_ids(len(ordered))
+        for record, new_id in zip(ordered, new_ids):
+            self.node_ids[record['id']] = new_id
+
+        nodes = []
+        for record, new_id in zip(ordered, new_ids):
+            status = record.get('status')
+            nodes.append(Node(
+                id=new_id,
+                project=self.project,
+                parent_id=self.node_ids.get(record.get('parent')),
+                label=str(record.get('label') or '')[:255],
+                description=record.get('description') or '',
+                status=status if status in STATUSES else 'not-started',
+                owner=record.get('owner'),
+                position_x=_number(record.get('position_x')),
+                position_y=_number(record.get('position_y')),
+            ))
+        StatusRollup.fill(nodes)
+        Node.objects.bulk_create(nodes, batch_size=IMPORT_BATCH_SIZE)
+        NodeHierarchy.insert_many(nodes)
+
+        edges, seen = [], set()
+        for record in edge_records:
+            source, target = self.node_ids.get(record.get('source')), self.node_ids.get(record.get('target'))
+            if source is None or target is None:
+                raise ImportFormatError(f"Edge {record.get('id')!r} points at a node that is not in the export")
+            if (source, target) not in seen:
+                seen.add((source, target))
+                edges.append(Edge(project=self.project, source_id=source, target_id=target))
+        for edge, new_id in zip(edges, _ascending_ids(len(edges))):
+            edge.id = new_id
+        Edge.objects.bulk_create(edges, batch_size=IMPORT_BATCH_SIZE)
+
+        self.counts['nodes'] += len(nodes)
+        self.counts['edges'] += len(edges)
+
+    def _insert_messages(self, records: list):
+        messages = []
+        for record, new_id in zip(records, _ascending_ids(len(records))):
+            node_id = self.node_ids.get(record.get('node'))
+            if node_id is None:
+                raise ImportFormatError(f"Chat message {record.get('id')!r} belongs to a node that is not in the export")
+            role = record.get('role')
+            messages.append(ChatMessage(
+                id=new_id,
+                node_id=node_id,
+                role=role if role in ROLES else 'user',
+                message=record.get('message') or '',
+                source=str(record.get('source') or 'user')[:50],
+            ))
+        ChatMessage.objects.bulk_create(messages, batch_size=IMPORT_BATCH_SIZE)
+        self.counts['chat_messages'] += len(messages)
+
+    @staticmethod
+    def topological_order(node_records: list) -> list:
+        """
+        Parents before children (breadth-first from the roots). A node whose
+        parent is not in the export becomes a root; a parent cycle is an error.
+        """
+        by_id = {}
+        for record in node_records:
+            if not isinstance(record.get('id'), str) or record['id'] in by_id:
+                raise ImportFormatError(f"Node ids must be unique strings (got {record.get('id')!r})")
+            by_id[record['id']] = record
+
+        children = {}
+        queue = deque()
+        for record in node_records:
+            parent = record.get('parent')
+            if parent in by_id:
+                children.setdefault(parent, []).append(record)
+            else:
+                record['parent'] = None
+                queue.append(record)
+
+        ordered = []
+        while queue:
+            record = queue.popleft()
+            ordered.append(record)
+            queue.extend(children.get(record['id'], ()))
+        if len(ordered) != len(node_records):
+            raise ImportFormatError("The node hierarchy contains a cycle")
+        return ordered
+
+
+def _ascending_ids(count: int) -> list:
+    """Fresh UUID strings in ascending order (they break created_at ties)."""
+    return sorted(str(uuid.uuid4()) for _ in range(count))
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def import_project(stream, owner, name: str = None):
+    """Import an export from a binary stream; returns (project, counts)."""
+    importer = ProjectImporter(owner, name)
+    project = importer.run(iter_records(stream))
+    return project, importer.counts
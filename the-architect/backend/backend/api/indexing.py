@@ -0,0 +1,334 @@
+"""
+Knowledge Index - Passage chunking, inverted index and BM25 ranking
+over uploaded knowledge files.
+
+Passages and postings belong to content-addressed blobs (shared by identical
+uploads); a project searches the blobs of its ready knowledge files.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from .models import KnowledgeBase, KnowledgeBlob, KnowledgeChunk, KnowledgePosting
+from .extraction import iter_pages
+from .embeddings import VectorIndex, get_embedder
+
+TOKEN_PATTERN = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+INDEX_BATCH_SIZE = 200  # Passages written per bulk insert
+RRF_K = 60  # Reciprocal rank fusion damping
+DOCUMENT_SEARCH_DEPTH = 200  # Passages ranked when searching whole files
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase index terms."""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_PATTERN.findall((text or "").lower())
+    ]
+
+
+def split_passages(pages, size: int = None, overlap: int = None):
+    """
+    Split a stream of extracted text into overlapping passages.
+
+    `pages` yields (page_number, text) pieces as produced by
+    extraction.iter_pages; a newline separates consecutive pages and pieces
+    of the same page are concatenated. Yields dicts with the passage text,
+    its start/end offsets in that joined text and the page it starts on.
+    Only about one passage plus one incoming piece is held in memory.
+    Passages end on whitespace where possible so words are not cut in half.
+    """
+    size = size or settings.KNOWLEDGE_CHUNK_SIZE
+    overlap = min(overlap if overlap is not None else settings.KNOWLEDGE_CHUNK_OVERLAP, size // 2)
+
+    buffer = ""
+    buffer_start = 0  # Offset of buffer[0] in the joined text
+    page_marks = []  # (offset, page_number) for pages overlapping the buffer
+
+    def page_at(offset):
+        page_number = page_marks[0][1]
+        for mark_offset, mark_page in page_marks:
+            if mark_offset > offset:
+                break
+            page_number = mark_page
+        return page_number
+
+    current_page = None
+    for page_number, text in pages:
+        if page_number != current_page:
+            if current_page is not None:
+                buffer += "\n"
+            page_marks.append((buffer_start + len(buffer), page_number))
+            current_page = page_number
+        buffer += text or ""
+
+        position = 0
+        while len(buffer) - position > size:
+            cut = buffer.rfind(" ", position + size // 2, position + size)
+            if cut <= position:
+                cut = position + size
+            start = buffer_start + position
+            yield {
+                'text': buffer[position:cut],
+                'start_offset': start,
+                'end_offset': buffer_start + cut,
+                'page_number': page_at(start),
+            }
+            step = max(cut - overlap, position + 1)
+            boundary = buffer.find(" ", step, cut)
+            position = boundary + 1 if boundary != -1 else step
+
+        if position:
+            buffer = buffer[position:]
+            buffer_start += position
+            while len(page_marks) > 1 and page_marks[1][0] <= buffer_start:
+                page_marks.pop(0)
+
+    if buffer.strip():
+        yield {
+            'text': buffer,
+            'start_offset': buffer_start,
+            'end_offset': buffer_start + len(buffer),
+            'page_number': page_at(buffer_start),
+        }
+
+
+class KnowledgeIndex:
+    """
+    Maintain passages, postings and vectors for knowledge blobs and rank
+    them with BM25 and/or cosine similarity within a project.
+    """
+
+    @staticmethod
+    def index_blob(blob: KnowledgeBlob, pages):
+        """
+        (Re)build the passages, postings and vectors of a knowledge blob.
+
+        `pages` is an iterable of (page_number, text) pieces, consumed
+        incrementally.
+        """
+        KnowledgeIndex.remove_blob(blob)
+
+        # Each batch commits on its own so the write lock is held briefly
+        # and the stream is never buffered whole.
+        batch = []
+        for position, passage in enumerate(split_passages(pages)):
+            batch.append((position, passage))
+            if len(batch) >= INDEX_BATCH_SIZE:
+                KnowledgeIndex._write_passages(blob, batch)
+                batch = []
+        if batch:
+            KnowledgeIndex._write_passages(blob, batch)
+
+    @staticmethod
+    @transaction.atomic
+    def _write_passages(blob: KnowledgeBlob, batch: list):
+        """Insert a batch of passages and their postings."""
+        term_counts = []
+        chunks = []
+        for position, passage in batch:
+            terms = tokenize(passage['text'])
+            term_counts.append(Counter(terms))
+            chunks.append(KnowledgeChunk(
+                blob=blob,
+                position=position,
+                token_count=len(terms),
+                **passage,
+            ))
+        KnowledgeChunk.objects.bulk_create(chunks)
+        KnowledgeBlob.objects.filter(pk=blob.pk).update(
+            passage_count=F('passage_count') + len(chunks),
+            token_total=F('token_total') + sum(chunk.token_count for chunk in chunks),
+        )
+
+        vectors = get_embedder().embed([chunk.text for chunk in chunks])
+        VectorIndex.for_blob(blob.pk).add([chunk.id for chunk in chunks], vectors)
+
+        KnowledgePosting.objects.bulk_create(
+            [
+                KnowledgePosting(
+                    blob=blob,
+                    chunk=chunk,
+                    term=term,
+                    frequency=frequency,
+                )
+                for chunk, counts in zip(chunks, term_counts)
+                for term, frequency in counts.items()
+            ],
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def remove_blob(blob: KnowledgeBlob):
+        """Drop a blob's passages, postings and blob-level vectors."""
+        chunk_ids = list(
+            KnowledgeChunk.objects.filter(blob=blob).values_list('id', flat=True)
+        )
+        # Deleting by id keeps the transaction write-first; SQLite cannot
+        # wait for the lock when upgrading a read transaction.
+        KnowledgeChunk.objects.filter(id__in=chunk_ids).delete()
+        KnowledgeBlob.objects.filter(pk=blob.pk).update(passage_count=0, token_total=0)
+        VectorIndex.for_blob(blob.pk).drop()
+
+    @staticmethod
+    def attach_blob(project_id, blob_id):
+        """Copy a blob's vectors into the project matrix (no-op if already there)."""
+        VectorIndex.for_project(project_id).add_from(VectorIndex.for_blob(blob_id))
+
+    @staticmethod
+    def detach_blob(project_id, blob_id):
+        """Blank a blob's rows in the project matrix."""
+        chunk_ids, _ = VectorIndex.for_blob(blob_id).live_rows()
+        VectorIndex.for_project(project_id).remove(chunk_ids)
+
+    @staticmethod
+    def project_blobs(project_id) -> dict:
+        """Map blob id -> knowledge base id for a project's ready files."""
+        blobs = {}
+        for blob_id, kb_id in (
+            KnowledgeBase.objects
+            .filter(project_id=project_id, ingestion_status='ready', blob__isnull=False)
+            .order_by('created_at')
+            .values_list('blob_id', 'id')
+        ):
+            blobs.setdefault(blob_id, kb_id)
+        return blobs
+
+    @staticmethod
+    def search(project_id, query: str, top_k: int = 10) -> list:
+        """
+        Rank a project's passages against a query.
+
+        Only postings for the query terms are read, so the cost grows with
+        the number of matching postings rather than with the corpus size.
+        Returns a list of (chunk_id, blob_id, score) sorted by score.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        blob_ids = list(KnowledgeIndex.project_blobs(project_id))
+        if not blob_ids:
+            return []
+
+        # One row per blob, not a scan of every passage
+        stats = KnowledgeBlob.objects.filter(pk__in=blob_ids).aggregate(
+            passages=Sum('passage_count'),
+            tokens=Sum('token_total'),
+        )
+        total_passages = stats['passages'] or 0
+        if not total_passages:
+            return []
+        average_length = stats['tokens'] / total_passages or 1
+
+        postings = list(
+            KnowledgePosting.objects.filter(blob_id__in=blob_ids, term__in=terms)
+            .values_list('chunk_id', 'blob_id', 'term', 'frequency', 'chunk__token_count')
+        )
+
+        document_frequency = Counter(posting[2] for posting in postings)
+        k1 = settings.BM25_K1
+        b = settings.BM25_B
+
+        scores = defaultdict(float)
+        owners = {}
+        for chunk_id, blob_id, term, frequency, length in postings:
+            df = document_frequency[term]
+            idf = math.log(1 + (total_passages - df + 0.5) / (df + 0.5))
+            norm = frequency + k1 * (1 - b + b * length / average_length)
+            scores[chunk_id] += idf * frequency * (k1 + 1) / norm
+            owners[chunk_id] = blob_id
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(chunk_id, owners[chunk_id], score) for chunk_id, score in ranked[:top_k]]
+
+    @staticmethod
+    def search_vectors(project_id, query: str, top_k: int = 10) -> list:
+        """
+        Rank a project's passages by cosine similarity to the query embedding.
+
+        Returns a list of (chunk_id, similarity) sorted by similarity.
+        """
+        query_vector = get_embedder().embed([query])
+        return VectorIndex.for_project(project_id).search(query_vector, top_k=top_k)[0]
+
+    @staticmethod
+    def search_hybrid(project_id, query: str, top_k: int = 10, depth: int = None) -> list:
+        """
+        Rank passages according to KNOWLEDGE_SEARCH_MODE.
+
+        'bm25' and 'vector' use a single ranking; 'hybrid' merges both with
+        reciprocal rank fusion over the top `depth` results of each.
+        Returns a list of (chunk_id, score).
+        """
+        depth = depth or top_k * 4
+        mode = settings.KNOWLEDGE_SEARCH_MODE
+        if mode == 'bm25':
+            return [(chunk_id, score) for chunk_id, _, score in
+                    KnowledgeIndex.search(project_id, query, top_k=top_k)]
+        if mode == 'vector':
+            return KnowledgeIndex.search_vectors(project_id, query, top_k=top_k or depth)
+
+        rankings = [
+            [chunk_id for chunk_id, _, _ in KnowledgeIndex.search(project_id, query, top_k=depth)],
+            [chunk_id for chunk_id, _ in KnowledgeIndex.search_vectors(project_id, query, top_k=depth)],
+        ]
+        fused = defaultdict(float)
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking):
+                fused[chunk_id] += 1 / (RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    @staticmethod
+    def search_documents(project_id, query: str, top_k: int = 10) -> list:
+        """
+        Rank knowledge files by their best-matching passage.
+
+        Returns a list of (knowledge_base_id, score) sorted by score.
+        """
+        # Rank deep enough that one long file's passages cannot crowd out the rest
+        ranked = KnowledgeIndex.search_hybrid(
+            project_id, query, top_k=None, depth=max(top_k * 20, DOCUMENT_SEARCH_DEPTH)
+        )
+        chunk_blobs = dict(
+            KnowledgeChunk.objects.filter(id__in=[chunk_id for chunk_id, _ in ranked])
+            .values_list('id', 'blob_id')
+        )
+        blob_owners = KnowledgeIndex.project_blobs(project_id)
+        best = {}
+        for chunk_id, score in ranked:
+            kb_id = blob_owners.get(chunk_blobs.get(chunk_id))
+            if kb_id is not None and kb_id not in best:
+                best[kb_id] = score
+        return list(best.items())[:top_k]
+
+    @staticmethod
+    def rebuild(project_id=None) -> int:
+        """
+        Re-extract and reindex every knowledge blob, then rebuild the project
+        vector matrices from the blob vectors (optionally for one project).
+        """
+        blobs = KnowledgeBlob.objects.filter(ref_count__gt=0)
+        if project_id:
+            blobs = blobs.filter(knowledge_bases__project_id=project_id).distinct()
+
+        blob_ids = []
+        for blob in blobs.iterator():
+            with blob.file.open('rb') as file_obj:
+                KnowledgeIndex.index_blob(blob, iter_pages(file_obj))
+            blob_ids.append(blob.pk)
+
+        # Passage ids changed, so every project using these blobs is rebuilt
+        project_ids = (
+            KnowledgeBase.objects.filter(blob_id__in=blob_ids)
+            .values_list('project_id', flat=True).distinct()
+        )
+        for pid in project_ids:
+            VectorIndex.for_project(pid).drop()
+            for blob_id in KnowledgeIndex.project_blobs(pid):
+                KnowledgeIndex.attach_blob(pid, blob_id)
+        return len(blob_ids)
@@ -0,0 +1,207 @@
+"""
+Ingestion - Background extraction and indexing of uploaded knowledge files.
+
+Uploads are saved with ingestion_status='queued' and handed to a local
+thread pool once the request's transaction commits. INGESTION_WORKERS bounds
+how many files are processed at once, so a burst of uploads queues up
+instead of competing with API requests. Content that was already extracted
+for an identical upload (same blob) skips extraction entirely.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import KnowledgeBase, KnowledgeBlob
+from .extraction import iter_pages
+from .indexing import KnowledgeIndex
+from .blobs import acquire_blob
+from .cache import invalidate_project_responses
+from .changes import ChangeLog
+
+
+PREVIEW_CHARS = 500
+PROGRESS_STEP = 5  # Percent change between progress writes
+
+
+PENDING_STATUSES = ['queued', 'processing']
+
+
+def _set_state(kb_id, **fields):
+    with transaction.atomic():
+        KnowledgeBase.objects.filter(pk=kb_id).update(**fields)
+        ChangeLog.record_rows([('knowledge_base', KnowledgeBase.objects.filter(pk=kb_id))])
+
+
+def _set_pending_state(blob_id, **fields):
+    """Update every not-yet-ready knowledge file waiting on a blob."""
+    with transaction.atomic():
+        waiting = KnowledgeBase.objects.filter(blob_id=blob_id, ingestion_status__in=PENDING_STATUSES)
+        ChangeLog.record_rows([('knowledge_base', waiting)])
+        waiting.update(**fields)
+
+
+class ProgressReporter:
+    """Map extraction progress onto ingestion_progress, writing only on real change."""
+
+    def __init__(self, blob_id, start: int = 5, end: int = 95):
+        self.blob_id = blob_id
+        self.start = start
+        self.end = end
+        self.reported = start
+
+    def __call__(self, fraction: float):
+        percent = int(self.start + (self.end - self.start) * min(fraction, 1.0))
+        if percent - self.reported >= PROGRESS_STEP:
+            self.reported = percent
+            _set_pending_state(self.blob_id, ingestion_progress=percent)
+
+
+def _tap_preview(pieces, preview: list):
+    """Pass text pieces through, keeping the first PREVIEW_CHARS characters."""
+    remaining = PREVIEW_CHARS
+    for page_number, text in pieces:
+        if remaining > 0:
+            if preview:
+                separator = "\n" if page_number != preview[-1][0] else ""
+                text_part = (separator + text)[:remaining]
+            else:
+                text_part = text[:remaining]
+            preview.append((page_number, text_part))
+            remaining -= len(text_part)
+        yield page_number, text
+
+
+def _claim_blob(blob_id) -> bool:
+    """Atomically take ownership of extracting a blob; only one worker wins."""
+    return KnowledgeBlob.objects.filter(
+        pk=blob_id, ingestion_status__in=['queued', 'failed']
+    ).update(ingestion_status='processing', ingestion_error='') == 1
+
+
+def _extract_blob(blob_id):
+    """
+    Extract and index a blob's content.
+
+    Text streams from the extractor straight into passage chunking and
+    indexing, so the whole document is never held in memory.
+    """
+    blob = KnowledgeBlob.objects.get(pk=blob_id)
+    _set_pending_state(blob_id, ingestion_status='processing', ingestion_progress=5, ingestion_error='')
+    try:
+        preview = []
+        with blob.file.open('rb') as file_obj:
+            pieces = iter_pages(file_obj, progress=ProgressReporter(blob_id))
+            KnowledgeIndex.index_blob(blob, _tap_preview(pieces, preview))
+
+        KnowledgeBlob.objects.filter(pk=blob_id).update(
+            content_preview="".join(text for _, text in preview),
+            ingestion_status='ready',
+        )
+    except Exception as e:
+        print(f"Ingestion Error ({blob_id}): {e}")
+        KnowledgeBlob.objects.filter(pk=blob_id).update(ingestion_status='failed', ingestion_error=str(e))
+
+
+def _attach_pending(blob_id):
+    """Finish every knowledge file waiting on a blob that is ready (or failed)."""
+    blob = KnowledgeBlob.objects.filter(pk=blob_id).values(
+        'ingestion_status', 'ingestion_error', 'content_preview'
+    ).first()
+    if blob is None:
+        return
+
+    if blob['ingestion_status'] == 'ready':
+        waiting = KnowledgeBase.objects.filter(
+            blob_id=blob_id, ingestion_status__in=PENDING_STATUSES
+        ).values_list('id', 'project_id')
+        for kb_id, project_id in waiting:
+            KnowledgeIndex.attach_blob(project_id, blob_id)
+            _set_state(
+                kb_id,
+                content_preview=blob['content_preview'],
+                ingestion_status='ready',
+                ingestion_progress=100,
+            )
+            invalidate_project_responses(project_id)
+    elif blob['ingestion_status'] == 'failed':
+        _set_pending_state(blob_id, ingestion_status='failed', ingestion_error=blob['ingestion_error'])
+    # Otherwise another worker is extracting it and will attach this file when done
+
+
+def ingest_knowledge_base(kb_id):
+    """
+    Bring one knowledge file to ready, recording its progress.
+
+    Content already extracted for an identical upload is reused: the file
+    only gets the blob's vectors copied into its project's matrix.
+    """
+    kb = KnowledgeBase.objects.defer('full_text').filter(pk=kb_id).first()
+    if kb is None:
+        return  # Deleted before a worker picked it up
+
+    if kb.blob_id is None:
+        kb = adopt_legacy_file(kb)
+
+    if _claim_blob(kb.blob_id):
+        _extract_blob(kb.blob_id)
+    _attach_pending(kb.blob_id)
+
+
+def adopt_legacy_file(kb: KnowledgeBase) -> KnowledgeBase:
+    """Move a file uploaded before content-addressed storage onto a blob."""
+    with kb.file.open('rb') as file_obj:
+        blob = acquire_blob(file_obj)
+    kb.blob = blob
+    kb.file = blob.file.name
+    _set_state(kb.pk, blob=blob, file=blob.file.name)
+    return kb
+
+
+class IngestionPool:
+    """Bounded local worker pool for knowledge ingestion (no external broker)."""
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='ingestion',
+        )
+
+    def submit(self, kb_id):
+        return self.executor.submit(self._run, kb_id)
+
+    @staticmethod
+    def _run(kb_id):
+        close_old_connections()
+        try:
+            ingest_knowledge_base(kb_id)
+        finally:
+            close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ingestion_pool() -> IngestionPool:
+    """Return the process-wide ingestion pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = IngestionPool(settings.INGESTION_WORKERS)
+        return _pool
+
+
+def enqueue_ingestion(kb: KnowledgeBase):
+    """
+    Queue a knowledge file for ingestion once the current transaction commits.
+    With INGESTION_EAGER the file is processed inline instead.
+    """
+    _set_state(kb.pk, ingestion_status='queued', ingestion_progress=0, ingestion_error='')
+    kb.ingestion_status = 'queued'
+    kb.ingestion_progress = 0
+
+    if settings.INGESTION_EAGER:
+        transaction.on_commit(lambda: ingest_knowledge_base(kb.pk))
+    else:
+        transaction.on_commit(lambda: get_ingestion_pool().submit(kb.pk))
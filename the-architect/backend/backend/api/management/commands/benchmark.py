@@ -0,0 +1,18 @@
+"""Run one of the performance benchmarks in api.benchmarks."""
+
+from django.core.management.base import BaseCommand
+from api.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run a performance benchmark: ' + ', '.join(sorted(BENCHMARKS))
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name, module in sorted(BENCHMARKS.items()):
+            subparser = subparsers.add_parser(name, help=(module.__doc__ or '').strip().splitlines()[0])
+            module.add_arguments(subparser)
+
+    def handle(self, *args, **options):
+        module = BENCHMARKS[options.pop('benchmark')]
+        module.run(self.stdout, **options)
@@ -0,0 +1,40 @@
+"""Create a project from an export file (NDJSON, gzipped NDJSON or JSON)."""
+
+import sys
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.importing import ImportFormatError, import_project
+
+
+class Command(BaseCommand):
+    help = 'Import a project export (GET /api/projects/{id}/export/, optionally ?format=ndjson) for a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Export file ('-' reads standard input)")
+        parser.add_argument('--owner', required=True, help='Username of the new project owner')
+        parser.add_argument('--name', help='Name for the new project (default: the exported name)')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']!r}")
+
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                project, counts = import_project(sys.stdin.buffer, owner, options.get('name'))
+            else:
+                with open(options['path'], 'rb') as handle:
+                    project, counts = import_project(handle, owner, options.get('name'))
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {project.name!r} as {project.id}: {counts['nodes']} node(s), {counts['edges']} edge(s), "
+            f"{counts['chat_messages']} chat message(s) in {time.perf_counter() - started:.1f}s."
+        ))
+        if counts['skipped_knowledge_bases']:
+            self.stdout.write(f"Skipped {counts['skipped_knowledge_bases']} knowledge file(s): "
+                              "exports carry no file contents, upload them again.")
@@ -0,0 +1,12 @@
+"""Recount knowledge blob references and delete blobs nothing uses."""
+
+from django.core.management.base import BaseCommand
+from api.blobs import prune_blobs
+
+
+class Command(BaseCommand):
+    help = 'Fix knowledge blob reference counts and delete unreferenced blobs.'
+
+    def handle(self, *args, **options):
+        deleted = prune_blobs()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced blob(s).'))
@@ -0,0 +1,15 @@
+"""Rebuild the knowledge search index for existing uploads."""
+
+from django.core.management.base import BaseCommand
+from api.indexing import KnowledgeIndex
+
+
+class Command(BaseCommand):
+    help = 'Re-extract and rebuild the knowledge search indexes (optionally for one project).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', help='Only reindex this project id')
+
+    def handle(self, *args, **options):
+        count = KnowledgeIndex.rebuild(options.get('project'))
+        self.stdout.write(self.style.SUCCESS(f'Reindexed {count} knowledge blob(s).'))
@@ -0,0 +1,15 @@
+"""Recompute the node closure table and status rollups from parent pointers."""
+
+from django.core.management.base import BaseCommand
+from api.hierarchy import NodeHierarchy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the node hierarchy index (NodeClosure) and status rollups for one project or all of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', help='Only rebuild this project id')
+
+    def handle(self, *args, **options):
+        written = NodeHierarchy.rebuild(options.get('project'))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} hierarchy row(s).'))
@@ -0,0 +1,29 @@
+"""Re-queue knowledge files whose ingestion was interrupted (e.g. by a restart)."""
+
+from django.core.management.base import BaseCommand
+from api.models import KnowledgeBase, KnowledgeBlob
+from api.ingestion import ingest_knowledge_base
+
+
+class Command(BaseCommand):
+    help = 'Ingest knowledge files left queued or processing (add --failed to retry failures).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also retry failed files')
+
+    def handle(self, *args, **options):
+        # Run only while no ingestion workers are active: blobs left mid-extraction
+        # by a dead process are handed back so they can be claimed again
+        KnowledgeBlob.objects.filter(ingestion_status='processing').update(ingestion_status='queued')
+
+        statuses = ['queued', 'processing']
+        if options['failed']:
+            statuses.append('failed')
+
+        kb_ids = list(
+            KnowledgeBase.objects.filter(ingestion_status__in=statuses)
+            .values_list('id', flat=True)
+        )
+        for kb_id in kb_ids:
+            ingest_knowledge_base(kb_id)
+        self.stdout.write(self.style.SUCCESS(f'Ingested {len(kb_ids)} knowledge file(s).'))
@@ -0,0 +1,128 @@
+"""
+Conversation Memory - Bounded chat history for the prompt.
+
+The prompt carries the node's last CHAT_HISTORY_MESSAGES messages verbatim
+(each cut to CHAT_HISTORY_MESSAGE_CHARS) plus a stored summary of everything
+older (at most CHAT_SUMMARY_MAX_CHARS). Its size therefore stays constant
+however long the conversation grows.
+
+The summary (ConversationSummary) is maintained incrementally: whenever a
+message is saved, the messages that have just left the verbatim window are
+folded in, usually one or two. Folding is extractive: each message becomes
+one line with its first sentence. When the summary outgrows its budget, the
+oldest assistant lines go first, then the oldest lines overall.
+"""
+
+import re
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .models import Node, ChatMessage, ConversationSummary
+
+SPEAKERS = {'user': 'User', 'ai': 'Assistant'}
+
+
+def _after(created_at, message_id) -> Q:
+    """Messages strictly after the (created_at, id) key."""
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+
+
+def _first_sentence(text: str) -> str:
+    """Plain first sentence of a message, without markdown decoration."""
+    text = re.sub(r'[*_`#>]+', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    match = re.match(r'(.+?[.!?])(\s|$)', text)
+    return match.group(1) if match else text
+
+
+class ConversationMemory:
+    """Rolling summary plus recent messages of a node's chat."""
+
+    @staticmethod
+    def record(node: Node):
+        """Fold messages that have left the verbatim window into the summary."""
+        window = settings.CHAT_HISTORY_MESSAGES
+        boundary = list(
+            ChatMessage.objects.filter(node=node)
+            .order_by('-created_at', '-id')
+            .values_list('created_at', 'id')[window:window + 1]
+        )
+        if not boundary:
+            return None
+        until_created, until_id = boundary[0]
+
+        with transaction.atomic():
+            summary, _ = ConversationSummary.objects.select_for_update().get_or_create(node=node)
+            pending = ChatMessage.objects.filter(node=node).exclude(_after(until_created, until_id))
+            if summary.summarized_until is not None:
+                pending = pending.filter(_after(summary.summarized_until, summary.last_message_id))
+            pending = list(pending.order_by('created_at', 'id').only('id', 'role', 'message', 'created_at'))
+            if not pending:
+                return summary
+
+            summary.summary = ConversationMemory.fold(summary.summary, pending)
+            summary.summarized_until = pending[-1].created_at
+            summary.last_message_id = pending[-1].id
+            summary.message_count += len(pending)
+            summary.save()
+        return summary
+
+    @staticmethod
+    def fold(summary: str, messages: list) -> str:
+        """Append one line per message, then trim to CHAT_SUMMARY_MAX_CHARS."""
+        line_chars = settings.CHAT_SUMMARY_LINE_CHARS
+        lines = summary.splitlines() if summary else []
+        for message in messages:
+            sentence = _first_sentence(message.message)
+            if len(sentence) > line_chars:
+                sentence = sentence[:line_chars - 1].rstrip() + '…'
+            if sentence:
+                lines.append(f"{SPEAKERS.get(message.role, message.role)}: {sentence}")
+
+        budget = settings.CHAT_SUMMARY_MAX_CHARS
+        size = sum(len(line) + 1 for line in lines)
+        for speaker in ('Assistant:', None):
+            index = 0
+            while size > budget and index < len(lines):
+                if speaker is None or lines[index].startswith(speaker):
+                    size -= len(lines.pop(index)) + 1
+                else:
+                    index += 1
+        return "\n".join(lines)
+
+    @staticmethod
+    def context(node: Node, current_message: str = None):
+        """
+        Return (summary text, recent messages) for a prompt. The recent
+        messages are those not yet summarized, oldest first, without the
+        just-saved user message being answered.
+        """
+        window = settings.CHAT_HISTORY_MESSAGES
+        summary = ConversationSummary.objects.filter(node=node).first()
+        recent = ChatMessage.objects.filter(node=node)
+        if summary is not None and summary.summarized_until is not None:
+            recent = recent.filter(_after(summary.summarized_until, summary.last_message_id))
+        recent = list(recent.order_by('-created_at', '-id')[:window + 1])
+        recent.reverse()
+        if recent and recent[-1].role == 'user' and recent[-1].message == current_message:
+            recent.pop()
+        return (summary.summary if summary else ''), recent[-window:]
+
+    @staticmethod
+    def format_context(summary: str, recent: list) -> str:
+        """Format the conversation memory as a prompt section."""
+        if not summary and not recent:
+            return ""
+
+        message_chars = settings.CHAT_HISTORY_MESSAGE_CHARS
+        context = ""
+        if summary:
+            context += f"## Conversation so far (summary):\n{summary}\n\n"
+        if recent:
+            context += "## Recent messages:\n"
+            for message in recent:
+                text = message.message.strip()
+                if len(text) > message_chars:
+                    text = text[:message_chars].rstrip() + '…'
+                context += f"{SPEAKERS.get(message.role, message.role)}: {text}\n"
+        return context
@@ -0,0 +1,75 @@
+"""
+Metrics - In-process counters and gauges, scraped from GET /api/metrics/.
+
+Counters only go up (hits, misses, ...); gauges are callables evaluated at
+scrape time (cache size, breaker state, ...). Values are per server process.
+"""
+
+import threading
+from rest_framework.renderers import BaseRenderer
+
+
+class MetricsRegistry:
+    """Thread-safe named counters plus gauge callbacks."""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = ''):
+        """Declare a counter so it is reported (as 0) before its first increment."""
+        with self._lock:
+            self._counters.setdefault(name, 0)
+            self._help[name] = help_text
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def gauge(self, name: str, func, help_text: str = ''):
+        """Register a callable returning the gauge's current value."""
+        with self._lock:
+            self._gauges[name] = func
+            self._help[name] = help_text
+
+    def value(self, name: str):
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            func = self._gauges.get(name)
+        return func() if func else None
+
+    def snapshot(self) -> dict:
+        """Current value of every counter and gauge."""
+        with self._lock:
+            values = dict(self._counters)
+            gauges = dict(self._gauges)
+        for name, func in gauges.items():
+            values[name] = func()
+        return dict(sorted(values.items()))
+
+    def render_prometheus(self, values: dict = None) -> str:
+        """Prometheus text exposition of a snapshot."""
+        values = self.snapshot() if values is None else values
+        lines = []
+        for name, value in values.items():
+            if self._help.get(name):
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {'counter' if name in self._counters else 'gauge'}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render a metrics snapshot for Prometheus (?format=prometheus)."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return metrics.render_prometheus(data).encode(self.charset)
@@ -3,7 +3,7 @@ Django models for DevBrain backend.
 Mirrors the frontend Zustand store structure.
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 import uuid
 
@@ -14,15 +14,34 @@ class Project(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
+    # Bumped by every recorded change to the project's contents (api/changes.py)
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Node counts by status, maintained incrementally (api/rollups.py)
+    node_count = models.PositiveIntegerField(default=0, editable=False)
+    not_started_count = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Only ever changed with F() increments; a full save must not write back stale values
+    COUNTER_FIELDS = ('version', 'node_count', 'not_started_count', 'in_progress_count', 'completed_count')
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Save, never writing back counters that concurrent changes may have moved on from."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Node(models.Model):
     """Mind map node - mirrors frontend node structure."""
@@ -53,29 +72,134 @@ class Node(models.Model):
     position_x = models.FloatField(default=0)
     position_y = models.FloatField(default=0)
     
+    # Subtree (this node included) counts by status, maintained incrementally (api/rollups.py)
+    subtree_count = models.PositiveIntegerField(default=1, editable=False)
+    subtree_not_started = models.PositiveIntegerField(default=1, editable=False)
+    subtree_in_progress = models.PositiveIntegerField(default=0, editable=False)
+    subtree_completed = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    COUNTER_FIELDS = ('subtree_count', 'subtree_not_started', 'subtree_in_progress', 'subtree_completed')
+
     class Meta:
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['project', 'parent']),
+            models.Index(fields=['project', 'created_at']),
             models.Index(fields=['status']),
         ]
 
     def __str__(self):
         return f"{self.label} ({self.status})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored parent and status so save() can tell a reparent or status change apart
+        if 'parent_id' in field_names:
+            instance._loaded_parent_id = values[field_names.index('parent_id')]
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save, keeping the NodeClosure hierarchy, status rollups and change log in step."""
+        from .hierarchy import NodeHierarchy
+        from .rollups import StatusRollup
+        from .changes import ChangeLog
+
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        reparented = (
+            not adding
+            and hasattr(self, '_loaded_parent_id')
+            and self.parent_id != self._loaded_parent_id
+            and (update_fields is None or 'parent' in update_fields or 'parent_id' in update_fields)
+        )
+        status_changed = (
+            not adding
+            and hasattr(self, '_loaded_status')
+            and self.status != self._loaded_status
+            and (update_fields is None or 'status' in update_fields)
+        )
+        if adding:
+            StatusRollup.fill([self])
+        elif update_fields is None:
+            # Rollups only change through F() increments
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                NodeHierarchy.insert(self)
+            else:
+                if status_changed:
+                    StatusRollup.status_changed(self, self._loaded_status)
+                if reparented:
+                    NodeHierarchy.move(self)
+            ChangeLog.record(self.project_id, changed={'node': [self.pk]})
+        self._loaded_parent_id = self.parent_id
+        self._loaded_status = self.status
+
+    def delete(self, *args, **kwargs):
+        """Delete the node and its subtree, leaving tombstones for everything removed."""
+        from .changes import ChangeLog
+        from .rollups import StatusRollup
+        with transaction.atomic():
+            ChangeLog.record(self.project_id, deleted=ChangeLog.subtree_tombstones(
+                Node.objects.filter(ancestor_links__ancestor_id=self.pk)
+            ))
+            StatusRollup.removed(self.pk, self.project_id)
+            return super().delete(*args, **kwargs)
+
     def get_children(self):
         """Get all direct children."""
         return self.children.all()
 
-    def get_descendants(self):
-        """Get all descendant nodes recursively."""
-        descendants = list(self.children.all())
-        for child in descendants:
-            descendants.extend(child.get_descendants())
-        return descendants
+    def get_descendants(self, max_depth: int = None):
+        """Get all descendant nodes (one query via the closure table)."""
+        from .hierarchy import NodeHierarchy
+        return NodeHierarchy.descendants(self, max_depth)
+
+    def get_ancestors(self):
+        """Get ancestor nodes, root first."""
+        from .hierarchy import NodeHierarchy
+        return NodeHierarchy.ancestors(self)
+
+    def get_depth(self):
+        """Distance from the root (roots are depth 0)."""
+        from .hierarchy import NodeHierarchy
+        return NodeHierarchy.depth(self)
+
+    def get_subtree_size(self):
+        """Number of nodes in this subtree, including this node."""
+        from .hierarchy import NodeHierarchy
+        return NodeHierarchy.subtree_size(self)
+
+
+class NodeClosure(models.Model):
+    """
+    Hierarchy index: one row per (ancestor, descendant) pair of nodes,
+    including every node paired with itself at depth 0.
+    Maintained by Node.save; see api/hierarchy.py.
+    """
+    ancestor = models.ForeignKey(Node, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Node, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()  # Edges between ancestor and descendant
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['ancestor', 'depth']),
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
 
 
 class Edge(models.Model):
@@ -96,6 +220,51 @@ class Edge(models.Model):
     def __str__(self):
         return f"{self.source.label} → {self.target.label}"
 
+    def save(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeLog.record(self.project_id, changed={'edge': [self.pk]})
+
+    def delete(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            ChangeLog.record(self.project_id, deleted={'edge': [self.pk]})
+            return super().delete(*args, **kwargs)
+
+
+INGESTION_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
+
+class KnowledgeBlob(models.Model):
+    """
+    Content-addressed file storage shared by identical uploads.
+    Extracted passages, postings and vectors hang off the blob, so a
+    re-upload of the same bytes only adds a reference.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='knowledge_blobs/')
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)  # KnowledgeBase rows using this blob
+    content_preview = models.TextField(blank=True)
+    # Passage totals kept by KnowledgeIndex, so BM25 never counts the passages
+    passage_count = models.PositiveIntegerField(default=0)
+    token_total = models.BigIntegerField(default=0)
+
+    # Extraction + indexing state (shared by every upload of this content)
+    ingestion_status = models.CharField(max_length=20, choices=INGESTION_STATUS_CHOICES, default='queued')
+    ingestion_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
 
 class KnowledgeBase(models.Model):
     """Uploaded knowledge files (PDFs, docs, notes)."""
@@ -107,25 +276,90 @@ class KnowledgeBase(models.Model):
         ('docx', 'Word Document'),
     ]
 
+    INGESTION_STATUS_CHOICES = INGESTION_STATUS_CHOICES
+
     id = models.CharField(max_length=36, primary_key=True, default=uuid.uuid4, editable=False)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='knowledge_bases')
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='knowledge_files/')
+    file = models.FileField(upload_to='knowledge_files/')  # Points at the blob's stored file
+    blob = models.ForeignKey(
+        KnowledgeBlob,
+        on_delete=models.PROTECT,
+        related_name='knowledge_bases',
+        blank=True,
+        null=True
+    )
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
     content_preview = models.TextField(blank=True)  # First 500 chars for quick reference
     
-    # Vector embeddings for semantic search (for future use with embeddings)
-    full_text = models.TextField(blank=True)  # Extracted/processed content
+    # Extracted text lives in KnowledgeChunk passages; kept for files ingested before chunking
+    full_text = models.TextField(blank=True)
+    
+    # Background ingestion (extraction + indexing) state
+    ingestion_status = models.CharField(max_length=20, choices=INGESTION_STATUS_CHOICES, default='queued')
+    ingestion_progress = models.PositiveSmallIntegerField(default=0)  # Percent complete
+    ingestion_error = models.TextField(blank=True)
     
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['ingestion_status']),
+            models.Index(fields=['project', 'blob']),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.file_type})"
 
+    def save(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeLog.record(self.project_id, changed={'knowledge_base': [self.pk]})
+
+    def delete(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            ChangeLog.record(self.project_id, deleted={'knowledge_base': [self.pk]})
+            return super().delete(*args, **kwargs)
+
+
+class KnowledgeChunk(models.Model):
+    """Overlapping passage of a knowledge blob - the unit of retrieval."""
+    blob = models.ForeignKey(KnowledgeBlob, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField()  # Order within the file
+    page_number = models.PositiveIntegerField(default=1)  # Page the passage starts on
+    start_offset = models.PositiveIntegerField()  # Character offsets into the extracted text
+    end_offset = models.PositiveIntegerField()
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)  # Passage length for BM25
+
+    class Meta:
+        ordering = ['blob', 'position']
+        unique_together = ('blob', 'position')
+
+    def __str__(self):
+        return f"{self.blob_id[:12]} #{self.position} (p. {self.page_number})"
+
+
+class KnowledgePosting(models.Model):
+    """Inverted index entry: how often a term occurs in a passage."""
+    blob = models.ForeignKey(KnowledgeBlob, on_delete=models.CASCADE, related_name='postings')
+    chunk = models.ForeignKey(KnowledgeChunk, on_delete=models.CASCADE, related_name='postings')
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('chunk', 'term')
+        indexes = [
+            models.Index(fields=['blob', 'term']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} x{self.frequency}"
+
 
 class ChatMessage(models.Model):
     """Chat history per node - mirrors frontend chatHistory structure."""
@@ -152,3 +386,70 @@ class ChatMessage(models.Model):
 
     def __str__(self):
         return f"{self.role}: {self.message[:50]}..."
+
+    def save(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeLog.record(self._project_id(), changed={'chat_message': [self.pk]})
+
+    def delete(self, *args, **kwargs):
+        from .changes import ChangeLog
+        with transaction.atomic():
+            ChangeLog.record(self._project_id(), deleted={'chat_message': [self.pk]})
+            return super().delete(*args, **kwargs)
+
+    def _project_id(self):
+        """The node's project id, read without loading the node unless it is already cached."""
+        if self._meta.get_field('node').is_cached(self):
+            return self.node.project_id
+        return Node.objects.filter(pk=self.node_id).values_list('project_id', flat=True).first()
+
+
+class ConversationSummary(models.Model):
+    """
+    Rolling summary of a node's chat turns that have left the verbatim
+    window; folded forward as messages are saved. See api/memory.py.
+    """
+    node = models.OneToOneField(Node, on_delete=models.CASCADE, primary_key=True, related_name='conversation_summary')
+    summary = models.TextField(blank=True, default='')
+    # Key (created_at, id) of the newest message folded into the summary
+    summarized_until = models.DateTimeField(null=True, blank=True)
+    last_message_id = models.CharField(max_length=36, blank=True, default='')
+    message_count = models.PositiveIntegerField(default=0)  # Messages folded so far
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of {self.node_id} ({self.message_count} messages)"
+
+
+class ProjectChange(models.Model):
+    """
+    Change log for delta sync: the project version at which an object last
+    changed, and whether that change deleted it (a tombstone). One row per
+    object, so the log grows with the objects, not with every edit.
+    Maintained by api/changes.py.
+    """
+
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('node', 'Node'),
+        ('edge', 'Edge'),
+        ('knowledge_base', 'Knowledge Base'),
+        ('chat_message', 'Chat Message'),
+    ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='changes')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=36)
+    version = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('project', 'kind', 'object_id')
+        indexes = [
+            models.Index(fields=['project', 'version']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} @ {self.version}{' (deleted)' if self.deleted else ''}"
@@ -0,0 +1,130 @@
+"""
+Pagination - Keyset (seek) pagination on (created_at, id).
+
+Page N costs the same as page 1: instead of OFFSET and COUNT(*), each page
+is fetched with `WHERE (created_at, id) < (cursor) ORDER BY created_at, id
+LIMIT n + 1`, which walks an index straight to the cursor. The cursor is an
+opaque token holding the last row's key, so rows inserted while a client is
+scrolling never shift or repeat a page.
+
+Response: {"next": url|null, "previous": url|null, "results": [...]}.
+No total count is returned.
+"""
+
+import base64
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek through a queryset by (created_at, id).
+
+    newest_first=False: the first page is the oldest rows, `next` is newer.
+    newest_first=True:  the first page is the latest rows, `next` is older
+                        (infinite-scroll chat: latest N, then older).
+    `previous` walks back the other way. ?page_size= overrides the default
+    (up to max_page_size).
+    """
+
+    newest_first = False
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, backwards = self.decode_cursor(request)
+
+        descending = self.newest_first != backwards
+        ordering = ('-created_at', '-id') if descending else ('created_at', 'id')
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            created_at, pk = position
+            try:
+                pk = queryset.model._meta.pk.to_python(pk)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            if descending:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        # A page reached by walking back always has rows after it, and vice versa
+        has_next = more if not backwards else position is not None
+        has_previous = more if backwards else position is not None
+        self.next_cursor = self.encode_cursor(rows[-1], backwards=False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], backwards=True) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.link(self.next_cursor),
+            'previous': self.link(self.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        default = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 100
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            return default
+        return min(max(size, 1), self.max_page_size)
+
+    def link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def encode_cursor(row, backwards: bool) -> str:
+        payload = json.dumps([row.created_at.isoformat(), str(row.pk), int(backwards)])
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        """Return ((created_at, id) or None, backwards) from ?cursor=."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            created_at, pk, backwards = json.loads(payload.decode('utf-8'))
+            created_at = parse_datetime(created_at)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), bool(backwards)
+
+
+class LatestFirstPagination(KeysetPagination):
+    """Keyset pagination starting from the newest rows (chat history)."""
+
+    newest_first = True
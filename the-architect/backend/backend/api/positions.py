@@ -0,0 +1,136 @@
+"""
+Node Positions - Batched, optionally write-behind, layout updates.
+
+Dragging produces a stream of (id, x, y) updates. They are written with a
+single bulk_update of position_x/position_y only; updated_at is left alone
+because moving a card is not an edit of the node.
+
+With NODE_POSITION_WRITE_BEHIND the updates are held in memory instead,
+coalesced per node (last position wins) and flushed by a background thread
+every NODE_POSITION_FLUSH_INTERVAL seconds, so a node dragged through twenty
+positions inside one window costs one row write.
+"""
+
+import atexit
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import Node
+from .changes import ChangeLog
+
+POSITION_BATCH_SIZE = 500
+
+
+def parse_positions(items) -> dict:
+    """Validate [{id, x, y}, ...] into {id: (x, y)}; later entries for an id win."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("positions must be a non-empty list of {id, x, y}")
+    positions = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('id'), str):
+            raise ValueError("Each position needs a node id")
+        try:
+            positions[item['id']] = (float(item['x']), float(item['y']))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Invalid x/y for node {item['id']}")
+    return positions
+
+
+def write_positions(positions: dict) -> int:
+    """
+    Write positions in one bulk UPDATE of the position columns and record
+    the moves for delta sync; returns rows matched.
+    """
+    if not positions:
+        return 0
+    nodes = [
+        Node(id=node_id, position_x=x, position_y=y)
+        for node_id, (x, y) in positions.items()
+    ]
+    node_ids = list(positions)
+    with transaction.atomic():
+        updated = Node.objects.bulk_update(nodes, ['position_x', 'position_y'], batch_size=POSITION_BATCH_SIZE)
+        ChangeLog.record_rows(
+            ('node', Node.objects.filter(id__in=node_ids[start:start + POSITION_BATCH_SIZE]))
+            for start in range(0, len(node_ids), POSITION_BATCH_SIZE)
+        )
+    return updated
+
+
+class PositionWriteBuffer:
+    """In-memory, per-node coalescing buffer flushed on a fixed interval."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, positions: dict):
+        with self._lock:
+            self._pending.update(positions)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='position-flush', daemon=True
+                )
+                self._thread.start()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns rows matched."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            return write_positions(pending)
+        except Exception:
+            # Keep positions that were not superseded while writing
+            with self._lock:
+                for node_id, position in pending.items():
+                    self._pending.setdefault(node_id, position)
+            raise
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Position Flush Error: {e}")
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_position_buffer() -> PositionWriteBuffer:
+    """Return the process-wide position buffer, creating it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = PositionWriteBuffer(settings.NODE_POSITION_FLUSH_INTERVAL)
+            atexit.register(_buffer.flush)
+        return _buffer
+
+
+def save_positions(positions: dict):
+    """
+    Persist positions now, or queue them when write-behind is enabled.
+    Returns the number of rows written, or None if they were queued.
+    """
+    if settings.NODE_POSITION_WRITE_BEHIND:
+        get_position_buffer().add(positions)
+        return None
+    return write_positions(positions)
+
+
+def flush_positions():
+    """Write queued positions before a read that must see them."""
+    if _buffer is not None:
+        _buffer.flush()
@@ -0,0 +1,357 @@
+"""
+Realtime - Push project change events to collaborators over WebSockets.
+
+ws://<host>/ws/projects/<id>/ (session cookie auth, project owner only)
+sends JSON messages:
+- hello:   {"type": "hello", "project", "version"} once subscribed; fetch
+           GET /api/projects/{id}/changes/?since=<last version> to catch up
+- changes: {"type": "changes", "events": [...], "moves": [[id, x, y], ...]}
+- resync:  the connection fell too far behind and is closed; reconnect and
+           catch up with the changes endpoint
+
+Views publish compact events once their transaction commits:
+node.created / node.updated {"nodes": [...]}, node.deleted {"ids": [...]},
+edge.created / edge.updated {"edges": [{id, source, target}]},
+edge.deleted {"ids": [...]}
+and chat.message {"node", "message"}. Nothing is sent as it happens: every
+REALTIME_TICK seconds each project's pending events go out as one message,
+encoded once and handed to every subscriber. Moves are coalesced per node
+(last position wins, and a later full node event supersedes them), so a
+drag is a few positions per tick however many clients watch it.
+
+Channel layers (REALTIME_CHANNEL_LAYER):
+- api.realtime.LocalChannelLayer  in-process groups; every client of a
+                                  project must reach the same server process
+Any class with subscribe/unsubscribe/group_send/subscriber_count can stand
+in for it. An empty setting disables push (and skips publishing work).
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.http import HttpRequest
+from django.http.request import split_domain_port, validate_host
+from django.utils.module_loading import import_string
+from .metrics import metrics
+from .models import Project, Node
+
+SOCKET_PATH = re.compile(r'^/ws/projects/(?P<project_id>[^/]+)/?$')
+RESYNC = json.dumps({'type': 'resync'})
+EVENT_PAYLOADS = ('nodes', 'edges', 'ids', 'message')  # Events with none of these are dropped
+
+metrics.counter('devbrain_realtime_batches_total', 'Event batches fanned out to project subscribers')
+metrics.counter('devbrain_realtime_deliveries_total', 'Event batches queued for individual WebSocket clients')
+metrics.counter('devbrain_realtime_resyncs_total', 'WebSocket clients dropped for falling behind')
+
+
+def project_group(project_id) -> str:
+    return f'project.{project_id}'
+
+
+class Subscription:
+    """One connection's bounded inbox, filled from any thread, drained on its event loop."""
+
+    def __init__(self, capacity: int):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=capacity)
+
+    def deliver(self, text: str):
+        self.loop.call_soon_threadsafe(self._put, text)
+
+    def _put(self, text: str):
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: tell it to resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            metrics.increment('devbrain_realtime_resyncs_total')
+
+
+class LocalChannelLayer:
+    """In-process groups of subscriptions; group_send is safe from any thread."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, group: str) -> Subscription:
+        """Join a group (call on the connection's event loop)."""
+        subscription = Subscription(self.capacity)
+        with self._lock:
+            self._groups.setdefault(group, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, group: str, subscription: Subscription):
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(subscription)
+                if not members:
+                    del self._groups[group]
+
+    def group_send(self, group: str, text: str) -> int:
+        """Queue an encoded message for every member; returns how many."""
+        with self._lock:
+            members = list(self._groups.get(group, ()))
+        for subscription in members:
+            subscription.deliver(text)
+        return len(members)
+
+    def subscriber_count(self, group: str = None) -> int:
+        with self._lock:
+            if group is not None:
+                return len(self._groups.get(group, ()))
+            return sum(len(members) for members in self._groups.values())
+
+
+class EventPublisher:
+    """Per-project pending events, fanned out once per tick by a background thread."""
+
+    def __init__(self, layer, tick: float):
+        self.layer = layer
+        self.tick = tick
+        self._events = {}  # project id -> [event]
+        self._moves = {}  # project id -> {node id: (x, y)}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, project_id, events: list):
+        project_id = str(project_id)
+        events = [event for event in events if any(event.get(key) for key in EVENT_PAYLOADS)]
+        if not events:
+            return
+        with self._lock:
+            moves = self._moves.get(project_id)
+            for event in events:
+                if moves and event['op'].startswith('node.'):
+                    # The event carries (or removes) the node's latest position
+                    for node_id in event.get('ids') or [node['id'] for node in event['nodes']]:
+                        moves.pop(node_id, None)
+            self._events.setdefault(project_id, []).extend(events)
+            self._start()
+
+    def add_moves(self, project_id, positions: dict):
+        with self._lock:
+            self._moves.setdefault(str(project_id), {}).update(positions)
+            self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='realtime-publish', daemon=True)
+            self._thread.start()
+
+    def flush(self) -> int:
+        """Send every project's pending events as one message each; returns messages sent."""
+        with self._lock:
+            events, self._events = self._events, {}
+            moves, self._moves = self._moves, {}
+        sent = 0
+        for project_id in set(events) | set(moves):
+            message = {
+                'type': 'changes',
+                'events': events.get(project_id, []),
+                'moves': [[node_id, x, y] for node_id, (x, y) in moves.get(project_id, {}).items()],
+            }
+            text = json.dumps(message, cls=DjangoJSONEncoder, separators=(',', ':'))
+            delivered = self.layer.group_send(project_group(project_id), text)
+            metrics.increment('devbrain_realtime_batches_total')
+            metrics.increment('devbrain_realtime_deliveries_total', delivered)
+            sent += 1
+        return sent
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Realtime Publish Error: {e}")
+
+
+_publisher = None
+_publisher_config = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Return the process-wide publisher (and its layer), or None when push is disabled."""
+    global _publisher, _publisher_config
+    config = (settings.REALTIME_CHANNEL_LAYER, settings.REALTIME_TICK, settings.REALTIME_QUEUE_SIZE)
+    if not config[0]:
+        return None
+    with _publisher_lock:
+        if _publisher is None or _publisher_config != config:
+            layer = import_string(settings.REALTIME_CHANNEL_LAYER)(settings.REALTIME_QUEUE_SIZE)
+            _publisher = EventPublisher(layer, settings.REALTIME_TICK)
+            _publisher_config = config
+        return _publisher
+
+
+def _watched(publisher, project_id) -> bool:
+    return publisher is not None and publisher.layer.subscriber_count(project_group(project_id)) > 0
+
+
+def publish(project_id, build_events):
+    """
+    Queue the events returned by build_events() for a project once the
+    current transaction commits. build_events is only called while someone
+    is subscribed, so unwatched projects pay nothing for serialization.
+    """
+    def send():
+        publisher = get_publisher()
+        if _watched(publisher, project_id):
+            publisher.add(project_id, build_events())
+    transaction.on_commit(send)
+
+
+def publish_now(project_id, build_events):
+    """publish() for data that is already committed (safe from async code)."""
+    publisher = get_publisher()
+    if _watched(publisher, project_id):
+        publisher.add(project_id, build_events())
+
+
+def publish_moves(positions: dict, project_id=None):
+    """Queue node moves ({id: (x, y)}) for coalescing; looks up projects when not given."""
+    publisher = get_publisher()
+    if publisher is None or publisher.layer.subscriber_count() == 0:
+        return
+    if project_id is not None:
+        by_project = {str(project_id): positions}
+    else:
+        by_project = {}
+        for node_id, node_project_id in Node.objects.filter(id__in=list(positions)).values_list('id', 'project_id'):
+            by_project.setdefault(node_project_id, {})[node_id] = positions[node_id]
+    for node_project_id, moves in by_project.items():
+        if _watched(publisher, node_project_id):
+            publisher.add_moves(node_project_id, moves)
+
+
+def node_event(op: str, nodes) -> dict:
+    from .serializers import NodeSnapshotSerializer
+    return {'op': f'node.{op}', 'nodes': NodeSnapshotSerializer(nodes, many=True).data}
+
+
+def edge_event(op: str, edges) -> dict:
+    return {'op': f'edge.{op}', 'edges': [
+        {'id': str(edge.id), 'source': edge.source_id, 'target': edge.target_id} for edge in edges
+    ]}
+
+
+def deleted_event(kind: str, ids) -> dict:
+    return {'op': f'{kind}.deleted', 'ids': [str(object_id) for object_id in ids]}
+
+
+def chat_event(message) -> dict:
+    from .serializers import ChatMessageSerializer
+    return {'op': 'chat.message', 'node': message.node_id, 'message': ChatMessageSerializer(message).data}
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _origin_allowed(scope) -> bool:
+    """Browsers send Origin on WebSocket handshakes; only trusted pages may open one."""
+    origin = _header(scope, b'origin')
+    if not origin:
+        return True
+    if origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+        return True
+    host, _ = split_domain_port(origin.split('://', 1)[-1])
+    return validate_host(host, settings.ALLOWED_HOSTS)
+
+
+def _authorize(scope, project_id):
+    """The session's user, if it owns the project (else None). Runs in a thread."""
+    close_old_connections()
+    try:
+        cookies = SimpleCookie(_header(scope, b'cookie'))
+        session_key = cookies[settings.SESSION_COOKIE_NAME].value if settings.SESSION_COOKIE_NAME in cookies else None
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(request)
+        if not user.is_authenticated or not Project.objects.filter(pk=project_id, owner=user).exists():
+            return None
+        return user
+    finally:
+        close_old_connections()
+
+
+def _project_version(project_id):
+    close_old_connections()
+    try:
+        return Project.objects.filter(pk=project_id).values_list('version', flat=True).first()
+    finally:
+        close_old_connections()
+
+
+async def project_socket(scope, receive, send):
+    """ASGI application for ws /ws/projects/<id>/."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    match = SOCKET_PATH.match(scope['path'])
+    publisher = get_publisher()
+    if match is None or publisher is None or not _origin_allowed(scope):
+        await send({'type': 'websocket.close', 'code': 4404 if match is None else 4403})
+        return
+    project_id = match['project_id']
+    if await sync_to_async(_authorize, thread_sensitive=False)(scope, project_id) is None:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    group = project_group(project_id)
+    subscription = publisher.layer.subscribe(group)
+    receiving = outgoing = None
+    try:
+        # Subscribed first: anything after this version reaches the inbox
+        version = await sync_to_async(_project_version, thread_sensitive=False)(project_id)
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': json.dumps(
+            {'type': 'hello', 'project': project_id, 'version': version}
+        )})
+        receiving = asyncio.ensure_future(receive())
+        while True:
+            outgoing = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({receiving, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+            if outgoing in done:
+                text = outgoing.result()
+                await send({'type': 'websocket.send', 'text': text})
+                if text == RESYNC:
+                    await send({'type': 'websocket.close', 'code': 4000})
+                    return
+            else:
+                outgoing.cancel()
+            if receiving in done:
+                if receiving.result()['type'] == 'websocket.disconnect':
+                    return
+                receiving = asyncio.ensure_future(receive())  # Client messages are ignored
+    finally:
+        for task in (receiving, outgoing):
+            if task is not None:
+                task.cancel()
+        publisher.layer.unsubscribe(group, subscription)
+
+
+def _connections():
+    publisher = _publisher
+    return publisher.layer.subscriber_count() if publisher is not None else 0
+
+
+metrics.gauge('devbrain_realtime_connections', _connections, 'Open project WebSocket connections')
@@ -0,0 +1,340 @@
+"""
+Resilience - Deadlines, a circuit breaker and a concurrency limit for model calls.
+
+Every call to the language model goes through one process-wide LLMGuard:
+1. Circuit breaker: after LLM_BREAKER_FAILURE_THRESHOLD consecutive failures
+   (errors, timeouts, or calls slower than LLM_BREAKER_SLOW_CALL) it opens and
+   rejects calls at once for LLM_BREAKER_RESET_TIMEOUT seconds. Then a single
+   trial call is let through (half-open): success closes it, failure reopens it.
+2. Concurrency limit: at most LLM_MAX_CONCURRENCY calls in flight; a caller
+   waits up to LLM_QUEUE_TIMEOUT seconds for a slot, then is turned away.
+3. Deadline: a call that takes longer than LLM_CALL_TIMEOUT is abandoned
+   (a stream: its first piece, or any gap between pieces; LLM_STREAM_TIMEOUT
+   bounds the whole stream). An abandoned call keeps its slot until it
+   really ends, so a hung upstream cannot pile up unbounded threads.
+
+Rejections raise UpstreamUnavailable subclasses; the AI service answers with
+its mock fallback instead. Breaker state and counters are published through
+api.metrics (GET /api/metrics/).
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from django.conf import settings
+from .metrics import metrics
+
+_END = object()
+QUEUE_POLL_INTERVAL = 0.01  # Seconds between slot checks of an async waiter
+
+metrics.counter('devbrain_llm_calls_total', 'Model calls started')
+metrics.counter('devbrain_llm_failures_total', 'Model calls that raised, timed out or were too slow')
+metrics.counter('devbrain_llm_timeouts_total', 'Model calls abandoned at their deadline')
+metrics.counter('devbrain_llm_slow_calls_total', 'Model calls slower than LLM_BREAKER_SLOW_CALL')
+metrics.counter('devbrain_llm_short_circuited_total', 'Model calls rejected because the breaker was open')
+metrics.counter('devbrain_llm_queue_rejections_total', 'Model calls rejected after waiting LLM_QUEUE_TIMEOUT for a slot')
+metrics.counter('devbrain_llm_breaker_opens_total', 'Times the circuit breaker opened')
+
+
+class UpstreamUnavailable(Exception):
+    """The model call was not made or not finished; use the fallback."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class Overloaded(UpstreamUnavailable):
+    pass
+
+
+class CallTimeout(UpstreamUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a cool-down and a single half-open trial."""
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, slow_call: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a call go out now? In half-open state only one trial at a time."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self, duration: float):
+        if self.slow_call and duration >= self.slow_call:
+            metrics.increment('devbrain_llm_slow_calls_total')
+            self.record_failure()
+            return
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        metrics.increment('devbrain_llm_failures_total')
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.increment('devbrain_llm_breaker_opens_total')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def release(self):
+        """An allowed call never went out (e.g. no slot); free the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def current_state(self) -> str:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN  # The next call will be the trial
+            return self.state
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore that sync and async callers can wait on with a timeout."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        with self._condition:
+            self.waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self.in_flight < self.limit, timeout):
+                    return False
+                self.in_flight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    async def aacquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+        try:
+            while not self.try_acquire():
+                if time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(QUEUE_POLL_INTERVAL)
+            return True
+        finally:
+            with self._condition:
+                self.waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+class _Slot:
+    """One acquired limiter slot; released once, possibly when an abandoned call ends."""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self._limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+        self.deferred = False
+
+    def release(self, *args):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter.release()
+
+    def release_when_done(self, future):
+        self.deferred = True
+        future.add_done_callback(self.release)
+
+
+class LLMGuard:
+    """Breaker + limiter + deadlines around model calls (see module docstring)."""
+
+    def __init__(self, call_timeout: float, stream_timeout: float, max_concurrency: int,
+                 queue_timeout: float, failure_threshold: int, reset_timeout: float, slow_call: float):
+        self.call_timeout = call_timeout
+        self.stream_timeout = stream_timeout
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, slow_call)
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm-call')
+
+    def call(self, func, *args, **kwargs):
+        """Run a blocking model call within the deadline; returns its result."""
+        slot = self._admit(self.limiter.acquire(self.queue_timeout) if self.breaker.allow() else None)
+        started = time.monotonic()
+        try:
+            result = self._within(slot, self.call_timeout, func, *args, **kwargs)
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not slot.deferred:
+                slot.release()
+        self.breaker.record_success(time.monotonic() - started)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """Await a model call within the deadline (async functions run on the event loop)."""
+        acquired = await self.limiter.aacquire(self.queue_timeout) if self.breaker.allow() else None
+        slot = self._admit(acquired)
+        started = time.monotonic()
+        try:
+            if asyncio.iscoroutinefunction(func):
+                try:
+                    result = await asyncio.wait_for(func(*args, **kwargs), self.call_timeout)
+                except asyncio.TimeoutError:
+                    metrics.increment('devbrain_llm_timeouts_total')
+                    raise CallTimeout(f"Model call exceeded {self.call_timeout}s") from None
+            else:
+                future = self._executor.submit(func, *args, **kwargs)
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), self.call_timeout)
+                except asyncio.TimeoutError:
+                    slot.release_when_done(future)
+                    metrics.increment('devbrain_llm_timeouts_total')
+                    raise CallTimeout(f"Model call exceeded {self.call_timeout}s") from None
+        except asyncio.CancelledError:
+            self.breaker.release()  # Client went away; says nothing about the upstream
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not slot.deferred:
+                slot.release()
+        self.breaker.record_success(time.monotonic() - started)
+        return result
+
+    def stream(self, open_stream):
+        """
+        Yield the pieces of open_stream() (a blocking iterator), each within
+        the call deadline and all within LLM_STREAM_TIMEOUT. Slowness is
+        judged on the time to the first piece.
+        """
+        slot = self._admit(self.limiter.acquire(self.queue_timeout) if self.breaker.allow() else None)
+        started = time.monotonic()
+        outcome_recorded = False
+        try:
+            iterator = self._within(slot, self.call_timeout, lambda: iter(open_stream()))
+            first_piece_at = None
+            while True:
+                remaining = self.stream_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    metrics.increment('devbrain_llm_timeouts_total')
+                    raise CallTimeout(f"Model stream exceeded {self.stream_timeout}s")
+                piece = self._within(slot, min(self.call_timeout, remaining), next, iterator, _END)
+                if piece is _END:
+                    break
+                if first_piece_at is None:
+                    first_piece_at = time.monotonic()
+                yield piece
+        except GeneratorExit:
+            raise  # Consumer stopped reading; says nothing about the upstream
+        except BaseException:
+            outcome_recorded = True
+            self.breaker.record_failure()
+            raise
+        else:
+            outcome_recorded = True
+            self.breaker.record_success((first_piece_at or time.monotonic()) - started)
+        finally:
+            if not outcome_recorded:
+                self.breaker.release()
+            if not slot.deferred:
+                slot.release()
+
+    def _admit(self, acquired):
+        """Turn the breaker/limiter verdict (None = breaker open) into a slot or an error."""
+        if acquired is None:
+            metrics.increment('devbrain_llm_short_circuited_total')
+            raise CircuitOpen("Model circuit breaker is open")
+        if not acquired:
+            self.breaker.release()
+            metrics.increment('devbrain_llm_queue_rejections_total')
+            raise Overloaded(f"No model call slot free within {self.queue_timeout}s")
+        metrics.increment('devbrain_llm_calls_total')
+        return _Slot(self.limiter)
+
+    def _within(self, slot: _Slot, timeout: float, func, *args, **kwargs):
+        """Run func on the call pool, giving up after timeout (the slot stays held until it ends)."""
+        future = self._executor.submit(func, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            slot.release_when_done(future)
+            metrics.increment('devbrain_llm_timeouts_total')
+            raise CallTimeout(f"Model call exceeded {timeout:.1f}s") from None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_guard = None
+_guard_config = None
+_guard_lock = threading.Lock()
+
+
+def get_llm_guard() -> LLMGuard:
+    """Return the process-wide LLMGuard (rebuilt if its settings change)."""
+    global _guard, _guard_config
+    config = (
+        settings.LLM_CALL_TIMEOUT, settings.LLM_STREAM_TIMEOUT, settings.LLM_MAX_CONCURRENCY,
+        settings.LLM_QUEUE_TIMEOUT, settings.LLM_BREAKER_FAILURE_THRESHOLD,
+        settings.LLM_BREAKER_RESET_TIMEOUT, settings.LLM_BREAKER_SLOW_CALL,
+    )
+    with _guard_lock:
+        if _guard is None or _guard_config != config:
+            if _guard is not None:
+                _guard.shutdown()
+            _guard = LLMGuard(*config)
+            _guard_config = config
+        return _guard
+
+
+def _breaker_state():
+    return CircuitBreaker.STATE_VALUES[_guard.breaker.current_state()] if _guard is not None else 0
+
+
+metrics.gauge('devbrain_llm_breaker_state', _breaker_state, 'Model circuit breaker: 0 closed, 1 half-open, 2 open')
+metrics.gauge('devbrain_llm_in_flight', lambda: _guard.limiter.in_flight if _guard is not None else 0,
+              'Model calls holding a concurrency slot')
+metrics.gauge('devbrain_llm_queued', lambda: _guard.limiter.waiting if _guard is not None else 0,
+              'Model calls waiting for a concurrency slot')
@@ -0,0 +1,201 @@
+"""
+Status Rollups - Stored node counts per status, per project and per subtree.
+
+Project.node_count / not_started_count / in_progress_count / completed_count
+and Node.subtree_count / subtree_not_started / subtree_in_progress /
+subtree_completed (the node itself included) are kept up to date as nodes
+are created, change status, move and are deleted, so project lists and
+progress bars read a row instead of counting the tree.
+
+Increments go through the closure table (one UPDATE for all ancestors of a
+node) inside the writing transaction. NodeHierarchy.insert_many, move and
+delete_subtree apply them for structural changes; status changes are applied
+by Node.save and by NodeBatch. New nodes get their subtree counts in memory
+(fill) before they are inserted. `rebuild_node_hierarchy` recomputes
+everything from scratch.
+"""
+
+from django.db.models import Count, F
+from .models import Project, Node, NodeClosure
+
+STATUSES = [value for value, _ in Node.STATUS_CHOICES]
+SUBTREE_FIELDS = {
+    'not-started': 'subtree_not_started',
+    'in-progress': 'subtree_in_progress',
+    'completed': 'subtree_completed',
+}
+PROJECT_FIELDS = {
+    'not-started': 'not_started_count',
+    'in-progress': 'in_progress_count',
+    'completed': 'completed_count',
+}
+ROLLUP_BATCH_SIZE = 500
+
+
+def subtree_counts(node) -> dict:
+    """{status: count} for a node's subtree, from its (in-memory) rollup fields."""
+    return {status: getattr(node, field) for status, field in SUBTREE_FIELDS.items()}
+
+
+def project_counts(project) -> dict:
+    """{status: count} for a whole project, from its rollup fields."""
+    return {status: getattr(project, field) for status, field in PROJECT_FIELDS.items()}
+
+
+def progress(counts: dict) -> dict:
+    """API form of {status: count}: the counts plus their total."""
+    return {'total': sum(counts.values()), **counts}
+
+
+class StatusRollup:
+    """Incremental and full maintenance of the stored status counts."""
+
+    @staticmethod
+    def fill(nodes) -> list:
+        """
+        Set the subtree counts of new nodes (parents before children) from
+        the list itself: a new node has no other descendants. Returns the
+        nodes whose values changed.
+        """
+        counts = {str(node.pk): {status: 0 for status in STATUSES} for node in nodes}
+        for node in reversed(nodes):
+            own = counts[str(node.pk)]
+            if node.status in own:
+                own[node.status] += 1
+            parent = counts.get(str(node.parent_id)) if node.parent_id else None
+            if parent is not None:
+                for status, count in own.items():
+                    parent[status] += count
+
+        changed = []
+        for node in nodes:
+            own = counts[str(node.pk)]
+            if subtree_counts(node) != own or node.subtree_count != sum(own.values()):
+                for status, field in SUBTREE_FIELDS.items():
+                    setattr(node, field, own[status])
+                node.subtree_count = sum(own.values())
+                changed.append(node)
+        return changed
+
+    @staticmethod
+    def adjust(node_id, counts: dict, include_self: bool = True):
+        """Add {status: delta} to the subtree counts of a node's ancestors (and the node)."""
+        counts = {status: delta for status, delta in counts.items() if delta}
+        if not counts:
+            return
+        links = NodeClosure.objects.filter(descendant_id=node_id)
+        if not include_self:
+            links = links.filter(depth__gt=0)
+        updates = {SUBTREE_FIELDS[status]: F(SUBTREE_FIELDS[status]) + delta for status, delta in counts.items()}
+        total = sum(counts.values())
+        if total:
+            updates['subtree_count'] = F('subtree_count') + total
+        Node.objects.filter(id__in=links.values('ancestor_id')).update(**updates)
+
+    @staticmethod
+    def adjust_project(project_id, counts: dict):
+        """Add {status: delta} to a project's node counts."""
+        counts = {status: delta for status, delta in counts.items() if delta}
+        if not counts:
+            return
+        updates = {PROJECT_FIELDS[status]: F(PROJECT_FIELDS[status]) + delta for status, delta in counts.items()}
+        total = sum(counts.values())
+        if total:
+            updates['node_count'] = F('node_count') + total
+        Project.objects.filter(pk=project_id).update(**updates)
+
+    @staticmethod
+    def status_changed(node, previous_status):
+        """Move one count from the previous status to the node's current one."""
+        StatusRollup.statuses_changed([(node, previous_status)])
+
+    @staticmethod
+    def statuses_changed(changes):
+        """status_changed() for (node, previous_status) pairs, one project update each."""
+        by_project = {}
+        for node, previous_status in changes:
+            if previous_status == node.status:
+                continue
+            counts = {status: 0 for status in STATUSES}
+            if previous_status in counts:
+                counts[previous_status] -= 1
+            if node.status in counts:
+                counts[node.status] += 1
+            StatusRollup.adjust(node.pk, counts)
+            # Keep the instance's own counts in step with the row
+            for status, delta in counts.items():
+                setattr(node, SUBTREE_FIELDS[status], getattr(node, SUBTREE_FIELDS[status]) + delta)
+            project = by_project.setdefault(node.project_id, {status: 0 for status in STATUSES})
+            for status, delta in counts.items():
+                project[status] += delta
+        for project_id, counts in by_project.items():
+            StatusRollup.adjust_project(project_id, counts)
+
+    @staticmethod
+    def inserted(nodes):
+        """
+        Apply newly inserted nodes (parents before children): write any
+        subtree counts fill() had to correct, then add each new top-level
+        subtree to the ancestors it was attached under and every node to
+        its project.
+        """
+        changed = StatusRollup.fill(nodes)
+        if changed:
+            Node.objects.bulk_update(
+                changed, ['subtree_count', *SUBTREE_FIELDS.values()], batch_size=ROLLUP_BATCH_SIZE
+            )
+
+        new_ids = {str(node.pk) for node in nodes}
+        by_parent, by_project = {}, {}
+        for node in nodes:
+            if node.parent_id and str(node.parent_id) not in new_ids:
+                parent = by_parent.setdefault(node.parent_id, {status: 0 for status in STATUSES})
+                for status, count in subtree_counts(node).items():
+                    parent[status] += count
+            project = by_project.setdefault(node.project_id, {status: 0 for status in STATUSES})
+            if node.status in project:
+                project[node.status] += 1
+        for parent_id, counts in by_parent.items():
+            StatusRollup.adjust(parent_id, counts)
+        for project_id, counts in by_project.items():
+            StatusRollup.adjust_project(project_id, counts)
+
+    @staticmethod
+    def removed(node_id, project_id):
+        """Take a subtree about to be deleted off its ancestors and project."""
+        counts = {status: -count for status, count in StatusRollup.stored_counts(node_id).items()}
+        StatusRollup.adjust(node_id, counts, include_self=False)
+        StatusRollup.adjust_project(project_id, counts)
+
+    @staticmethod
+    def stored_counts(node_id) -> dict:
+        """{status: count} of a node's subtree as currently stored."""
+        values = Node.objects.filter(pk=node_id).values(*SUBTREE_FIELDS.values()).first() or {}
+        return {status: values.get(field, 0) for status, field in SUBTREE_FIELDS.items()}
+
+    @staticmethod
+    def rebuild(project_id) -> int:
+        """Recompute a project's rollups from the closure table; returns nodes written."""
+        counts = {}
+        for ancestor_id, status, count in NodeClosure.objects.filter(
+            ancestor__project_id=project_id
+        ).values_list('ancestor_id', 'descendant__status').annotate(count=Count('id')).order_by():
+            counts.setdefault(ancestor_id, {})[status] = count
+
+        nodes = []
+        for node in Node.objects.filter(project_id=project_id).only('id'):
+            own = counts.get(node.pk, {})
+            for status, field in SUBTREE_FIELDS.items():
+                setattr(node, field, own.get(status, 0))
+            node.subtree_count = sum(own.values())
+            nodes.append(node)
+        Node.objects.bulk_update(
+            nodes, ['subtree_count', *SUBTREE_FIELDS.values()], batch_size=ROLLUP_BATCH_SIZE
+        )
+
+        totals = dict(Node.objects.filter(project_id=project_id).values_list('status').annotate(count=Count('id')).order_by())
+        Project.objects.filter(pk=project_id).update(
+            node_count=sum(totals.values()),
+            **{field: totals.get(status, 0) for status, field in PROJECT_FIELDS.items()},
+        )
+        return len(nodes)
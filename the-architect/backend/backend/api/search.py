@@ -0,0 +1,390 @@
+"""
+Node Search - Fuzzy quick-jump search over node labels and descriptions.
+
+Each project gets an in-process trigram index, built on its first search.
+Words are padded like pg_trgm ("  word "), so a typo still leaves most of a
+word's trigrams in place. The last query word is left open at the end, so
+every keystroke of "wiref" already matches "Wireframes". Postings are
+numpy arrays of node ordinals. Counting shared trigrams for every node of a
+project is one vectorised add per query trigram, however common the
+trigram.
+
+An index remembers the project version it was built at. A search first
+reads the versions of the projects it covers (one query). A stale index
+then applies only the node changes logged since (api/changes.py): changed
+nodes go to a small overlay and their base postings are masked out. The
+overlay is merged into the base once it grows, and deletions are masked
+the same way. Indexes are per process; the least recently searched are
+dropped once they hold more than NODE_SEARCH_MAX_NODES nodes, but never
+those of the projects the current search covers.
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from itertools import chain
+import numpy as np
+from django.conf import settings
+from .metrics import metrics
+from .models import Node, ProjectChange
+
+FIELDS = ('label', 'description')
+WORD_PATTERN = re.compile(r'\w+')
+LOAD_BATCH_SIZE = 2000  # Nodes read per query when building or refreshing
+COMPACT_MIN_ROWS = 1000  # Overlay rows kept before merging into the base
+COMPACT_FRACTION = 0.05  # ... or this fraction of the project's nodes, if larger
+LABEL_CONTAINMENT_WEIGHT = 0.7  # Label score: share of query trigrams found, and
+LABEL_SIMILARITY_WEIGHT = 0.3  # ... similarity to the whole label (favours close matches)
+DESCRIPTION_WEIGHT = 0.6  # Description hits rank below equally good label hits
+PREFIX_BONUS = 0.3  # Label starts with the query as typed
+SUBSTRING_BONUS = 0.15  # Label contains the query as typed
+RERANK_FACTOR = 4  # Candidates per result given the label bonuses
+WORD_CACHE_SIZE = 200000  # Words whose trigram ids are remembered (words repeat across nodes)
+
+metrics.counter('devbrain_node_search_queries_total', 'Quick-jump node searches')
+metrics.counter('devbrain_node_search_builds_total', 'Project search indexes built from scratch')
+metrics.counter('devbrain_node_search_updates_total', 'Nodes re-indexed from the change log')
+
+_vocabulary = {}  # trigram -> id, shared by every index in the process
+_vocabulary_lock = threading.Lock()
+_word_ids = {}  # indexed word -> its trigram ids
+
+
+def trigrams(text: str, open_end: bool = False) -> set:
+    """Padded word trigrams of text; with open_end the last word is treated as a prefix."""
+    words = WORD_PATTERN.findall((text or '').lower())
+    result = set()
+    for index, word in enumerate(words):
+        padded = '  ' + word + ('' if open_end and index == len(words) - 1 else ' ')
+        result.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return result
+
+
+def trigram_ids(grams, add: bool = True) -> list:
+    """Vocabulary ids of trigrams; unknown ones are added, or skipped when add is False."""
+    if not add:
+        return [_vocabulary[gram] for gram in grams if gram in _vocabulary]
+    with _vocabulary_lock:
+        return [_vocabulary.setdefault(gram, len(_vocabulary)) for gram in grams]
+
+
+def text_trigram_ids(text: str) -> list:
+    """
+    trigram_ids(trigrams(text)) built from per-word ids, which are cached
+    because words repeat across nodes. Ids shared by two words repeat.
+    """
+    ids = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        word_ids = _word_ids.get(word)
+        if word_ids is None:
+            if len(_word_ids) >= WORD_CACHE_SIZE:
+                _word_ids.clear()
+            word_ids = _word_ids[word] = trigram_ids(trigrams(word))
+        ids += word_ids
+    return ids
+
+
+class TrigramPostings:
+    """
+    Trigram id -> node ordinals for one field: a base of sorted numpy arrays
+    built in bulk, plus an overlay holding rows changed since.
+    """
+
+    def __init__(self):
+        self.flat_trigrams = np.zeros(0, np.int32)  # Base pairs, sorted by trigram
+        self.flat_ordinals = np.zeros(0, np.int32)
+        self.base = {}  # trigram id -> view into flat_ordinals
+        self.stale = np.zeros(0, bool)  # Ordinals whose base postings are outdated
+        self.has_stale = False
+        self.overlay = {}  # trigram id -> set of ordinals
+        self.overlay_rows = {}  # ordinal -> trigram ids in the overlay
+        self.sizes = np.zeros(0, np.int32)  # Trigrams per ordinal
+
+    def grow(self, count: int):
+        """Make room for ordinals below `count`."""
+        if count > len(self.sizes):
+            capacity = max(count, 2 * len(self.sizes), 1024)
+            self.sizes = np.concatenate([self.sizes, np.zeros(capacity - len(self.sizes), np.int32)])
+            self.stale = np.concatenate([self.stale, np.zeros(capacity - len(self.stale), bool)])
+
+    def build(self, rows):
+        """Replace everything with (ordinal, trigram ids) rows; ids may repeat."""
+        rows = list(rows)
+        self.grow(max((ordinal for ordinal, _ in rows), default=-1) + 1)
+        self.stale[:] = False
+        self.has_stale = False
+        self.overlay, self.overlay_rows = {}, {}
+        lengths = np.fromiter((len(ids) for _, ids in rows), np.int64, len(rows))
+        self._set_base(
+            np.fromiter(chain.from_iterable(ids for _, ids in rows), np.int32, int(lengths.sum())),
+            np.repeat(np.fromiter((ordinal for ordinal, _ in rows), np.int32, len(rows)), lengths),
+        )
+        self.sizes[:] = 0
+        counted = np.bincount(self.flat_ordinals, minlength=len(self.sizes))
+        self.sizes[:len(counted)] = counted
+
+    def _set_base(self, flat_trigrams, flat_ordinals):
+        """Sort (trigram, ordinal) pairs by trigram, dropping duplicates, and index them."""
+        pairs = (flat_trigrams.astype(np.int64) << 32) | flat_ordinals.astype(np.int64)
+        pairs.sort()
+        pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+        self.flat_trigrams = (pairs >> 32).astype(np.int32)
+        self.flat_ordinals = (pairs & 0xFFFFFFFF).astype(np.int32)
+        starts = np.flatnonzero(np.diff(self.flat_trigrams, prepend=-1))
+        ends = np.append(starts[1:], len(self.flat_trigrams))
+        self.base = {
+            int(self.flat_trigrams[start]): self.flat_ordinals[start:end]
+            for start, end in zip(starts, ends)
+        }
+
+    def set(self, ordinal: int, ids):
+        """Replace one ordinal's trigrams (an empty list removes it)."""
+        ids = list(set(ids))
+        self.grow(ordinal + 1)
+        self.stale[ordinal] = self.has_stale = True
+        for tid in self.overlay_rows.pop(ordinal, ()):
+            self.overlay[tid].discard(ordinal)
+        if ids:
+            self.overlay_rows[ordinal] = ids
+            for tid in ids:
+                self.overlay.setdefault(tid, set()).add(ordinal)
+        self.sizes[ordinal] = len(ids)
+
+    def compact(self):
+        """Merge the overlay into the base."""
+        keep = ~self.stale[self.flat_ordinals]
+        overlay_trigrams = [tid for ids in self.overlay_rows.values() for tid in ids]
+        overlay_ordinals = [ordinal for ordinal, ids in self.overlay_rows.items() for _ in ids]
+        self._set_base(
+            np.concatenate([self.flat_trigrams[keep], np.array(overlay_trigrams, np.int32)]),
+            np.concatenate([self.flat_ordinals[keep], np.array(overlay_ordinals, np.int32)]),
+        )
+        self.stale[:] = False
+        self.has_stale = False
+        self.overlay, self.overlay_rows = {}, {}
+
+    def count(self, query_ids, size: int) -> np.ndarray:
+        """Query trigrams shared with each of the first `size` ordinals."""
+        counts = np.zeros(size, np.int16)
+        for tid in query_ids:
+            ordinals = self.base.get(tid)
+            if ordinals is not None:
+                counts[ordinals] += 1
+        if self.has_stale:
+            counts[self.stale[:size]] = 0
+            for tid in query_ids:
+                ordinals = self.overlay.get(tid)
+                if ordinals:
+                    counts[np.fromiter(ordinals, np.int32, len(ordinals))] += 1
+        return counts
+
+
+class ProjectSearchIndex:
+    """Trigram postings over one project's node labels and descriptions."""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.version = None  # Project version the index reflects
+        self.lock = threading.Lock()
+        self.ids = []  # ordinal -> node id (None once deleted)
+        self.ordinals = {}  # node id -> ordinal
+        self.labels = []  # ordinal -> label, for the typed-query bonuses
+        self.fingerprints = []  # ordinal -> hash of the indexed text
+        self.fields = {field: TrigramPostings() for field in FIELDS}
+
+    @staticmethod
+    def _texts(label, description):
+        return label or '', (description or '')[:settings.NODE_SEARCH_DESCRIPTION_CHARS]
+
+    def refresh(self, version: int):
+        """Bring the index up to `version` (a project version read before calling)."""
+        with self.lock:
+            if self.version == version:
+                return
+            if self.version is None or version < self.version:
+                self._build(version)
+                return
+            changes = list(ProjectChange.objects.filter(
+                project_id=self.project_id, kind='node',
+                version__gt=self.version, version__lte=version,
+            ).values_list('object_id', 'deleted'))
+            if len(changes) > max(len(self.ordinals) // 2, COMPACT_MIN_ROWS):
+                self._build(version)
+                return
+            for node_id, deleted in changes:
+                if deleted:
+                    self._remove(node_id)
+            changed = [node_id for node_id, deleted in changes if not deleted]
+            for start in range(0, len(changed), LOAD_BATCH_SIZE):
+                for node_id, label, description in Node.objects.filter(
+                    project_id=self.project_id, id__in=changed[start:start + LOAD_BATCH_SIZE]
+                ).values_list('id', 'label', 'description'):
+                    self._update(str(node_id), label, description)
+            metrics.increment('devbrain_node_search_updates_total', len(changes))
+            threshold = max(COMPACT_MIN_ROWS, int(len(self.ordinals) * COMPACT_FRACTION))
+            for postings in self.fields.values():
+                if len(postings.overlay_rows) > threshold:
+                    postings.compact()
+            self.version = version
+
+    def _build(self, version):
+        self.ids, self.ordinals, self.labels, self.fingerprints = [], {}, [], []
+        rows = {field: [] for field in FIELDS}
+        nodes = Node.objects.filter(project_id=self.project_id).order_by().values_list(
+            'id', 'label', 'description'
+        )
+        for node_id, label, description in nodes.iterator(chunk_size=LOAD_BATCH_SIZE):
+            texts = self._texts(label, description)
+            ordinal = len(self.ids)
+            self.ids.append(str(node_id))
+            self.ordinals[str(node_id)] = ordinal
+            self.labels.append(texts[0])
+            self.fingerprints.append(hash(texts))
+            for field, text in zip(FIELDS, texts):
+                rows[field].append((ordinal, text_trigram_ids(text)))
+        for field in FIELDS:
+            self.fields[field].build(rows[field])
+        self.version = version
+        metrics.increment('devbrain_node_search_builds_total')
+
+    def _update(self, node_id, label, description):
+        texts = self._texts(label, description)
+        ordinal = self.ordinals.get(node_id)
+        if ordinal is None:
+            ordinal = len(self.ids)
+            self.ids.append(node_id)
+            self.ordinals[node_id] = ordinal
+            self.labels.append(None)
+            self.fingerprints.append(None)
+        elif self.fingerprints[ordinal] == hash(texts):
+            return  # Moved or restyled, not renamed
+        self.labels[ordinal] = texts[0]
+        self.fingerprints[ordinal] = hash(texts)
+        for field, text in zip(FIELDS, texts):
+            self.fields[field].set(ordinal, text_trigram_ids(text))
+
+    def _remove(self, node_id):
+        ordinal = self.ordinals.pop(node_id, None)
+        if ordinal is not None:
+            self.ids[ordinal] = None
+            self.labels[ordinal] = None
+            self.fingerprints[ordinal] = None
+            for postings in self.fields.values():
+                postings.set(ordinal, [])
+
+    def search(self, query: str, query_grams: set, limit: int) -> list:
+        """[(score, node id, field)] of the best matches, best first."""
+        with self.lock:
+            size = len(self.ids)
+            if not size or not query_grams:
+                return []
+            total = len(query_grams)
+            query_ids = trigram_ids(query_grams, add=False)
+            label = self.fields['label']
+            shared = label.count(query_ids, size)
+            described = self.fields['description'].count(query_ids, size)
+
+            needed = max(1, math.ceil(total * settings.NODE_SEARCH_MIN_MATCH))
+            candidates = np.flatnonzero((shared >= needed) | (described >= needed))
+            if not len(candidates):
+                return []
+            shared, described = shared[candidates].astype(np.float32), described[candidates].astype(np.float32)
+            label_scores = (
+                LABEL_CONTAINMENT_WEIGHT * shared / total
+                + LABEL_SIMILARITY_WEIGHT * shared / (total + label.sizes[candidates] - shared)
+            )
+            description_scores = DESCRIPTION_WEIGHT * described / total
+            scores = np.maximum(label_scores, description_scores)
+            depth = limit * RERANK_FACTOR
+            if len(candidates) > depth:
+                top = np.argpartition(-scores, depth)[:depth]
+                candidates, scores = candidates[top], scores[top]
+                label_scores, description_scores = label_scores[top], description_scores[top]
+
+            typed = query.strip().lower()
+            results = []
+            for ordinal, score, label_score, description_score in zip(
+                candidates.tolist(), scores.tolist(), label_scores.tolist(), description_scores.tolist()
+            ):
+                text = self.labels[ordinal].lower()
+                if text.startswith(typed):
+                    score += PREFIX_BONUS
+                elif typed in text:
+                    score += SUBSTRING_BONUS
+                field = 'label' if label_score >= description_score else 'description'
+                results.append((round(score, 4), self.ids[ordinal], field))
+        results.sort(key=lambda result: -result[0])
+        return results[:limit]
+
+
+class NodeSearch:
+    """
+    Process-wide LRU of project indexes, bounded by the nodes they hold
+    (about 1.7 KB each) rather than by project count: one search covers
+    all of a user's projects, so their indexes are never evicted by it.
+    """
+
+    def __init__(self, max_nodes: int):
+        self.max_nodes = max_nodes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index(self, project_id) -> ProjectSearchIndex:
+        key = str(project_id)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = ProjectSearchIndex(project_id)
+            self._indexes.move_to_end(key)
+            return index
+
+    def evict(self, keep=()):
+        """Drop least recently searched indexes until under max_nodes, sparing the `keep` keys."""
+        with self._lock:
+            total = sum(len(index.ordinals) for index in self._indexes.values())
+            for key in list(self._indexes):
+                if total <= self.max_nodes:
+                    break
+                if key not in keep:
+                    total -= len(self._indexes.pop(key).ordinals)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._indexes)
+
+    def search(self, projects, query: str, limit: int) -> list:
+        """
+        Search (project id, version) pairs; returns [(score, project id,
+        node id, field)], best first.
+        """
+        metrics.increment('devbrain_node_search_queries_total')
+        query_grams = trigrams(query, open_end=True)
+        results = []
+        for project_id, version in projects:
+            index = self.index(project_id)
+            index.refresh(version)
+            results.extend(
+                (score, project_id, node_id, field)
+                for score, node_id, field in index.search(query, query_grams, limit)
+            )
+        self.evict(keep={str(project_id) for project_id, _ in projects})
+        results.sort(key=lambda result: -result[0])
+        return results[:limit]
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+def get_node_search() -> NodeSearch:
+    """Return the process-wide node search."""
+    global _search
+    with _search_lock:
+        if _search is None or _search.max_nodes != settings.NODE_SEARCH_MAX_NODES:
+            _search = NodeSearch(settings.NODE_SEARCH_MAX_NODES)
+        return _search
+
+
+metrics.gauge('devbrain_node_search_indexes', lambda: _search.size() if _search else 0,
+              'Project search indexes held in this process')
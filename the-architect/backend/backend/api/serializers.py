@@ -3,7 +3,9 @@ DRF Serializers for DevBrain API.
 """
 
 from rest_framework import serializers
-from .models import Project, Node, Edge, KnowledgeBase, ChatMessage
+from .models import Project, Node, Edge, KnowledgeBase, KnowledgeChunk, ChatMessage
+from .hierarchy import NodeHierarchy
+from .rollups import subtree_counts, project_counts, progress
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -16,18 +18,33 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 class NodeSerializer(serializers.ModelSerializer):
     position = serializers.SerializerMethodField()
     parentId = serializers.CharField(source='parent.id', read_only=True, allow_null=True)
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Node.objects.all(), write_only=True, required=False, allow_null=True
+    )
     children = serializers.SerializerMethodField()
-    chat_messages = ChatMessageSerializer(many=True, read_only=True, source='chat_messages')
+    chat_messages = ChatMessageSerializer(many=True, read_only=True)
+    progress = serializers.SerializerMethodField()
 
     class Meta:
         model = Node
         fields = [
             'id', 'label', 'description', 'status', 'owner',
-            'parentId', 'position', 'created_at', 'updated_at',
-            'children', 'chat_messages'
+            'parentId', 'parent', 'position', 'created_at', 'updated_at',
+            'children', 'chat_messages', 'progress'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_parent(self, parent):
+        if parent is None:
+            return parent
+        # On create the project comes with the request data (see NodeViewSet.perform_create)
+        project_id = self.instance.project_id if self.instance is not None else self.initial_data.get('project')
+        if str(parent.project_id) != str(project_id):
+            raise serializers.ValidationError("The parent must be a node in the same project.")
+        if self.instance is not None and NodeHierarchy.is_descendant(parent, self.instance):
+            raise serializers.ValidationError("A node cannot be moved under itself or its descendants.")
+        return parent
+
     def get_position(self, obj):
         return {'x': obj.position_x, 'y': obj.position_y}
 
@@ -35,6 +52,10 @@ class NodeSerializer(serializers.ModelSerializer):
         children = obj.get_children()
         return NodeSerializer(children, many=True).data
 
+    def get_progress(self, obj):
+        """Status counts of the node's subtree, the node included."""
+        return progress(subtree_counts(obj))
+
 
 class EdgeSerializer(serializers.ModelSerializer):
     source_label = serializers.CharField(source='source.label', read_only=True)
@@ -49,8 +70,36 @@ class EdgeSerializer(serializers.ModelSerializer):
 class KnowledgeBaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = KnowledgeBase
-        fields = ['id', 'title', 'file_type', 'content_preview', 'created_at', 'file']
-        read_only_fields = ['id', 'created_at', 'content_preview']
+        fields = [
+            'id', 'title', 'file_type', 'content_preview', 'created_at', 'file',
+            'ingestion_status', 'ingestion_progress', 'ingestion_error'
+        ]
+        read_only_fields = [
+            'id', 'created_at', 'content_preview',
+            'ingestion_status', 'ingestion_progress', 'ingestion_error'
+        ]
+
+
+class IngestionStatusSerializer(serializers.ModelSerializer):
+    """Progress of a knowledge file through background ingestion."""
+    class Meta:
+        model = KnowledgeBase
+        fields = ['id', 'ingestion_status', 'ingestion_progress', 'ingestion_error']
+        read_only_fields = fields
+
+
+class KnowledgeChunkSerializer(serializers.ModelSerializer):
+    """Retrieved passage with its source file and relevance score."""
+    knowledge_base = serializers.CharField(source='knowledge_base.id', read_only=True)
+    title = serializers.CharField(source='knowledge_base.title', read_only=True)
+    score = serializers.FloatField(read_only=True, default=None)
+
+    class Meta:
+        model = KnowledgeChunk
+        fields = [
+            'id', 'knowledge_base', 'title', 'page_number',
+            'start_offset', 'end_offset', 'text', 'score'
+        ]
 
 
 class ProjectDetailSerializer(serializers.ModelSerializer):
@@ -58,26 +107,117 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
     nodes = NodeSerializer(many=True, read_only=True)
     edges = EdgeSerializer(many=True, read_only=True)
     knowledge_bases = KnowledgeBaseSerializer(many=True, read_only=True)
+    progress = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
         fields = [
-            'id', 'name', 'description', 'owner',
+            'id', 'name', 'description', 'owner', 'version', 'progress',
             'created_at', 'updated_at', 'nodes', 'edges', 'knowledge_bases'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'owner']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'owner', 'version']
+
+    def get_progress(self, obj):
+        return progress(project_counts(obj))
+
+
+class NodeSnapshotSerializer(serializers.ModelSerializer):
+    """Flat node for project snapshots: no nested children, parent by id."""
+    position = serializers.SerializerMethodField()
+    parentId = serializers.CharField(source='parent_id', read_only=True, allow_null=True)
+
+    class Meta:
+        model = Node
+        fields = [
+            'id', 'label', 'description', 'status', 'owner',
+            'parentId', 'position', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def get_position(self, obj):
+        return {'x': obj.position_x, 'y': obj.position_y}
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        chat_by_node = self.context.get('chat_by_node')
+        if chat_by_node is not None:
+            data['chat_messages'] = chat_by_node.get(obj.id, [])
+        return data
+
+
+class NodeHierarchySerializer(NodeSnapshotSerializer):
+    """Flat node in a descendants/ancestors listing, with its distance from the queried node."""
+    depth = serializers.IntegerField(source='relative_depth', read_only=True)
+
+    class Meta(NodeSnapshotSerializer.Meta):
+        fields = NodeSnapshotSerializer.Meta.fields + ['depth']
+        read_only_fields = fields
+
+
+class EdgeSnapshotSerializer(serializers.ModelSerializer):
+    """Edge as an id pair."""
+    source = serializers.CharField(source='source_id', read_only=True)
+    target = serializers.CharField(source='target_id', read_only=True)
+
+    class Meta:
+        model = Edge
+        fields = ['id', 'source', 'target']
+        read_only_fields = fields
+
+
+class ProjectSnapshotSerializer(serializers.ModelSerializer):
+    """
+    Whole project in a fixed number of queries: every node once with its
+    parentId, edges as id pairs. Chat history is included only when the
+    'include_chat' context flag is set (one extra query). `version` is the
+    project's change version to pass as ?since= to the changes endpoint.
+    """
+    nodes = serializers.SerializerMethodField()
+    edges = serializers.SerializerMethodField()
+    knowledge_bases = serializers.SerializerMethodField()
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Project
+        fields = [
+            'id', 'name', 'description', 'owner', 'version', 'progress',
+            'created_at', 'updated_at', 'nodes', 'edges', 'knowledge_bases'
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return progress(project_counts(obj))
+
+    def get_nodes(self, obj):
+        context = {}
+        if self.context.get('include_chat'):
+            chat_by_node = {}
+            messages = ChatMessage.objects.filter(node__project=obj).order_by('created_at')
+            for message in messages:
+                chat_by_node.setdefault(message.node_id, []).append(
+                    ChatMessageSerializer(message).data
+                )
+            context['chat_by_node'] = chat_by_node
+        return NodeSnapshotSerializer(obj.nodes.all(), many=True, context=context).data
+
+    def get_edges(self, obj):
+        return EdgeSnapshotSerializer(obj.edges.all(), many=True).data
+
+    def get_knowledge_bases(self, obj):
+        knowledge_bases = obj.knowledge_bases.defer('full_text')
+        return KnowledgeBaseSerializer(knowledge_bases, many=True, context=self.context).data
 
 
 class ProjectListSerializer(serializers.ModelSerializer):
-    """Lightweight project listing."""
-    node_count = serializers.SerializerMethodField()
+    """Lightweight project listing: one row per project, counts included (api/rollups.py)."""
+    progress = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
-        fields = ['id', 'name', 'description', 'created_at', 'node_count']
+        fields = ['id', 'name', 'description', 'version', 'created_at', 'node_count', 'progress']
 
-    def get_node_count(self, obj):
-        return obj.nodes.count()
+    def get_progress(self, obj):
+        return progress(project_counts(obj))
 
 
 class CreateNodeSerializer(serializers.ModelSerializer):
@@ -93,20 +233,19 @@ class CreateNodeSerializer(serializers.ModelSerializer):
         position = validated_data.pop('position', {'x': 0, 'y': 0})
         parent_id = validated_data.pop('parent_id', None)
         
+        # Created under its parent in one insert; a new node has no edges yet
         node = Node.objects.create(
             position_x=position.get('x', 0),
             position_y=position.get('y', 0),
+            parent_id=parent_id or None,
             **validated_data
         )
         
         if parent_id:
-            parent = Node.objects.get(id=parent_id)
-            node.parent = parent
-            node.save()
             # Auto-create edge
-            Edge.objects.get_or_create(
+            Edge.objects.create(
                 project=node.project,
-                source=parent,
+                source_id=parent_id,
                 target=node
             )
         
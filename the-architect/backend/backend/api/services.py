@@ -3,9 +3,18 @@ AI Service - Handles Gemini API integration and knowledge retrieval.
 """
 
 import os
-from django.conf import settings
-from .models import Node, KnowledgeBase, ChatMessage
 import re
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .models import Node, KnowledgeBase, KnowledgeChunk, ChatMessage
+from .indexing import KnowledgeIndex
+from .cache import get_response_cache
+from .resilience import get_llm_guard
+from .memory import ConversationMemory
+from .realtime import publish, publish_now, chat_event
 
 try:
     import google.generativeai as genai
@@ -25,43 +34,73 @@ class KnowledgeSearchService:
         Strategy:
         1. Search by node label/description keywords
         2. Search by user query if provided
-        3. Return top_k most relevant results
+        3. Rank files by their best passage (BM25 and/or vector similarity)
+        4. Return top_k most relevant results
         """
-        if not node.project:
+        if not node.project_id:
             return []
 
-        knowledge_bases = node.project.knowledge_bases.all()
-        if not knowledge_bases.exists():
+        search_text = query or f"{node.label} {node.description}"
+        ranked = KnowledgeIndex.search_documents(node.project_id, search_text, top_k=top_k)
+        return KnowledgeSearchService.load_ranked(ranked)
+
+    @staticmethod
+    def search_relevant_passages(node: Node, query: str = None, top_k: int = None):
+        """
+        Find the passages most relevant to the given node across all of the
+        project's knowledge files. Each passage carries its ranking `score`.
+        """
+        if not node.project_id:
             return []
 
-        search_text = query or f"{node.label} {node.description}".lower()
-        keywords = re.findall(r'\w+', search_text.lower())
+        top_k = top_k or settings.KNOWLEDGE_CONTEXT_PASSAGES
+        search_text = query or f"{node.label} {node.description}"
+        ranked = KnowledgeIndex.search_hybrid(node.project_id, search_text, top_k=top_k)
+
+        by_id = KnowledgeChunk.objects.in_bulk([chunk_id for chunk_id, _ in ranked])
 
-        scored_bases = []
-        for kb in knowledge_bases:
-            # Simple keyword matching score
-            score = 0
-            full_text = (kb.full_text or kb.content_preview or "").lower()
-            for keyword in keywords:
-                score += full_text.count(keyword)
-            
-            if score > 0:
-                scored_bases.append((kb, score))
+        # Passages belong to shared blobs; label each with this project's file
+        blob_owners = KnowledgeIndex.project_blobs(node.project_id)
+        knowledge_bases = KnowledgeBase.objects.defer('full_text').in_bulk(
+            [blob_owners[chunk.blob_id] for chunk in by_id.values() if chunk.blob_id in blob_owners]
+        )
 
-        # Sort by score descending and return top K
-        scored_bases.sort(key=lambda x: x[1], reverse=True)
-        return [kb for kb, _ in scored_bases[:top_k]]
+        passages = []
+        for chunk_id, score in ranked:
+            chunk = by_id.get(chunk_id)
+            if chunk is None or chunk.blob_id not in blob_owners:
+                continue
+            chunk.knowledge_base = knowledge_bases[blob_owners[chunk.blob_id]]
+            chunk.score = score
+            passages.append(chunk)
+        return passages
 
     @staticmethod
-    def format_knowledge_context(knowledge_bases: list) -> str:
-        """Format knowledge base content into a contextual prompt."""
-        if not knowledge_bases:
+    def load_ranked(ranked: list) -> list:
+        """Fetch ranked knowledge bases in score order, skipping full text."""
+        by_id = KnowledgeBase.objects.defer('full_text').in_bulk(
+            [kb_id for kb_id, _ in ranked]
+        )
+        return [by_id[kb_id] for kb_id, _ in ranked if kb_id in by_id]
+
+    @staticmethod
+    def sources_of(passages: list) -> list:
+        """Distinct knowledge bases behind a list of passages, in rank order."""
+        sources = {}
+        for passage in passages:
+            sources.setdefault(passage.knowledge_base.id, passage.knowledge_base)
+        return list(sources.values())
+
+    @staticmethod
+    def format_knowledge_context(passages: list) -> str:
+        """Format retrieved passages into a contextual prompt."""
+        if not passages:
             return ""
 
         context = "## Relevant Knowledge Base:\n\n"
-        for kb in knowledge_bases:
-            preview = kb.content_preview or kb.full_text[:300]
-            context += f"**{kb.title}** ({kb.file_type}):\n{preview}\n\n"
+        for passage in passages:
+            kb = passage.knowledge_base
+            context += f"**{kb.title}** ({kb.file_type}, p. {passage.page_number}):\n{passage.text.strip()}\n\n"
         return context
 
 
@@ -71,8 +110,14 @@ class GeminiAIService:
     def __init__(self):
         self.api_key = settings.GEMINI_API_KEY
         self.model_name = settings.GEMINI_MODEL
+        self.source = 'gemini-api'
         
-        if GENAI_AVAILABLE and self.api_key != "INSERT API KEY":
+        if settings.GEMINI_MODEL_BACKEND:
+            # Local model (e.g. api.stubs.StubGenerativeModel) instead of the API
+            self.model = import_string(settings.GEMINI_MODEL_BACKEND)(self.model_name)
+            self.source = getattr(self.model, 'source', self.source)
+            self.available = True
+        elif GENAI_AVAILABLE and self.api_key != "INSERT API KEY":
             genai.configure(api_key=self.api_key)
             self.model = genai.GenerativeModel(self.model_name)
             self.available = True
@@ -84,18 +129,111 @@ class GeminiAIService:
         Generate AI response for a node's chat.
         
         Process:
-        1. Search relevant knowledge from uploads
+        1. Search relevant passages from uploads
         2. Build context-aware prompt
         3. Call Gemini API (or fallback to mock)
         4. Return response with metadata
         """
+        full_prompt, knowledge_bases, cache_key, cached = self._prepare(user_message, node, use_knowledge)
+
+        if not self.available:
+            return self._mock_response(user_message, node, knowledge_bases)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        response = self._gemini_response(full_prompt, user_message, knowledge_bases)
+        self._remember(cache_key, response)
+        return response
+
+    async def agenerate_response(self, user_message: str, node: Node, use_knowledge: bool = True) -> dict:
+        """
+        Async generate_response. Retrieval runs in a worker thread; the model
+        call itself is awaited, so no thread is held while the model works.
+        """
+        full_prompt, knowledge_bases, cache_key, cached = await sync_to_async(self._prepare)(
+            user_message, node, use_knowledge
+        )
+
+        if not self.available:
+            return self._mock_response(user_message, node, knowledge_bases)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        response = await self._agemini_response(full_prompt, user_message, knowledge_bases)
+        self._remember(cache_key, response)
+        return response
+
+    def stream_response(self, user_message: str, node: Node, use_knowledge: bool = True):
+        """
+        Generate AI response for a node's chat as a stream of text pieces.
         
+        Knowledge retrieval and prompt building happen here; iterating the
+        returned pieces only talks to the model (no database access).
+        Returns (metadata, pieces): metadata has the same keys as
+        generate_response minus 'message', and its 'source' is final once
+        the pieces are exhausted (a failed API call falls back to mock).
+        """
+        full_prompt, knowledge_bases, cache_key, cached = self._prepare(user_message, node, use_knowledge)
+        metadata = {
+            'role': 'ai',
+            'source': self.source if self.available else 'mock',
+            'knowledge_used': len(knowledge_bases) > 0,
+            'knowledge_sources': [kb.title for kb in knowledge_bases],
+        }
+
+        if not self.available:
+            pieces = self._mock_stream(self._mock_response(user_message, node, knowledge_bases)['message'])
+            return metadata, pieces
+
+        if cached is not None:
+            metadata.update(source=cached['source'], cached=True)
+            return metadata, iter([cached['message']])
+
+        pieces = self._gemini_stream(full_prompt, user_message, knowledge_bases, metadata)
+        if cache_key:
+            pieces = self._cache_when_complete(pieces, cache_key, metadata)
+        return metadata, pieces
+
+    def _prepare(self, user_message: str, node: Node, use_knowledge: bool):
+        """Build the prompt and look it up: (prompt, knowledge_bases, cache_key, cached answer)."""
+        full_prompt, knowledge_bases = self.build_prompt(user_message, node, use_knowledge)
+        cache = get_response_cache() if self.available else None
+        if cache is None:
+            return full_prompt, knowledge_bases, None, None
+        cache_key = cache.key(self.model_name, full_prompt, node.project_id)
+        return full_prompt, knowledge_bases, cache_key, cache.get(cache_key)
+
+    @staticmethod
+    def _remember(cache_key, response: dict):
+        """Cache a complete model answer (never a mock fallback)."""
+        cache = get_response_cache()
+        if cache and cache_key and response['source'] != 'mock' and not response.get('partial'):
+            cache.set(cache_key, response)
+
+    def _cache_when_complete(self, pieces, cache_key, metadata: dict):
+        """Pass a stream through, caching the full answer if it finished cleanly."""
+        parts = []
+        for piece in pieces:
+            parts.append(piece)
+            yield piece
+        self._remember(cache_key, {**metadata, 'message': "".join(parts).strip()})
+
+    def build_prompt(self, user_message: str, node: Node, use_knowledge: bool = True):
+        """
+        Retrieve knowledge and conversation memory for the node and build the
+        full prompt; returns (prompt, knowledge_bases).
+        """
         # Search relevant knowledge
         knowledge_bases = []
         knowledge_context = ""
         if use_knowledge:
-            knowledge_bases = KnowledgeSearchService.search_relevant_knowledge(node, user_message)
-            knowledge_context = KnowledgeSearchService.format_knowledge_context(knowledge_bases)
+            passages = KnowledgeSearchService.search_relevant_passages(node, user_message)
+            knowledge_bases = KnowledgeSearchService.sources_of(passages)
+            knowledge_context = KnowledgeSearchService.format_knowledge_context(passages)
+
+        # Summary of older turns plus the latest few, bounded in size
+        summary, recent = ConversationMemory.context(node, user_message)
+        conversation_context = ConversationMemory.format_context(summary, recent)
 
         # Build prompt
         system_prompt = f"""You are an intelligent assistant for DevBrain, a mind-mapping tool for project planning.
@@ -104,7 +242,7 @@ Description: {node.description or 'No description provided'}
 Status: {node.get_status_display()}
 
 {knowledge_context}
-
+{conversation_context}
 Guidelines:
 - Keep responses concise and actionable (2-3 sentences)
 - Ground answers in the provided knowledge base when possible
@@ -113,20 +251,33 @@ Guidelines:
 - Be helpful without unnecessary elaboration"""
 
         full_prompt = f"{system_prompt}\n\nUser: {user_message}"
-
-        if self.available:
-            return self._gemini_response(full_prompt, user_message, knowledge_bases)
-        else:
-            return self._mock_response(user_message, node, knowledge_bases)
+        return full_prompt, knowledge_bases
 
     def _gemini_response(self, prompt: str, user_message: str, knowledge_bases: list) -> dict:
-        """Call Gemini API and return response."""
+        """Call Gemini API (bounded by the LLM guard) and return response."""
+        try:
+            response = get_llm_guard().call(self.model.generate_content, prompt)
+            return {
+                'message': response.text,
+                'role': 'ai',
+                'source': self.source,
+                'knowledge_used': len(knowledge_bases) > 0,
+                'knowledge_sources': [kb.title for kb in knowledge_bases],
+            }
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            # Fallback to mock
+            return self._mock_response(user_message, None, knowledge_bases)
+
+    async def _agemini_response(self, prompt: str, user_message: str, knowledge_bases: list) -> dict:
+        """Await the model (generate_content_async when it has one) and return response."""
         try:
-            response = self.model.generate_content(prompt)
+            generate = getattr(self.model, 'generate_content_async', self.model.generate_content)
+            response = await get_llm_guard().acall(generate, prompt)
             return {
                 'message': response.text,
                 'role': 'ai',
-                'source': 'gemini-api',
+                'source': self.source,
                 'knowledge_used': len(knowledge_bases) > 0,
                 'knowledge_sources': [kb.title for kb in knowledge_bases],
             }
@@ -135,6 +286,31 @@ Guidelines:
             # Fallback to mock
             return self._mock_response(user_message, None, knowledge_bases)
 
+    def _gemini_stream(self, prompt: str, user_message: str, knowledge_bases: list, metadata: dict):
+        """Yield Gemini output as it is generated."""
+        streamed = False
+        try:
+            for chunk in get_llm_guard().stream(lambda: self.model.generate_content(prompt, stream=True)):
+                if chunk.text:
+                    streamed = True
+                    yield chunk.text
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            if streamed:
+                metadata['partial'] = True
+                return  # Keep the partial answer rather than appending a mock one
+            # Fallback to mock
+            metadata['source'] = 'mock'
+            yield from self._mock_stream(self._mock_response(user_message, None, knowledge_bases)['message'])
+
+    @staticmethod
+    def _mock_stream(message: str):
+        """Yield a mock answer word by word, paced like a real model."""
+        for index, match in enumerate(re.finditer(r'\s*\S+', message)):
+            if index and settings.CHAT_MOCK_TOKEN_DELAY:
+                time.sleep(settings.CHAT_MOCK_TOKEN_DELAY)
+            yield match.group(0)
+
     @staticmethod
     def _mock_response(user_message: str, node: Node = None, knowledge_bases: list = None) -> dict:
         """Fallback mock response when API unavailable."""
@@ -190,10 +366,45 @@ What would you like help with?{knowledge_context}""",
 
     @staticmethod
     def save_chat_message(node: Node, role: str, message: str, source: str = 'user') -> ChatMessage:
-        """Save a chat message to the database."""
-        return ChatMessage.objects.create(
+        """Save a chat message to the database and update the conversation summary."""
+        chat_message = ChatMessage.objects.create(
+            node=node,
+            role=role,
+            message=message,
+            source=source
+        )
+        ConversationMemory.record(node)
+        publish(node.project_id, lambda: [chat_event(chat_message)])
+        return chat_message
+
+    @staticmethod
+    async def asave_chat_message(node: Node, role: str, message: str, source: str = 'user') -> ChatMessage:
+        """Save a chat message to the database (async ORM) and update the conversation summary."""
+        chat_message = await ChatMessage.objects.acreate(
             node=node,
             role=role,
             message=message,
             source=source
         )
+        await sync_to_async(ConversationMemory.record)(node)
+        publish_now(node.project_id, lambda: [chat_event(chat_message)])
+        return chat_message
+
+
+_ai_service = None
+_ai_service_config = None
+_ai_service_lock = threading.Lock()
+
+
+def get_ai_service() -> GeminiAIService:
+    """
+    Return the process-wide GeminiAIService, so the client is configured once
+    and its connections are reused. Rebuilt if the model settings change.
+    """
+    global _ai_service, _ai_service_config
+    config = (settings.GEMINI_API_KEY, settings.GEMINI_MODEL, settings.GEMINI_MODEL_BACKEND)
+    with _ai_service_lock:
+        if _ai_service is None or _ai_service_config != config:
+            _ai_service = GeminiAIService()
+            _ai_service_config = config
+        return _ai_service
@@ -0,0 +1,95 @@
+"""
+Streaming - Server-Sent Events for chat answers, and streamed downloads.
+
+The chat stream view does its database work (saving the user message,
+knowledge retrieval) up front, then returns a StreamingHttpResponse over an
+async generator. Under ASGI (daphne) each piece is flushed to the client as
+soon as the model produces it; the blocking model iterator is advanced in a
+worker thread so the event loop never waits on it.
+"""
+
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.renderers import BaseRenderer
+from .serializers import ChatMessageSerializer
+from .services import GeminiAIService
+
+_EXHAUSTED = object()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views accept `Accept: text/event-stream`; non-stream replies are JSON."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def iterate_in_thread(iterable, thread_sensitive: bool = False):
+    """
+    Consume a blocking iterator from async code, one item per worker-thread
+    hop. Iterators reading the database need thread_sensitive=True, so every
+    step runs on the request's thread (and its connection).
+    """
+    iterator = iter(iterable)
+    advance = sync_to_async(next, thread_sensitive=thread_sensitive)
+    while True:
+        item = await advance(iterator, _EXHAUSTED)
+        if item is _EXHAUSTED:
+            return
+        yield item
+
+
+def database_stream(request, iterable):
+    """
+    Streaming content for a blocking iterator that reads the database.
+    Django buffers a sync iterator under ASGI and an async one under WSGI,
+    so hand each server the kind it streams.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return iterate_in_thread(iterable, thread_sensitive=True)
+    return iterable
+
+
+async def chat_event_stream(node, user_message, metadata: dict, pieces):
+    """
+    Events for one chat turn:
+    - meta:  the saved user message and the knowledge sources used
+    - token: {"text": ...} for every piece of the answer, as generated
+    - done:  the saved AI message and final metadata
+    - error: {"error": ...} if generation failed (nothing is saved)
+    """
+    yield sse_event('meta', {
+        'user_message': ChatMessageSerializer(user_message).data,
+        'knowledge_sources': metadata['knowledge_sources'],
+    })
+
+    parts = []
+    try:
+        async for piece in iterate_in_thread(pieces):
+            parts.append(piece)
+            yield sse_event('token', {'text': piece})
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+
+    ai_message = await sync_to_async(GeminiAIService.save_chat_message)(
+        node, metadata['role'], "".join(parts).strip(), metadata['source']
+    )
+    yield sse_event('done', {
+        'ai_response': ChatMessageSerializer(ai_message).data,
+        'metadata': {
+            'source': metadata['source'],
+            'knowledge_used': metadata['knowledge_used'],
+            'knowledge_sources': metadata['knowledge_sources'],
+            'cached': metadata.get('cached', False),
+        },
+    })
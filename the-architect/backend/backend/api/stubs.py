@@ -0,0 +1,65 @@
+"""
+Local stand-in for the Gemini model, for offline development and benchmarks.
+
+Set GEMINI_MODEL_BACKEND = 'api.stubs.StubGenerativeModel' to use it. It
+mimics google.generativeai.GenerativeModel.generate_content (with or without
+stream=True) and generate_content_async: a fixed delay before the first
+token, then a steady per-token delay. Delays come from
+STUB_MODEL_FIRST_TOKEN_DELAY and STUB_MODEL_TOKEN_DELAY (seconds); the answer
+length from STUB_MODEL_TOKENS.
+"""
+
+import asyncio
+import time
+from django.conf import settings
+
+FILLER = (
+    "Start with the smallest slice that delivers value, agree on the interface, "
+    "write it down, then build, measure and refine before widening the scope."
+).split()
+
+
+class StubChunk:
+    """One streamed piece of a stub answer (has .text like a Gemini chunk)."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """Deterministic, network-free generative model with configurable latency."""
+
+    source = 'stub'
+
+    def __init__(self, model_name: str = 'stub', first_token_delay: float = None,
+                 token_delay: float = None, tokens: int = None):
+        self.model_name = model_name
+        self.first_token_delay = (settings.STUB_MODEL_FIRST_TOKEN_DELAY
+                                  if first_token_delay is None else first_token_delay)
+        self.token_delay = settings.STUB_MODEL_TOKEN_DELAY if token_delay is None else token_delay
+        self.tokens = tokens or settings.STUB_MODEL_TOKENS
+
+    def _words(self, prompt: str) -> list:
+        question = prompt.rsplit("User:", 1)[-1].strip().split()
+        words = ["Regarding"] + question[:12] + ["-"]
+        while len(words) < self.tokens:
+            words.extend(FILLER)
+        return words[:self.tokens]
+
+    def _stream(self, prompt: str):
+        time.sleep(self.first_token_delay)
+        for index, word in enumerate(self._words(prompt)):
+            if index:
+                time.sleep(self.token_delay)
+            yield StubChunk(word + " ")
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream(prompt)
+        return StubChunk("".join(chunk.text for chunk in self._stream(prompt)).strip())
+
+    async def generate_content_async(self, prompt: str):
+        """Like generate_content, but waits without holding a thread."""
+        words = self._words(prompt)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * (len(words) - 1))
+        return StubChunk(" ".join(words))
@@ -0,0 +1,189 @@
+"""
+API tests for DevBrain.
+
+Run with: python manage.py test api
+"""
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from .models import Project, Node, NodeClosure, Edge, ChatMessage, ProjectChange
+
+
+class APITestCase(TestCase):
+    """A logged-in user with one project, and helpers to build its tree through the API."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='tester')
+        self.project = Project.objects.create(name='Test', owner=self.user)
+        self.client.force_login(self.user)
+
+    def create_node(self, label, parent=None, project=None, **fields):
+        response = self.client.post('/api/nodes/', {
+            'project': (project or self.project).id, 'label': label,
+            'parent': parent.id if parent else None, **fields,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Node.objects.get(id=response.json()['id'])
+
+    def move_node(self, node, parent):
+        return self.client.patch(f'/api/nodes/{node.id}/', {'parent': parent.id if parent else None},
+                                 content_type='application/json')
+
+
+class ReparentTests(APITestCase):
+    """Moving a node keeps the closure table, parent edges and status rollups in step."""
+
+    def setUp(self):
+        super().setUp()
+        self.old_root = self.create_node('Old root')
+        self.new_root = self.create_node('New root')
+        self.branch = self.create_node('Branch', parent=self.old_root)
+        self.leaf = self.create_node('Leaf', parent=self.branch, status='completed')
+
+    def test_reparent_moves_closure_rows(self):
+        response = self.move_node(self.branch, self.new_root)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        ancestors = dict(NodeClosure.objects.filter(descendant=self.leaf).values_list('ancestor_id', 'depth'))
+        self.assertEqual(ancestors, {self.leaf.id: 0, self.branch.id: 1, self.new_root.id: 2})
+        self.assertFalse(NodeClosure.objects.filter(ancestor=self.old_root, depth__gt=0).exists())
+
+    def test_reparent_relinks_parent_edge(self):
+        self.move_node(self.branch, self.new_root)
+
+        self.assertFalse(Edge.objects.filter(source=self.old_root, target=self.branch).exists())
+        self.assertTrue(Edge.objects.filter(source=self.new_root, target=self.branch).exists())
+        self.assertTrue(Edge.objects.filter(source=self.branch, target=self.leaf).exists())
+
+    def test_reparent_moves_rollups(self):
+        self.move_node(self.branch, self.new_root)
+
+        self.old_root.refresh_from_db()
+        self.new_root.refresh_from_db()
+        self.assertEqual((self.old_root.subtree_count, self.old_root.subtree_completed), (1, 0))
+        self.assertEqual((self.new_root.subtree_count, self.new_root.subtree_completed), (3, 1))
+        self.assertEqual(self.new_root.subtree_not_started, 2)
+
+    def test_reparent_under_own_descendant_is_rejected(self):
+        response = self.move_node(self.branch, self.leaf)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+        self.assertEqual(Node.objects.get(id=self.branch.id).parent_id, self.old_root.id)
+
+    def test_parent_from_another_project_is_rejected(self):
+        other = Project.objects.create(name='Other', owner=User.objects.create(username='other'))
+        foreign = Node.objects.create(project=other, label='Foreign')
+
+        self.assertEqual(self.move_node(self.branch, foreign).status_code, 400)
+        response = self.client.post('/api/nodes/', {
+            'project': self.project.id, 'label': 'Stray', 'parent': foreign.id,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Edge.objects.filter(source=foreign).exists())
+
+
+class BatchTests(APITestCase):
+    """A batch applies all of its operations or none of them."""
+
+    def batch(self, operations):
+        return self.client.post('/api/nodes/batch/', {'project': self.project.id, 'operations': operations},
+                                content_type='application/json')
+
+    def test_batch_applies_every_operation(self):
+        root = self.create_node('Root')
+        response = self.batch([
+            {'op': 'create', 'ref': 'child', 'label': 'Child', 'parent': root.id},
+            {'op': 'create', 'ref': 'grandchild', 'label': 'Grandchild', 'parent': 'child'},
+            {'op': 'update', 'id': root.id, 'label': 'Renamed'},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+
+        grandchild = Node.objects.get(id=response.json()['refs']['grandchild'])
+        self.assertEqual(grandchild.parent_id, response.json()['refs']['child'])
+        self.assertEqual(NodeClosure.objects.filter(descendant=grandchild).count(), 3)
+        root.refresh_from_db()
+        self.assertEqual((root.label, root.subtree_count), ('Renamed', 3))
+
+    def test_invalid_operation_rolls_back_the_batch(self):
+        root = self.create_node('Root')
+        self.project.refresh_from_db()
+        version = self.project.version
+        counts = (Node.objects.count(), Edge.objects.count(), NodeClosure.objects.count(),
+                  ProjectChange.objects.count())
+
+        response = self.batch([
+            {'op': 'create', 'ref': 'child', 'label': 'Child', 'parent': root.id},
+            {'op': 'update', 'id': root.id, 'label': 'Renamed'},
+            {'op': 'update', 'id': 'child', 'status': 'unknown'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 2)
+
+        root.refresh_from_db()
+        self.project.refresh_from_db()
+        self.assertEqual((root.label, root.subtree_count), ('Root', 1))
+        self.assertEqual(self.project.version, version)
+        self.assertEqual((Node.objects.count(), Edge.objects.count(), NodeClosure.objects.count(),
+                          ProjectChange.objects.count()), counts)
+
+    def test_unknown_operation_is_rejected(self):
+        response = self.batch([{'op': 'create', 'label': 'Child'}, {'op': 'rename'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertFalse(Node.objects.exists())
+
+
+class ChangesTests(APITestCase):
+    """Delta sync: tombstones for deletes and the version ETag on GET /changes/."""
+
+    def changes(self, since, **headers):
+        return self.client.get(f'/api/projects/{self.project.id}/changes/',
+                               {'since': since, 'include_chat': 'true'}, headers=headers)
+
+    def version(self):
+        self.project.refresh_from_db()
+        return self.project.version
+
+    def test_subtree_delete_records_tombstones(self):
+        root = self.create_node('Root')
+        branch = self.create_node('Branch', parent=root)
+        leaf = self.create_node('Leaf', parent=branch)
+        message = ChatMessage.objects.create(node=leaf, role='user', message='Hello')
+        edges = set(Edge.objects.filter(target__in=[branch, leaf]).values_list('id', flat=True))
+        since = self.version()
+
+        response = self.client.delete(f'/api/nodes/{branch.id}/')
+        self.assertEqual(response.status_code, 204)
+
+        deleted = self.changes(since).json()['deleted']
+        self.assertEqual(set(deleted['nodes']), {branch.id, leaf.id})
+        self.assertEqual(set(deleted['edges']), edges)
+        self.assertEqual(deleted['chat_messages'], [str(message.id)])
+        root.refresh_from_db()
+        self.assertEqual(root.subtree_count, 1)
+        self.assertFalse(NodeClosure.objects.filter(ancestor=root, depth__gt=0).exists())
+
+    def test_changes_etag_and_not_modified(self):
+        node = self.create_node('Node')
+        response = self.changes(0)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{self.version()}"')
+        self.assertEqual([row['id'] for row in response.json()['nodes']], [node.id])
+
+        response = self.changes(self.version(), If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        since = self.version()
+        node.label = 'Renamed'
+        node.save()
+        response = self.changes(since, If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([row['label'] for row in response.json()['nodes']], ['Renamed'])
+
+    def test_changes_since_a_newer_version_asks_for_a_reset(self):
+        response = self.changes(self.version() + 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['reset'])
@@ -3,19 +3,65 @@ REST API Views for DevBrain.
 Provides endpoints for mind map CRUD, chat, knowledge base uploads, and AI assistance.
 """
 
-from rest_framework import viewsets, status, views
+from asgiref.sync import sync_to_async
+from rest_framework import viewsets, status, views, serializers
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
 from .models import Project, Node, Edge, KnowledgeBase, ChatMessage
 from .serializers import (
-    ProjectDetailSerializer, ProjectListSerializer,
+    ProjectDetailSerializer, ProjectListSerializer, ProjectSnapshotSerializer,
     NodeSerializer, EdgeSerializer, KnowledgeBaseSerializer,
-    ChatMessageSerializer, CreateNodeSerializer
+    ChatMessageSerializer, CreateNodeSerializer, KnowledgeChunkSerializer,
+    IngestionStatusSerializer, NodeHierarchySerializer, NodeSnapshotSerializer,
+    EdgeSnapshotSerializer
 )
-from .services import GeminiAIService, KnowledgeSearchService
+from .services import GeminiAIService, KnowledgeSearchService, get_ai_service
+from .indexing import KnowledgeIndex
+from .search import get_node_search
+from .ingestion import enqueue_ingestion
+from .blobs import acquire_blob, release_blob, delete_knowledge_base
+from .embeddings import VectorIndex
+from .hierarchy import NodeHierarchy
+from .changes import ChangeLog
+from .realtime import publish, publish_moves, node_event, edge_event, deleted_event
+from .batch import NodeBatch, BatchError
+from .positions import parse_positions, save_positions, flush_positions
+from .streaming import EventStreamRenderer, chat_event_stream, database_stream
+from .exporting import NDJSONRenderer, export_stream
+from .importing import ImportFormatError, import_project
+from .metrics import metrics, PrometheusRenderer
+from .pagination import KeysetPagination, LatestFirstPagination
+
+
+def parse_use_knowledge(data) -> bool:
+    """The chat `use_knowledge` flag as a real boolean ("false" from a form is False)."""
+    try:
+        return serializers.BooleanField().to_internal_value(data.get('use_knowledge', True))
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'use_knowledge': error.detail})
+
+
+def api_request(request) -> Request:
+    """Wrap a plain Django request with the parsers and authenticators an APIView uses."""
+    return Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
 
 
 class ProjectViewSet(viewsets.ModelViewSet):
@@ -26,8 +72,13 @@ class ProjectViewSet(viewsets.ModelViewSet):
     - GET /api/projects/ - List all user projects
     - POST /api/projects/ - Create new project
     - GET /api/projects/{id}/ - Get project with nodes/edges
+    - GET /api/projects/{id}/snapshot/ - Flat nodes (with parentId) and edge id pairs
+      (same as ?snapshot=true on the detail URL; add ?include_chat=true for chat)
+    - GET /api/projects/{id}/changes/?since={version} - Only what changed since a version
     - PUT/PATCH /api/projects/{id}/ - Update project
     - DELETE /api/projects/{id}/ - Delete project
+    - GET /api/projects/{id}/export/ - Export (JSON, or ?format=ndjson streamed .ndjson.gz)
+    - POST /api/projects/import/ - Create a project from an export
     """
     
     queryset = Project.objects.all()
@@ -35,18 +86,149 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'list':
             return ProjectListSerializer
+        if self.action == 'snapshot' or (
+            self.action == 'retrieve' and self._query_flag('snapshot')
+        ):
+            return ProjectSnapshotSerializer
         return ProjectDetailSerializer
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_chat'] = self._query_flag('include_chat')
+        return context
+    
+    def _query_flag(self, name, default=False):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        return value.lower() in ('1', 'true', 'yes')
+    
     def get_queryset(self):
         return Project.objects.filter(owner=self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
     
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            project = serializer.save()
+            ChangeLog.record(project.id, changed={'project': [project.id]})
+    
+    def retrieve(self, request, *args, **kwargs):
+        flush_positions()
+        return super().retrieve(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        blob_ids = list(instance.knowledge_bases.values_list('blob_id', flat=True))
+        instance.delete()
+        VectorIndex.for_project(instance.id).drop()
+        for blob_id in blob_ids:
+            release_blob(blob_id, instance.id)
+    
     @action(detail=True, methods=['get'])
+    def snapshot(self, request, pk=None):
+        """
+        Flat project snapshot in a fixed number of queries.
+        Add ?include_chat=true to embed each node's chat history.
+        """
+        flush_positions()
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """
+        Delta sync: everything that changed after ?since=<version> (the
+        `version` of a snapshot or of the previous changes response).
+        Changed objects come whole, deleted ones as ids under `deleted`;
+        chat messages only with ?include_chat=true. The ETag is the project
+        version, so If-None-Match answers 304 while nothing has changed.
+        """
+        try:
+            since = int(request.query_params.get('since', ''))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'since must be a version number (0 or more)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        flush_positions()
+        version = self.get_queryset().filter(pk=pk).values_list('version', flat=True).first()
+        if version is None:
+            raise NotFound()
+        etag = quote_etag(str(version))
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif since > version:
+            # Newer than the project: the client must reload a snapshot
+            response = Response({'version': version, 'since': since, 'reset': True})
+        else:
+            response = Response(self._changes_data(pk, since, version))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    def _changes_data(self, project_id, since, version):
+        include_chat = self._query_flag('include_chat')
+        result = ChangeLog.since(project_id, since, version, include_chat)
+        changed, deleted = result['changed'], result['deleted']
+        data = {'version': version, 'since': since}
+        if changed.get('project'):
+            data['project'] = ProjectListSerializer(changed['project'][0]).data
+        data['nodes'] = NodeSnapshotSerializer(changed.get('node', []), many=True).data
+        data['edges'] = EdgeSnapshotSerializer(changed.get('edge', []), many=True).data
+        data['knowledge_bases'] = KnowledgeBaseSerializer(
+            changed.get('knowledge_base', []), many=True, context=self.get_serializer_context()
+        ).data
+        kinds = ['node', 'edge', 'knowledge_base']
+        if include_chat:
+            data['chat_messages'] = [
+                {**ChatMessageSerializer(message).data, 'node': message.node_id}
+                for message in changed.get('chat_message', [])
+            ]
+            kinds.append('chat_message')
+        data['deleted'] = {f'{kind}s': deleted.get(kind, []) for kind in kinds}
+        return data
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_project(self, request):
+        """
+        Create a project from an export: a multipart `file` upload, or the
+        export itself as the request body (NDJSON, gzipped NDJSON or JSON).
+        ?name= (or a `name` form field) renames the new project.
+        """
+        if request.content_type.startswith('multipart/'):
+            stream, name = request.FILES.get('file'), request.data.get('name')
+        else:
+            stream, name = request.stream, request.query_params.get('name')
+        if stream is None:
+            return Response({'error': 'An export file or request body is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            project, counts = import_project(stream, request.user, name)
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        project.refresh_from_db()  # Counters and version were updated in the database
+        return Response({'project': ProjectListSerializer(project).data, **counts},
+                        status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, NDJSONRenderer])
     def export(self, request, pk=None):
-        """Export project as JSON."""
+        """
+        Export project as JSON, or with ?format=ndjson as a streamed
+        gzip-compressed NDJSON file (flat memory, first byte at once;
+        ?include_chat=false leaves out chat history).
+        """
         project = self.get_object()
+        if request.accepted_renderer.format == 'ndjson':
+            flush_positions()
+            response = StreamingHttpResponse(
+                database_stream(request, export_stream(project, self._query_flag('include_chat', True))),
+                content_type='application/gzip'
+            )
+            response['Content-Disposition'] = f'attachment; filename="project-{project.id}.ndjson.gz"'
+            return response
         serializer = ProjectDetailSerializer(project)
         return Response(serializer.data)
 
@@ -62,9 +244,17 @@ class NodeViewSet(viewsets.ModelViewSet):
     - PUT/PATCH /api/nodes/{id}/ - Update node
     - DELETE /api/nodes/{id}/ - Delete node (cascades to children)
     - POST /api/nodes/{id}/move/ - Move node to new position
+    - POST /api/nodes/positions/ - Move many nodes at once (drag of a selection)
+    - GET /api/nodes/{id}/descendants/?max_depth={n} - Whole subtree, nearest first
+    - GET /api/nodes/{id}/ancestors/ - Path from the root down to the parent
+    - POST /api/nodes/batch/ - Apply many create/update/move/delete operations at once
+    
+    Listings are keyset-paginated in creation order (follow `next`).
+    Changes are pushed to project WebSocket subscribers (api/realtime.py).
     """
     
     serializer_class = NodeSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         project_id = self.request.query_params.get('project')
@@ -75,17 +265,89 @@ class NodeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         project_id = self.request.data.get('project')
         project = get_object_or_404(Project, id=project_id)
-        serializer.save(project=project)
+        with transaction.atomic():
+            node = serializer.save(project=project)
+            _, edge = NodeHierarchy.relink_parent_edge(node, None)
+        publish(project.id, lambda: [node_event('created', [node])]
+                + ([edge_event('created', [edge])] if edge else []))
+    
+    def perform_update(self, serializer):
+        previous_parent_id = serializer.instance.parent_id
+        removed, edge = [], None
+        with transaction.atomic():
+            node = serializer.save()
+            if node.parent_id != previous_parent_id:
+                removed, edge = NodeHierarchy.relink_parent_edge(node, previous_parent_id)
+                if removed:
+                    ChangeLog.record(node.project_id, deleted={'edge': removed})
+        publish(node.project_id, lambda: [node_event('updated', [node])]
+                + ([deleted_event('edge', removed)] if removed else [])
+                + ([edge_event('created', [edge])] if edge else []))
+    
+    def perform_destroy(self, instance):
+        removed = NodeHierarchy.delete_subtree(instance)
+        publish(instance.project_id, lambda: [
+            deleted_event('node', removed['node']), deleted_event('edge', removed['edge'])
+        ])
     
     @action(detail=True, methods=['post'])
     def move(self, request, pk=None):
-        """Update node position."""
+        """Update node position (position columns only)."""
         node = self.get_object()
         position = request.data.get('position', {})
         node.position_x = position.get('x', node.position_x)
         node.position_y = position.get('y', node.position_y)
-        node.save()
-        return Response(NodeSerializer(node).data)
+        save_positions({node.id: (node.position_x, node.position_y)})
+        publish_moves({node.id: (node.position_x, node.position_y)}, node.project_id)
+        return Response(NodeSnapshotSerializer(node).data)
+    
+    @action(detail=False, methods=['post'])
+    def positions(self, request):
+        """
+        Update many node positions at once: {"positions": [{"id", "x", "y"}, ...]}.
+        Returns 202 when NODE_POSITION_WRITE_BEHIND queues them for the next flush.
+        """
+        try:
+            positions = parse_positions(request.data.get('positions'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated = save_positions(positions)
+        publish_moves(positions)
+        if updated is None:
+            return Response({'queued': len(positions)}, status=status.HTTP_202_ACCEPTED)
+        return Response({'updated': updated})
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Apply a list of node/edge operations in one transaction.
+        Body: {"project": id, "operations": [{"op": "create", "ref": ..., ...}, ...]}
+        (see api/batch.py for the operation format).
+        """
+        project = get_object_or_404(Project, id=request.data.get('project'))
+        batch = NodeBatch(project, request.data.get('operations'))
+        try:
+            result = batch.apply()
+        except BatchError as e:
+            return Response({'error': e.message, 'index': e.index}, status=status.HTTP_400_BAD_REQUEST)
+        
+        publish(project.id, lambda: [
+            node_event('created', result['created']),
+            node_event('updated', result['updated']),
+            edge_event('created', Edge.objects.filter(id__in=batch.changed['edge'])),
+            deleted_event('edge', batch.deleted['edge']),
+            deleted_event('node', result['deleted']),
+        ])
+        
+        return Response({
+            'refs': result['refs'],
+            'created': NodeSnapshotSerializer(result['created'], many=True).data,
+            'updated': NodeSnapshotSerializer(result['updated'], many=True).data,
+            'deleted': result['deleted'],
+            'edges_created': result['edges_created'],
+            'edges_deleted': result['edges_deleted'],
+        })
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -95,6 +357,7 @@ class NodeViewSet(viewsets.ModelViewSet):
         if status in ['not-started', 'in-progress', 'completed']:
             node.status = status
             node.save()
+            publish(node.project_id, lambda: [node_event('updated', [node])])
             return Response({'status': 'success', 'node': NodeSerializer(node).data})
         return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -104,6 +367,33 @@ class NodeViewSet(viewsets.ModelViewSet):
         node = self.get_object()
         children = node.get_children()
         return Response(NodeSerializer(children, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def descendants(self, request, pk=None):
+        """Get every node below this one, with depth relative to it."""
+        node = self.get_object()
+        max_depth = request.query_params.get('max_depth')
+        try:
+            max_depth = int(max_depth) if max_depth else None
+        except ValueError:
+            return Response({'error': 'max_depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        descendants = NodeHierarchy.descendants(node, max_depth)
+        return Response({
+            'node': node.id,
+            'count': len(descendants),
+            'descendants': NodeHierarchySerializer(descendants, many=True).data,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Get the path from the root down to this node's parent."""
+        node = self.get_object()
+        ancestors = NodeHierarchy.ancestors(node)
+        return Response({
+            'node': node.id,
+            'depth': len(ancestors),
+            'ancestors': NodeHierarchySerializer(ancestors, many=True).data,
+        })
 
 
 class EdgeViewSet(viewsets.ModelViewSet):
@@ -120,7 +410,17 @@ class EdgeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         project_id = self.request.data.get('project')
         project = get_object_or_404(Project, id=project_id)
-        serializer.save(project=project)
+        edge = serializer.save(project=project)
+        publish(project.id, lambda: [edge_event('created', [edge])])
+    
+    def perform_update(self, serializer):
+        edge = serializer.save()
+        publish(edge.project_id, lambda: [edge_event('updated', [edge])])
+    
+    def perform_destroy(self, instance):
+        edge_id, project_id = instance.id, instance.project_id
+        instance.delete()
+        publish(project_id, lambda: [deleted_event('edge', [edge_id])])
 
 
 class KnowledgeBaseViewSet(viewsets.ModelViewSet):
@@ -128,7 +428,8 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
     API endpoint for knowledge base file uploads.
     
     Supports: PDF, TXT, MD, DOCX
-    Files are processed and indexed for semantic search.
+    Files are processed and indexed for semantic search in the background;
+    poll GET /api/knowledge/{id}/status/ for ingestion progress.
     """
     
     serializer_class = KnowledgeBaseSerializer
@@ -143,50 +444,33 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         project_id = self.request.data.get('project')
         project = get_object_or_404(Project, id=project_id)
-        file_obj = self.request.FILES.get('file')
-        
-        # Extract content for indexing
-        content = self._extract_file_content(file_obj)
         
-        serializer.save(
+        # Identical content is stored once; extraction and indexing run in
+        # the background ingestion pool (and are skipped for known content)
+        blob = acquire_blob(self.request.FILES['file'])
+        kb = serializer.save(
             project=project,
             uploaded_by=self.request.user,
-            full_text=content,
-            content_preview=content[:500]
+            blob=blob,
+            file=blob.file.name
         )
+        enqueue_ingestion(kb)
     
-    @staticmethod
-    def _extract_file_content(file_obj) -> str:
-        """Extract text content from uploaded file."""
-        try:
-            file_name = file_obj.name.lower()
-            
-            if file_name.endswith('.txt') or file_name.endswith('.md'):
-                return file_obj.read().decode('utf-8', errors='ignore')
-            
-            elif file_name.endswith('.pdf'):
-                try:
-                    import PyPDF2
-                    pdf_reader = PyPDF2.PdfReader(file_obj)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text()
-                    return text
-                except ImportError:
-                    return "[PDF content extraction requires PyPDF2]"
-            
-            elif file_name.endswith('.docx'):
-                try:
-                    from docx import Document
-                    doc = Document(file_obj)
-                    return "\n".join([para.text for para in doc.paragraphs])
-                except ImportError:
-                    return "[DOCX content extraction requires python-docx]"
-        
-        except Exception as e:
-            return f"[Error extracting content: {str(e)}]"
+    def perform_update(self, serializer):
+        file_obj = self.request.FILES.get('file')
+        if not file_obj:
+            serializer.save()
+            return
         
-        return "[Unsupported file type]"
+        previous_blob_id = serializer.instance.blob_id
+        blob = acquire_blob(file_obj)
+        kb = serializer.save(blob=blob, file=blob.file.name)
+        if previous_blob_id != blob.pk:
+            release_blob(previous_blob_id, kb.project_id)
+        enqueue_ingestion(kb)
+    
+    def perform_destroy(self, instance):
+        delete_knowledge_base(instance)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -197,28 +481,28 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
         if not query or not project_id:
             return Response({'error': 'Missing query or project'}, status=status.HTTP_400_BAD_REQUEST)
         
-        knowledge_bases = KnowledgeBase.objects.filter(project_id=project_id)
-        scored_results = []
-        
-        for kb in knowledge_bases:
-            full_text = (kb.full_text or "").lower()
-            query_lower = query.lower()
-            
-            # Simple keyword match scoring
-            score = full_text.count(query_lower)
-            if score > 0:
-                scored_results.append((kb, score))
-        
-        scored_results.sort(key=lambda x: x[1], reverse=True)
-        results = [kb for kb, _ in scored_results[:10]]
+        ranked = KnowledgeIndex.search_documents(project_id, query, top_k=10)
+        results = KnowledgeSearchService.load_ranked(ranked)
         
         return Response(KnowledgeBaseSerializer(results, many=True).data)
+    
+    @action(detail=True, methods=['get'], url_path='status')
+    def ingestion_status(self, request, pk=None):
+        """Report background ingestion status and progress."""
+        kb = self.get_object()
+        return Response(IngestionStatusSerializer(kb).data)
 
 
 class ChatViewSet(viewsets.ReadOnlyModelViewSet):
-    """API endpoint for viewing chat history."""
+    """
+    API endpoint for viewing chat history.
+    
+    GET /api/chat-history/?node={id} returns the latest messages first;
+    follow `next` for older ones (keyset-paginated, no counts).
+    """
     
     serializer_class = ChatMessageSerializer
+    pagination_class = LatestFirstPagination
     
     def get_queryset(self):
         node_id = self.request.query_params.get('node')
@@ -227,60 +511,132 @@ class ChatViewSet(viewsets.ReadOnlyModelViewSet):
         return ChatMessage.objects.all()
 
 
-class ChatNodeView(views.APIView):
+# As APIView does: CSRF is enforced by SessionAuthentication, for session users only
+@method_decorator(csrf_exempt, name='dispatch')
+class ChatNodeView(View):
     """
     POST /api/chat/node/{id}/
     Send a message to the AI for a specific node.
+    
+    A native async view: messages are saved with the async ORM and the
+    model call is awaited on the shared AI service, so one worker can hold
+    many chats waiting on the model without pinning a thread for each.
+    Authentication, CSRF and body parsing go through DRF as for an APIView.
     """
     
-    def post(self, request, node_id):
+    async def post(self, request, node_id):
+        request = api_request(request)
+        try:
+            # Authenticating reads the session (and enforces its CSRF check)
+            await sync_to_async(lambda: request.user)()
+            data = request.data
+            use_knowledge = parse_use_knowledge(data)
+        except APIException as error:
+            # Same body as DRF's exception handler
+            detail = error.detail if isinstance(error.detail, (dict, list)) else {'detail': error.detail}
+            return JsonResponse(detail, status=error.status_code, safe=False)
+        
         try:
-            node = get_object_or_404(Node, id=node_id)
-            user_message = request.data.get('message')
-            use_knowledge = request.data.get('use_knowledge', True)
+            node = await Node.objects.filter(id=node_id).afirst()
+            if node is None:
+                return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            
+            user_message = data.get('message')
             
             if not user_message:
-                return Response(
+                return JsonResponse(
                     {'error': 'Message required'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
             # Save user message
-            user_msg_obj = GeminiAIService.save_chat_message(
+            user_msg_obj = await GeminiAIService.asave_chat_message(
                 node, 'user', user_message, 'user'
             )
             
             # Generate AI response
-            ai_service = GeminiAIService()
-            response_data = ai_service.generate_response(
+            response_data = await get_ai_service().agenerate_response(
                 user_message, node, use_knowledge=use_knowledge
             )
             
             # Save AI response
-            ai_msg_obj = GeminiAIService.save_chat_message(
+            ai_msg_obj = await GeminiAIService.asave_chat_message(
                 node,
                 response_data['role'],
                 response_data['message'],
                 response_data['source']
             )
             
-            return Response({
+            return JsonResponse({
                 'user_message': ChatMessageSerializer(user_msg_obj).data,
                 'ai_response': ChatMessageSerializer(ai_msg_obj).data,
                 'metadata': {
                     'source': response_data['source'],
                     'knowledge_used': response_data.get('knowledge_used', False),
                     'knowledge_sources': response_data.get('knowledge_sources', []),
+                    'cached': response_data.get('cached', False),
                 }
             })
         
         except Exception as e:
-            return Response(
+            return JsonResponse(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
+class ChatNodeStreamView(views.APIView):
+    """
+    POST /api/chat/node/{id}/stream/
+    Send a message to the AI for a specific node and receive the answer as
+    Server-Sent Events while it is generated: 'meta', then one 'token' per
+    piece of text, then 'done' with the saved AI message (or 'error').
+    """
+    
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+    
+    def post(self, request, node_id):
+        node = get_object_or_404(Node, id=node_id)
+        user_message = request.data.get('message')
+        use_knowledge = parse_use_knowledge(request.data)
+        
+        if not user_message:
+            return Response(
+                {'error': 'Message required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        user_msg_obj = GeminiAIService.save_chat_message(
+            node, 'user', user_message, 'user'
+        )
+        
+        # Retrieval runs now; the answer itself streams as it is generated
+        metadata, pieces = get_ai_service().stream_response(
+            user_message, node, use_knowledge=use_knowledge
+        )
+        
+        response = StreamingHttpResponse(
+            chat_event_stream(node, user_msg_obj, metadata, pieces),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering
+        return response
+
+
+class MetricsView(views.APIView):
+    """
+    GET /api/metrics/
+    Counters and gauges of this server process (JSON, or
+    ?format=prometheus for the Prometheus text format).
+    """
+    
+    renderer_classes = [JSONRenderer, PrometheusRenderer]
+    
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
 class SearchKnowledgeView(views.APIView):
     """
     GET /api/search/knowledge/?node={id}&query={q}
@@ -301,9 +657,59 @@ class SearchKnowledgeView(views.APIView):
         knowledge = KnowledgeSearchService.search_relevant_knowledge(
             node, query or None, top_k=5
         )
+        passages = KnowledgeSearchService.search_relevant_passages(node, query or None)
         
         return Response({
             'node': node_id,
             'knowledge': KnowledgeBaseSerializer(knowledge, many=True).data,
+            'passages': KnowledgeChunkSerializer(passages, many=True).data,
             'count': len(knowledge)
         })
+
+
+class SearchNodesView(views.APIView):
+    """
+    GET /api/search/nodes/?q={text}&project={id}&limit={n}
+    Quick-jump: fuzzy, ranked search over node labels and descriptions in
+    all of the user's projects (or one). Typo tolerant; the last word
+    matches as a prefix, so it can run on every keystroke.
+    """
+    
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), settings.NODE_SEARCH_MAX_RESULTS)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        projects = Project.objects.filter(owner=request.user)
+        if request.query_params.get('project'):
+            projects = projects.filter(id=request.query_params['project'])
+        projects = {project_id: (name, version) for project_id, name, version in
+                    projects.values_list('id', 'name', 'version')}
+        ranked = get_node_search().search(
+            [(project_id, version) for project_id, (_, version) in projects.items()], query, max(limit, 1)
+        ) if query.strip() else []
+        
+        nodes = {
+            str(node['id']): node
+            for node in Node.objects.filter(id__in=[node_id for _, _, node_id, _ in ranked]).values(
+                'id', 'label', 'status', 'parent_id', 'project_id'
+            )
+        }
+        results = []
+        for score, project_id, node_id, field in ranked:
+            node = nodes.get(node_id)
+            if node is None:
+                continue  # Deleted since the index was refreshed
+            results.append({
+                'id': node_id,
+                'label': node['label'],
+                'status': node['status'],
+                'parentId': node['parent_id'],
+                'project': project_id,
+                'project_name': projects[project_id][0],
+                'matched': field,
+                'score': score,
+            })
+        return Response({'query': query, 'results': results})
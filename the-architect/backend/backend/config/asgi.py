@@ -1,5 +1,8 @@
 """
 ASGI config for DevBrain project.
+
+HTTP goes to Django; WebSocket connections (ws /ws/projects/<id>/) go to
+the realtime push application in api/realtime.py.
 """
 
 import os
@@ -7,4 +10,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.realtime import project_socket  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await project_socket(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,81 @@
+"""
+Database profiles, selected with the DEVBRAIN_DB_PROFILE environment variable.
+
+- sqlite (default): SQLite through config.sqlite in WAL mode, so readers no
+  longer wait for the writer. It uses synchronous=NORMAL, a memory-mapped
+  file, a busy timeout and IMMEDIATE write transactions. Connections are
+  persistent, so a request reuses its thread's connection instead of
+  reopening the file.
+- sqlite-basic: Django's stock SQLite settings (rollback journal, a new
+  connection per request), kept for comparison.
+- postgres: PostgreSQL with persistent, health-checked connections. Django
+  4.2 has no in-process pool, so each worker thread keeps one connection.
+  Behind PgBouncer in transaction mode, set DEVBRAIN_DB_POOLER=pgbouncer,
+  which turns off server-side cursors.
+
+Environment:
+- DEVBRAIN_DB_CONN_MAX_AGE: seconds a connection is reused (default 600).
+- DEVBRAIN_SQLITE_PATH: the SQLite file.
+- DEVBRAIN_DB_NAME / _USER / _PASSWORD / _HOST / _PORT: the PostgreSQL server.
+`python manage.py benchmark database` compares the profiles under concurrent
+writes.
+"""
+
+import os
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('sqlite', 'sqlite-basic', 'postgres')
+
+# Run on every new connection of the 'sqlite' profile
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',  # Durable at checkpoints; a crash cannot corrupt a WAL database
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB
+    'temp_store': 'memory',
+}
+SQLITE_BUSY_TIMEOUT = 20  # Seconds a writer waits for the lock before "database is locked"
+
+
+def database_profile(profile: str, sqlite_path) -> dict:
+    """The DATABASES['default'] entry for a profile."""
+    conn_max_age = int(os.environ.get('DEVBRAIN_DB_CONN_MAX_AGE', 600))
+    sqlite_path = os.environ.get('DEVBRAIN_SQLITE_PATH', sqlite_path)
+
+    if profile == 'sqlite':
+        return {
+            'ENGINE': 'config.sqlite',
+            'NAME': sqlite_path,
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': SQLITE_BUSY_TIMEOUT,
+                'transaction_mode': 'IMMEDIATE',
+                'serialize_writes': True,
+                'pragmas': SQLITE_PRAGMAS,
+            },
+        }
+    if profile == 'sqlite-basic':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': sqlite_path,
+        }
+    if profile == 'postgres':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DEVBRAIN_DB_NAME', 'devbrain'),
+            'USER': os.environ.get('DEVBRAIN_DB_USER', 'devbrain'),
+            'PASSWORD': os.environ.get('DEVBRAIN_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DEVBRAIN_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DEVBRAIN_DB_PORT', '5432'),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DEVBRAIN_DB_POOLER') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': 5,
+                'application_name': 'devbrain',
+            },
+        }
+    raise ImproperlyConfigured(
+        f"Unknown DEVBRAIN_DB_PROFILE {profile!r}; expected one of: {', '.join(PROFILES)}"
+    )
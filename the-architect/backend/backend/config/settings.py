@@ -5,6 +5,7 @@ Django settings for DevBrain backend.
 from pathlib import Path
 import os
 from datetime import timedelta
+from config.database import database_profile
 
 # Build paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -69,11 +70,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 ASGI_APPLICATION = 'config.asgi.application'
 
+# Database profile: 'sqlite' (WAL, tuned pragmas, persistent connections),
+# 'sqlite-basic' (Django's defaults) or 'postgres'; see config/database.py
+DEVBRAIN_DB_PROFILE = os.environ.get('DEVBRAIN_DB_PROFILE', 'sqlite')
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_profile(DEVBRAIN_DB_PROFILE, BASE_DIR / 'db.sqlite3'),
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,9 +109,83 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 # Gemini API
 GEMINI_API_KEY = ''  # Replace with actual key
 GEMINI_MODEL = 'gemini-1.5-flash'
+GEMINI_MODEL_BACKEND = ''  # Dotted path of a local model class used instead of the API, e.g. 'api.stubs.StubGenerativeModel'
+
+# Model call resilience (seconds): per-call deadline, whole-stream deadline, concurrent calls
+# and how long a call may wait for a slot; the breaker opens after N consecutive failures
+# (calls slower than LLM_BREAKER_SLOW_CALL count as failures) and rejects calls for the reset timeout
+LLM_CALL_TIMEOUT = 20
+LLM_STREAM_TIMEOUT = 120
+LLM_MAX_CONCURRENCY = 16
+LLM_QUEUE_TIMEOUT = 2
+LLM_BREAKER_FAILURE_THRESHOLD = 5
+LLM_BREAKER_SLOW_CALL = 10
+LLM_BREAKER_RESET_TIMEOUT = 30
+
+# AI response cache: 'api.cache.LocalResponseCache' (per process, LRU) or
+# 'api.cache.DjangoResponseCache' (shared, uses CACHES[CHAT_CACHE_ALIAS]); '' disables it
+CHAT_CACHE_BACKEND = 'api.cache.LocalResponseCache'
+CHAT_CACHE_TTL = 3600  # Seconds
+CHAT_CACHE_MAX_ENTRIES = 1000
+CHAT_CACHE_ALIAS = 'default'
+
+# Chat memory in the prompt: the last N messages verbatim (each cut to N chars) plus a
+# rolling summary of older ones (lines of N chars, N chars in total)
+CHAT_HISTORY_MESSAGES = 8
+CHAT_HISTORY_MESSAGE_CHARS = 1000
+CHAT_SUMMARY_LINE_CHARS = 200
+CHAT_SUMMARY_MAX_CHARS = 2000
+
+# Chat streaming (SSE): pacing of the mock answer, and latency of the local stub model (seconds)
+CHAT_MOCK_TOKEN_DELAY = 0.02
+STUB_MODEL_FIRST_TOKEN_DELAY = 0.8
+STUB_MODEL_TOKEN_DELAY = 0.03
+STUB_MODEL_TOKENS = 60
+
+# Node drag positions: write immediately, or coalesce in memory and flush every interval (seconds)
+NODE_POSITION_WRITE_BEHIND = False
+NODE_POSITION_FLUSH_INTERVAL = 0.5
+
+# WebSocket push of project changes: channel layer class ('' disables push), seconds events
+# are batched before fan-out, and batches buffered per connection before it must resync
+REALTIME_CHANNEL_LAYER = 'api.realtime.LocalChannelLayer'
+REALTIME_TICK = 0.05
+REALTIME_QUEUE_SIZE = 256
+
+# Quick-jump node search: nodes indexed per process (~1.7 KB each; the searching user's
+# projects are always kept), share of query trigrams a match needs, description characters
+# indexed, and the most results one search returns
+NODE_SEARCH_MAX_NODES = 250000
+NODE_SEARCH_MIN_MATCH = 0.5
+NODE_SEARCH_DESCRIPTION_CHARS = 500
+NODE_SEARCH_MAX_RESULTS = 50
 
 # Knowledge base settings
 KNOWLEDGE_BASE_DIR = BASE_DIR / 'knowledge_base'
 KNOWLEDGE_BASE_DIR.mkdir(exist_ok=True)
 
-SUPPORTED_FILE_TYPES = ['pdf', 'txt', 'md', 'docx']
\ No newline at end of file
+SUPPORTED_FILE_TYPES = ['pdf', 'txt', 'md', 'docx']
+
+# Background ingestion: files processed concurrently, or run inline when eager
+INGESTION_WORKERS = 2
+INGESTION_EAGER = False
+
+# Parallel PDF extraction: page shards spread over a process pool for large files
+PDF_EXTRACTION_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+PDF_PARALLEL_MIN_PAGES = 50  # Smaller PDFs are extracted serially
+PDF_PAGES_PER_SHARD = 16
+
+# Knowledge passages (characters) and how many are put into a chat prompt
+KNOWLEDGE_CHUNK_SIZE = 1000
+KNOWLEDGE_CHUNK_OVERLAP = 200
+KNOWLEDGE_CONTEXT_PASSAGES = 4
+
+# Knowledge search ranking (BM25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Semantic search: 'bm25', 'vector' or 'hybrid' (reciprocal rank fusion of both)
+KNOWLEDGE_SEARCH_MODE = 'hybrid'
+KNOWLEDGE_EMBEDDER = 'api.embeddings.HashingEmbedder'  # Any class with .dimensions and .embed(texts)
+EMBEDDING_DIMENSIONS = 512
+VECTOR_INDEX_DIR = KNOWLEDGE_BASE_DIR / 'vectors'  # Memory-mapped per-project matrices
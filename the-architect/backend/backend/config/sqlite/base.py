@@ -0,0 +1,90 @@
+"""
+SQLite backend for concurrent use (the 'sqlite' database profile).
+
+Django's SQLite backend with three more OPTIONS:
+- pragmas: {name: value} run on every new connection (journal_mode=wal,
+  synchronous, mmap_size, ...).
+- transaction_mode: 'DEFERRED' (SQLite's default), 'IMMEDIATE' or
+  'EXCLUSIVE', for transactions opened by atomic(). IMMEDIATE takes the
+  write lock at BEGIN. A transaction that reads before it writes then waits
+  out the busy timeout. Under DEFERRED it would fail with "database is
+  locked" when another writer committed first.
+- serialize_writes: queue this process's atomic() blocks on a lock before
+  BEGIN. SQLite's busy handler polls with growing sleeps (up to 100 ms),
+  which leaves the database idle while writers wait. A lock hands it to the
+  next writer as soon as the last one commits. Other processes still wait
+  on the busy timeout.
+"""
+
+import threading
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+_write_locks = {}  # database file -> lock shared by its connections in this process
+_write_locks_lock = threading.Lock()
+
+
+def _write_lock(name):
+    with _write_locks_lock:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pragmas = {}
+    transaction_mode = 'DEFERRED'
+    write_lock = None
+    holds_write_lock = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        transaction_mode = kwargs.pop('transaction_mode', 'DEFERRED').upper()
+        if transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of: {', '.join(TRANSACTION_MODES)}"
+            )
+        self.transaction_mode = transaction_mode
+        serialize_writes = kwargs.pop('serialize_writes', False)
+        self.write_lock = _write_lock(kwargs['database']) if serialize_writes else None
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.write_lock is not None and not self.holds_write_lock:
+            self.write_lock.acquire()
+            self.holds_write_lock = True
+        try:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
+        except Exception:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
@@ -10,7 +10,7 @@ from rest_framework.routers import DefaultRouter
 from api.views import (
     ProjectViewSet, NodeViewSet, EdgeViewSet,
     KnowledgeBaseViewSet, ChatViewSet,
-    ChatNodeView, SearchKnowledgeView
+    ChatNodeView, ChatNodeStreamView, SearchKnowledgeView, SearchNodesView, MetricsView
 )
 
 # REST Framework router for viewsets
@@ -27,7 +27,10 @@ urlpatterns = [
     
     # Special endpoints
     path('api/chat/node/<str:node_id>/', ChatNodeView.as_view(), name='chat-node'),
+    path('api/chat/node/<str:node_id>/stream/', ChatNodeStreamView.as_view(), name='chat-node-stream'),
     path('api/search/knowledge/', SearchKnowledgeView.as_view(), name='search-knowledge'),
+    path('api/search/nodes/', SearchNodesView.as_view(), name='search-nodes'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
     
     # API Auth (optional - for token-based auth)
     path('api-auth/', include('rest_framework.urls')),